@@ -71,6 +71,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'farm.context_processors.notifications',
             ],
         },
     },
@@ -89,6 +90,20 @@ DATABASES = {
     }
 }
 
+# Shared by the web processes and the run_jobs workers: notification
+# summaries and dashboards are invalidated from either side, and
+# cache.add() locks must hold across processes. The table is created by
+# the farm migrations.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'farm_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -137,6 +152,8 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Uploads are streamed to disk and hashed instead of buffered in memory
+FILE_UPLOAD_HANDLERS = ['farm.storage.HashingFileUploadHandler']
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
@@ -0,0 +1,190 @@
+# farm/activity.py
+import atexit
+import contextvars
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .models import ActivityLog
+from .utils import get_client_ip
+
+logger = logging.getLogger(__name__)
+
+# Events waiting to be written; further events are dropped when it is full
+ACTIVITY_QUEUE_SIZE = getattr(settings, 'FARM_ACTIVITY_LOG_QUEUE_SIZE', 10000)
+# Rows per INSERT, and the queue length that triggers an early flush
+ACTIVITY_BATCH_SIZE = getattr(settings, 'FARM_ACTIVITY_LOG_BATCH_SIZE', 200)
+# Seconds between flushes when the queue does not fill up
+ACTIVITY_FLUSH_INTERVAL = getattr(settings, 'FARM_ACTIVITY_LOG_FLUSH_INTERVAL', 2.0)
+
+# The request being handled, set by ActivityLogMiddleware
+current_request = contextvars.ContextVar('farm_activity_request', default=None)
+
+
+class ActivityLogWriter:
+    """
+    Writes ActivityLog rows from a background thread.
+
+    Callers only put a tuple on a bounded in-process queue, so logging adds
+    no database work to the request. The thread drains the queue with
+    bulk inserts whenever ACTIVITY_BATCH_SIZE events are waiting or every
+    ACTIVITY_FLUSH_INTERVAL seconds, and once more at interpreter exit.
+    """
+
+    def __init__(self, maxsize=ACTIVITY_QUEUE_SIZE, batch_size=ACTIVITY_BATCH_SIZE,
+                 interval=ACTIVITY_FLUSH_INTERVAL):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._known_users = set()
+        self._counter_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def stats(self):
+        return {
+            'queued': self.queued,
+            'pending': self.queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+    def enqueue(self, user_id, action, model_name, object_id, description='',
+                ip_address=None, timestamp=None):
+        """
+        Queue one event without blocking. Returns False if it was dropped.
+        """
+        self._ensure_started()
+        event = (
+            user_id, action, model_name, object_id, description or '',
+            ip_address, timestamp or timezone.now(),
+        )
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            with self._counter_lock:
+                self.dropped += 1
+                dropped = self.dropped
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning('Activity log queue full, %s events dropped so far', dropped)
+            return False
+        with self._counter_lock:
+            self.queued += 1
+        if self.queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self):
+        """
+        Write everything currently queued. Safe to call from any thread.
+        """
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return written
+                written += self._write(batch)
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        self.flush()
+
+    def _write(self, batch):
+        try:
+            user_ids = {event[0] for event in batch} - self._known_users
+            if user_ids:
+                # Users deleted since the event was queued would break the insert
+                self._known_users.update(
+                    get_user_model().objects.filter(pk__in=user_ids).values_list('pk', flat=True)
+                )
+            logs = [
+                ActivityLog(
+                    user_id=user_id, action=action, model_name=model_name,
+                    object_id=object_id, description=description,
+                    ip_address=ip_address, timestamp=timestamp,
+                )
+                for user_id, action, model_name, object_id, description, ip_address, timestamp in batch
+                if user_id in self._known_users
+            ]
+            ActivityLog.objects.bulk_create(logs, batch_size=self.batch_size)
+        except Exception:
+            logger.exception('Could not write %s activity log entries', len(batch))
+            self._known_users.clear()
+            with self._counter_lock:
+                self.failed += len(batch)
+            return 0
+        with self._counter_lock:
+            self.written += len(logs)
+            self.dropped += len(batch) - len(logs)
+        return len(logs)
+
+    def _ensure_started(self):
+        # A forked worker inherits the object but not the thread
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='farm-activity-log', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
+                close_old_connections()
+                self.flush()
+        finally:
+            connection.close()
+
+
+writer = ActivityLogWriter()
+atexit.register(writer.stop)
+
+
+def record_activity(user, action, instance, description='', ip_address=None):
+    """
+    Queue an ActivityLog entry for ``instance``. ``user`` and ``ip_address``
+    default to those of the current request; nothing is logged outside a
+    request unless a user is given.
+    """
+    request = current_request.get()
+    if user is None and request is not None:
+        user = request.user
+    if user is None or not user.is_authenticated:
+        return False
+    if ip_address is None and request is not None:
+        ip_address = get_client_ip(request)
+    return writer.enqueue(
+        user.pk, action, instance._meta.model_name, instance.pk,
+        description, ip_address,
+    )
@@ -1,13 +1,18 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
-from django.db.models import Sum
+from django.db import connection
+from django.db.models import Q, Sum
 from django.utils import timezone
 
 from .models import (
     Cattle, MilkProduction, HealthRecord,
-    Breeding, Feed, ActivityLog, Notification
+    Breeding, Feed, ActivityLog, ActivityLogArchive, Notification,
+    QueuedJob, JobSchedule, CareDueItem, StoredFile,
+    CattleSearchIndex, HealthRecordSearchIndex, CattleFertilityStats,
+    FertilityMonthlyStats, BreedingCalendarEvent
 )
+from .search import fts_query
 
 @admin.register(Cattle)
 class CattleAdmin(admin.ModelAdmin):
@@ -15,12 +20,17 @@ class CattleAdmin(admin.ModelAdmin):
                    'age', 'weight', 'status', 'total_milk_production')
     list_filter = ('status', 'gender', 'breed')
     search_fields = ('name', 'tag_number', 'breed')
-    readonly_fields = ('created_at', 'updated_at')
+    list_select_related = ('milk_stats',)
+    readonly_fields = ('inbreeding_coefficient', 'created_at', 'updated_at')
+    raw_id_fields = ('dam', 'sire')
     fieldsets = (
         ('Basic Information', {
             'fields': ('owner', 'name', 'tag_number', 'breed', 'date_of_birth', 
                       'gender', 'weight', 'status')
         }),
+        ('Pedigree', {
+            'fields': ('dam', 'sire', 'inbreeding_coefficient')
+        }),
         ('Additional Information', {
             'fields': ('notes', 'created_at', 'updated_at')
         }),
@@ -53,6 +63,17 @@ class HealthRecordAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at',)
     date_hierarchy = 'date'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Both full-text indexes instead of LIKE scans over every row
+        query = fts_query(search_term)
+        if not query or connection.vendor != 'sqlite':
+            return super().get_search_results(request, queryset, search_term)
+        matches = queryset.filter(
+            Q(pk__in=HealthRecordSearchIndex.objects.filter(document__match=query).values('record_id'))
+            | Q(cattle__in=CattleSearchIndex.objects.filter(document__match=query).values('cattle_id'))
+        )
+        return matches, False
+
     fieldsets = (
         ('Basic Information', {
             'fields': ('cattle', 'record_type', 'date', 'description')
@@ -122,6 +143,20 @@ class ActivityLogAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'description', 'ip_address')
     readonly_fields = ('timestamp',)
     date_hierarchy = 'timestamp'
+    list_select_related = ('user',)
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(ActivityLogArchive)
+class ActivityLogArchiveAdmin(admin.ModelAdmin):
+    list_display = ('month', 'row_count', 'first_timestamp', 'last_timestamp', 'file_name')
+    readonly_fields = ('month', 'file_name', 'row_count', 'first_timestamp',
+                       'last_timestamp', 'updated_at')
 
     def has_add_permission(self, request):
         return False
@@ -161,3 +196,86 @@ class NotificationAdmin(admin.ModelAdmin):
 admin.site.site_header = 'Dairy Farm Management System'
 admin.site.site_title = 'Dairy Farm Admin'
 admin.site.index_title = 'Farm Management'
+
+@admin.register(QueuedJob)
+class QueuedJobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'run_at', 'attempts', 'duration_ms',
+                    'locked_by', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'duration_ms',
+                       'locked_by', 'lease_expires_at', 'result', 'error')
+    date_hierarchy = 'created_at'
+    show_full_result_count = False
+
+@admin.register(JobSchedule)
+class JobScheduleAdmin(admin.ModelAdmin):
+    list_display = ('name', 'interval_seconds', 'next_run_at', 'last_enqueued_at')
+    readonly_fields = ('last_enqueued_at',)
+
+@admin.register(CareDueItem)
+class CareDueItemAdmin(admin.ModelAdmin):
+    list_display = ('cattle', 'kind', 'due_date', 'status', 'owner', 'updated_at')
+    list_filter = ('kind', 'status', 'due_date')
+    search_fields = ('cattle__name', 'cattle__tag_number')
+    list_select_related = ('cattle', 'owner')
+    date_hierarchy = 'due_date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(StoredFile)
+class StoredFileAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'ref_count', 'created_at', 'updated_at')
+    search_fields = ('name', 'sha256')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(CattleFertilityStats)
+class CattleFertilityStatsAdmin(admin.ModelAdmin):
+    list_display = ('cattle', 'calvings', 'average_calving_interval', 'services',
+                    'conceptions', 'services_per_conception', 'average_days_open',
+                    'current_days_open', 'computed_at')
+    search_fields = ('cattle__name', 'cattle__tag_number')
+    list_select_related = ('cattle',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(FertilityMonthlyStats)
+class FertilityMonthlyStatsAdmin(admin.ModelAdmin):
+    list_display = ('owner', 'month', 'breeding_type', 'sire', 'services',
+                    'conceptions', 'calvings')
+    list_filter = ('breeding_type', 'month')
+    search_fields = ('sire', 'owner__username')
+    list_select_related = ('owner',)
+    date_hierarchy = 'month'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(BreedingCalendarEvent)
+class BreedingCalendarEventAdmin(admin.ModelAdmin):
+    list_display = ('cattle', 'kind', 'expected_date', 'start_date', 'end_date', 'owner')
+    list_filter = ('kind', 'expected_date')
+    search_fields = ('cattle__name', 'cattle__tag_number')
+    list_select_related = ('cattle', 'owner')
+    date_hierarchy = 'expected_date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,386 @@
+# farm/analytics.py
+import hashlib
+import json
+import threading
+import time
+import warnings
+from concurrent.futures import Future
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Sum
+
+from .models import Cattle, MilkDailyRollup, MilkDataVersion, MilkMonthlyRollup
+from .rollups import get_milk_data_version
+
+SESSIONS = ('morning', 'afternoon', 'evening')
+
+# Computed dashboards are keyed by data version, so this only bounds memory
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, 'FARM_DASHBOARD_CACHE_TIMEOUT', 60 * 60)
+# Longest a request waits on another process computing the same dashboard
+DASHBOARD_LOCK_TIMEOUT = getattr(settings, 'FARM_DASHBOARD_LOCK_TIMEOUT', 30)
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class HerdMilkSeries:
+    """
+    Dense per-cattle x per-day milk history for one herd.
+
+    ``totals`` is a (cattle, days) float32 matrix of daily litres and
+    ``observed`` marks the days that have a record; ``sessions`` holds the
+    herd-wide (days, 3) morning/afternoon/evening totals. Everything below
+    is computed in vectorized form on these arrays.
+    """
+
+    def __init__(self, cattle_ids, start_date, totals, observed, sessions):
+        self.cattle_ids = cattle_ids
+        self.start_date = start_date
+        self.totals = totals
+        self.observed = observed
+        self.sessions = sessions
+        self._results = {}
+
+    @property
+    def days(self):
+        return self.totals.shape[1]
+
+    @property
+    def dates(self):
+        return [self.start_date + timedelta(days=offset) for offset in range(self.days)]
+
+    def _memo(self, key, compute):
+        if key not in self._results:
+            self._results[key] = compute()
+        return self._results[key]
+
+    def daily_totals(self):
+        """
+        Herd total per day, shape (days,)
+        """
+        return self._memo('daily_totals', lambda: self.sessions.sum(axis=1))
+
+    def cattle_totals(self):
+        """
+        Total per cattle over the whole range, shape (cattle,)
+        """
+        return self._memo('cattle_totals', lambda: self.totals.sum(axis=1, dtype=np.float64))
+
+    def rolling_mean(self, window=7):
+        """
+        Per-cattle mean over the trailing ``window`` days, ignoring days
+        without records. NaN where a window has no records at all.
+        """
+        def compute():
+            values = np.zeros((len(self.cattle_ids), self.days + 1))
+            counts = np.zeros_like(values)
+            np.cumsum(np.where(self.observed, self.totals, 0), axis=1, out=values[:, 1:])
+            np.cumsum(self.observed, axis=1, out=counts[:, 1:])
+            lagged = np.maximum(np.arange(1, self.days + 1) - window, 0)
+            sums = values[:, 1:] - values[:, lagged]
+            seen = counts[:, 1:] - counts[:, lagged]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return np.where(seen > 0, sums / seen, np.nan)
+        return self._memo(('rolling_mean', window), compute)
+
+    def herd_rolling_mean(self, window=7):
+        """
+        Herd daily total averaged over the trailing ``window`` days, shape (days,)
+        """
+        def compute():
+            cumulative = np.concatenate(([0.0], np.cumsum(self.daily_totals())))
+            ends = np.arange(1, self.days + 1)
+            starts = np.maximum(ends - window, 0)
+            return (cumulative[ends] - cumulative[starts]) / (ends - starts)
+        return self._memo(('herd_rolling_mean', window), compute)
+
+    def period_delta(self, days):
+        """
+        Relative change of each cattle's mean daily yield over the last
+        ``days`` days against the ``days`` before. NaN when either period
+        has no records.
+        """
+        def compute():
+            if self.days < 2 * days:
+                return np.full(len(self.cattle_ids), np.nan)
+            recent = slice(self.days - days, self.days)
+            before = slice(self.days - 2 * days, self.days - days)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                recent_mean = (
+                    np.where(self.observed[:, recent], self.totals[:, recent], 0).sum(axis=1)
+                    / self.observed[:, recent].sum(axis=1)
+                )
+                before_mean = (
+                    np.where(self.observed[:, before], self.totals[:, before], 0).sum(axis=1)
+                    / self.observed[:, before].sum(axis=1)
+                )
+                return (recent_mean - before_mean) / before_mean
+        return self._memo(('period_delta', days), compute)
+
+    def herd_delta(self, days):
+        """
+        Relative change of the herd total over the last ``days`` days
+        against the ``days`` before, or None without enough history.
+        """
+        daily = self.daily_totals()
+        if self.days < 2 * days:
+            return None
+        before = daily[-2 * days:-days].sum()
+        if not before:
+            return None
+        return float((daily[-days:].sum() - before) / before)
+
+    def percentiles(self, q=(10, 50, 90)):
+        """
+        Per-day percentiles of individual cattle yields, shape (len(q), days)
+        """
+        def compute():
+            if not len(self.cattle_ids):
+                return np.full((len(q), self.days), np.nan)
+            masked = np.where(self.observed, self.totals, np.nan)
+            # Days without any records yield NaN ("All-NaN slice" warning)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                return np.nanpercentile(masked, q, axis=0)
+        return self._memo(('percentiles', tuple(q)), compute)
+
+    def last_day_anomalies(self, drop_threshold=0.3, z_threshold=-3.0, min_history=7):
+        """
+        Compare each cattle's yield on the last day of the series with its
+        baseline over the preceding days.
+
+        Returns (cattle_id, actual, baseline_mean, percent_drop, z_score)
+        tuples for cattle whose yield fell by at least ``drop_threshold`` or
+        whose z-score is at or below ``z_threshold``. Cattle without a
+        record on the last day or with fewer than ``min_history`` baseline
+        days are skipped.
+        """
+        if self.days < 2 or not len(self.cattle_ids):
+            return []
+        history = self.totals[:, :-1].astype(np.float64)
+        seen = self.observed[:, :-1]
+        counts = seen.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(seen, history, 0).sum(axis=1) / counts
+            variances = np.where(seen, (history - means[:, None]) ** 2, 0).sum(axis=1) / counts
+            stds = np.sqrt(variances)
+            actual = self.totals[:, -1].astype(np.float64)
+            drops = (means - actual) / means
+            z_scores = np.where(stds > 0, (actual - means) / stds, 0.0)
+
+        flagged = (
+            self.observed[:, -1]
+            & (counts >= min_history)
+            & (means > 0)
+            & ((drops >= drop_threshold) | (z_scores <= z_threshold))
+        )
+        return [
+            (
+                int(self.cattle_ids[index]), float(actual[index]), float(means[index]),
+                float(drops[index]), float(z_scores[index]),
+            )
+            for index in np.flatnonzero(flagged)
+        ]
+
+    def top_cattle(self, limit=5):
+        """
+        (cattle_id, total) pairs for the highest producing cattle
+        """
+        totals = self.cattle_totals()
+        order = np.argsort(totals)[::-1][:limit]
+        return [
+            (int(self.cattle_ids[index]), float(totals[index]))
+            for index in order
+            if totals[index] > 0
+        ]
+
+
+def as_chart_list(values, decimals=2):
+    """
+    Rounded plain list for JSON charts, with NaN turned into None
+    """
+    return [
+        None if np.isnan(value) else value
+        for value in np.round(np.asarray(values, dtype=np.float64), decimals).tolist()
+    ]
+
+
+def load_herd_series(owner, start_date, end_date):
+    """
+    Load the herd's daily milk history into a HerdMilkSeries with a single
+    columnar query over the daily rollups. ``owner=None`` loads every herd.
+    """
+    rollups = MilkDailyRollup.objects.filter(date__range=[start_date, end_date])
+    if owner is not None:
+        rollups = rollups.filter(cattle__owner=owner)
+    rows = list(rollups.order_by().values_list(
+        'cattle_id', 'date', 'morning_quantity', 'afternoon_quantity', 'evening_quantity'
+    ))
+
+    days = (end_date - start_date).days + 1
+    if not rows:
+        return HerdMilkSeries(
+            np.zeros(0, dtype=np.int64), start_date,
+            np.zeros((0, days), dtype=np.float32),
+            np.zeros((0, days), dtype=bool),
+            np.zeros((days, len(SESSIONS))),
+        )
+
+    columns = list(zip(*rows))
+    cattle_ids, cattle_index = np.unique(np.array(columns[0], dtype=np.int64), return_inverse=True)
+    day_index = np.fromiter(
+        (day.toordinal() for day in columns[1]), dtype=np.int64, count=len(rows)
+    ) - start_date.toordinal()
+    quantities = np.array(columns[2:], dtype=np.float64).T
+
+    totals = np.zeros((len(cattle_ids), days), dtype=np.float32)
+    observed = np.zeros((len(cattle_ids), days), dtype=bool)
+    totals[cattle_index, day_index] = quantities.sum(axis=1)
+    observed[cattle_index, day_index] = True
+
+    sessions = np.zeros((days, len(SESSIONS)))
+    for column in range(len(SESSIONS)):
+        sessions[:, column] = np.bincount(day_index, weights=quantities[:, column], minlength=days)
+
+    return HerdMilkSeries(cattle_ids, start_date, totals, observed, sessions)
+
+
+def herd_data_version(owner):
+    """
+    Stamp that changes whenever milk data of the herd changes.
+    ``owner=None`` stands for every herd.
+    """
+    if owner is not None:
+        return get_milk_data_version(owner.pk)
+    return list(MilkDataVersion.objects.aggregate(
+        total=Sum('version'), latest=Max('updated_at')
+    ).values())
+
+
+def dashboard_cache_key(owner, start_date, end_date, version):
+    material = json.dumps(
+        [getattr(owner, 'pk', None), start_date, end_date, version],
+        default=str,
+    )
+    return 'farm:dashboard:' + hashlib.sha256(material.encode()).hexdigest()
+
+
+def build_dashboard(owner, start_date, end_date):
+    """
+    Everything the analytics dashboard shows for one herd and date range,
+    as plain values that can go into the cache.
+    """
+    series = load_herd_series(owner, start_date, end_date)
+    daily_totals = series.daily_totals()
+    total_production = float(daily_totals.sum())
+
+    top_totals = series.top_cattle(5)
+    cattle_names = Cattle.objects.in_bulk([cattle_id for cattle_id, _ in top_totals])
+    top_cattle = [
+        {
+            'cattle__name': cattle_names[cattle_id].name,
+            'cattle__tag_number': cattle_names[cattle_id].tag_number,
+            'total_production': total,
+        }
+        for cattle_id, total in top_totals
+        if cattle_id in cattle_names
+    ]
+
+    # Monthly trend for the year up to the end of the range
+    monthly = MilkMonthlyRollup.objects.filter(
+        month__gt=end_date.replace(year=end_date.year - 1, day=1),
+        month__lte=end_date,
+    )
+    if owner is not None:
+        monthly = monthly.filter(owner=owner)
+    monthly_totals = list(
+        monthly.values('month').annotate(
+            total_production=Sum('total_quantity')
+        ).order_by('month')
+    )
+
+    percentiles = series.percentiles((10, 50, 90))
+    return {
+        'total_production': total_production,
+        'avg_daily_production': total_production / series.days,
+        'top_cattle': top_cattle,
+        'monthly_totals': monthly_totals,
+        'change_7d': series.herd_delta(7),
+        'chart_data': {
+            'dates': [day.strftime('%Y-%m-%d') for day in series.dates],
+            'morning_data': as_chart_list(series.sessions[:, 0]),
+            'afternoon_data': as_chart_list(series.sessions[:, 1]),
+            'evening_data': as_chart_list(series.sessions[:, 2]),
+            'daily_totals': as_chart_list(daily_totals),
+            'rolling_7d': as_chart_list(series.herd_rolling_mean(7)),
+            'p10': as_chart_list(percentiles[0]),
+            'p50': as_chart_list(percentiles[1]),
+            'p90': as_chart_list(percentiles[2]),
+        },
+    }
+
+
+def get_dashboard(owner, start_date, end_date):
+    """
+    Cached build_dashboard, keyed by the herd's milk data version so new
+    milk data invalidates it.
+
+    Each distinct (owner, range, version) is computed once: concurrent
+    identical requests in this process wait on the first one, and other
+    processes wait on a lock taken with cache.add(). The lock only spans
+    processes when the default cache is shared (the database cache in
+    settings.CACHES); with a per-process cache such as LocMemCache each
+    process builds the dashboard once.
+    """
+    key = dashboard_cache_key(owner, start_date, end_date, herd_data_version(owner))
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        return future.result()
+
+    try:
+        data = _build_shared(key, owner, start_date, end_date)
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(data)
+        return data
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _build_shared(key, owner, start_date, end_date):
+    lock_key = f'{key}:lock'
+    deadline = time.monotonic() + DASHBOARD_LOCK_TIMEOUT
+    locked = cache.add(lock_key, 1, DASHBOARD_LOCK_TIMEOUT)
+    while not locked:
+        time.sleep(0.05)
+        data = cache.get(key)
+        if data is not None:
+            return data
+        if time.monotonic() > deadline:
+            # The other process is stuck or gone; compute it ourselves
+            break
+        locked = cache.add(lock_key, 1, DASHBOARD_LOCK_TIMEOUT)
+
+    try:
+        data = cache.get(key)
+        if data is None:
+            data = build_dashboard(owner, start_date, end_date)
+            cache.set(key, data, DASHBOARD_CACHE_TIMEOUT)
+        return data
+    finally:
+        if locked:
+            cache.delete(lock_key)
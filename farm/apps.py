@@ -4,3 +4,6 @@ class FarmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'farm'
     label = 'farm_management'  # Add this line to make the label unique
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,147 @@
+# farm/archive.py
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ActivityLog, ActivityLogArchive
+
+# Activity logs older than this many days are moved to the archive
+ACTIVITY_LOG_RETENTION_DAYS = getattr(settings, 'FARM_ACTIVITY_LOG_RETENTION_DAYS', 90)
+# Archive files older than this many months are deleted (None keeps them)
+ACTIVITY_ARCHIVE_KEEP_MONTHS = getattr(settings, 'FARM_ACTIVITY_ARCHIVE_KEEP_MONTHS', None)
+# Rows read, written and deleted per step, so no step holds a long lock
+ACTIVITY_ARCHIVE_CHUNK_SIZE = getattr(settings, 'FARM_ACTIVITY_ARCHIVE_CHUNK_SIZE', 1000)
+ACTIVITY_ARCHIVE_DIR = getattr(
+    settings, 'FARM_ACTIVITY_ARCHIVE_DIR',
+    os.path.join(settings.BASE_DIR, 'archive', 'activity_logs'),
+)
+
+ARCHIVE_FIELDS = (
+    'id', 'user_id', 'action', 'model_name', 'object_id',
+    'description', 'timestamp', 'ip_address',
+)
+
+
+def _month_of(timestamp):
+    return timezone.localtime(timestamp).date().replace(day=1)
+
+
+def archive_path(file_name):
+    return os.path.join(ACTIVITY_ARCHIVE_DIR, file_name)
+
+
+def _append_rows(month, rows):
+    """
+    Append rows to the month's file as a new gzip member and register them.
+    Runs before the rows are deleted; a crash in between only leaves
+    duplicates in the file, which readers skip by id.
+    """
+    file_name = f'activity-{month:%Y-%m}.jsonl.gz'
+    data = ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows)
+    with open(archive_path(file_name), 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as compressed:
+            compressed.write(data.encode('utf-8'))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+    archive, _ = ActivityLogArchive.objects.get_or_create(
+        month=month, defaults={'file_name': file_name}
+    )
+    timestamps = [row['timestamp'] for row in rows]
+    archive.row_count += len(rows)
+    archive.first_timestamp = min(filter(None, [archive.first_timestamp, *timestamps]))
+    archive.last_timestamp = max(filter(None, [archive.last_timestamp, *timestamps]))
+    archive.save()
+
+
+def archive_activity_logs(older_than_days=ACTIVITY_LOG_RETENTION_DAYS,
+                          chunk_size=ACTIVITY_ARCHIVE_CHUNK_SIZE):
+    """
+    Move activity logs older than ``older_than_days`` into the monthly
+    archive files, ``chunk_size`` rows at a time. Returns the number of
+    rows moved.
+    """
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    os.makedirs(ACTIVITY_ARCHIVE_DIR, exist_ok=True)
+
+    moved = 0
+    while True:
+        rows = list(
+            ActivityLog.objects.filter(timestamp__lt=cutoff)
+            .order_by('id').values(*ARCHIVE_FIELDS)[:chunk_size]
+        )
+        if not rows:
+            return moved
+        by_month = defaultdict(list)
+        for row in rows:
+            by_month[_month_of(row['timestamp'])].append(row)
+
+        with transaction.atomic():
+            for month, month_rows in by_month.items():
+                _append_rows(month, month_rows)
+            ActivityLog.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        moved += len(rows)
+
+
+def purge_activity_archives(keep_months=ACTIVITY_ARCHIVE_KEEP_MONTHS):
+    """
+    Delete archive files of months more than ``keep_months`` months back.
+    Returns the number of months removed.
+    """
+    if keep_months is None:
+        return 0
+    month = timezone.localdate().replace(day=1)
+    for _ in range(keep_months):
+        month = (month - timedelta(days=1)).replace(day=1)
+    removed = 0
+    for archive in ActivityLogArchive.objects.filter(month__lt=month):
+        path = archive_path(archive.file_name)
+        if os.path.exists(path):
+            os.remove(path)
+        archive.delete()
+        removed += 1
+    return removed
+
+
+def iter_archived_logs(date_from=None, date_to=None, user_id=None, action=None,
+                       model_name=None):
+    """
+    Archived logs matching the filters as unsaved ActivityLog instances,
+    newest first. Only the files of months overlapping the date range are
+    read, one month at a time.
+    """
+    archives = ActivityLogArchive.objects.order_by('-month')
+    if date_from:
+        archives = archives.filter(month__gte=date_from.replace(day=1))
+    if date_to:
+        archives = archives.filter(month__lte=date_to)
+
+    for archive in archives:
+        path = archive_path(archive.file_name)
+        if not os.path.exists(path):
+            continue
+        logs = {}
+        with gzip.open(path, 'rt', encoding='utf-8') as lines:
+            for line in lines:
+                row = json.loads(line)
+                if user_id and row['user_id'] != user_id:
+                    continue
+                if action and row['action'] != action:
+                    continue
+                if model_name and row['model_name'] != model_name:
+                    continue
+                row['timestamp'] = parse_datetime(row['timestamp'])
+                day = timezone.localtime(row['timestamp']).date()
+                if (date_from and day < date_from) or (date_to and day > date_to):
+                    continue
+                logs[row['id']] = row
+        for row in sorted(logs.values(), key=lambda row: (row['timestamp'], row['id']), reverse=True):
+            yield ActivityLog(**row)
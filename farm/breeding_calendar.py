@@ -0,0 +1,194 @@
+# farm/breeding_calendar.py
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Breeding, BreedingCalendarEvent, Cattle, HealthRecord
+
+# Length of the oestrous cycle
+HEAT_CYCLE_DAYS = getattr(settings, 'FARM_HEAT_CYCLE_DAYS', 21)
+# Days either side of a predicted heat the cow is watched
+HEAT_WINDOW_DAYS = getattr(settings, 'FARM_HEAT_WINDOW_DAYS', 1)
+# Days after an unconfirmed service the pregnancy check is due
+PREGNANCY_CHECK_DAYS = getattr(settings, 'FARM_PREGNANCY_CHECK_DAYS', 35)
+# Used when a breeding has no expected calving date
+GESTATION_DAYS = getattr(settings, 'FARM_GESTATION_DAYS', 283)
+# Days either side of the expected calving date
+CALVING_WINDOW_DAYS = getattr(settings, 'FARM_CALVING_WINDOW_DAYS', 10)
+# Heats of open cows are projected this far ahead
+CALENDAR_HORIZON_DAYS = getattr(settings, 'FARM_CALENDAR_HORIZON_DAYS', 90)
+
+# No event window is longer, which bounds the range scans below
+MAX_WINDOW_DAYS = 2 * max(HEAT_WINDOW_DAYS, CALVING_WINDOW_DAYS)
+
+CALENDAR_RECORD_TYPES = ('insemination', 'pregnancy_check')
+CALENDAR_REFRESH_CHUNK_SIZE = 500
+CALENDAR_BATCH_SIZE = 1000
+
+_pending = threading.local()
+
+
+def schedule_calendar_refresh(cattle_ids):
+    """
+    Queue cattle whose calendar must be regenerated once the current
+    transaction commits
+    """
+    if not hasattr(_pending, 'cattle'):
+        _pending.cattle = set()
+    _pending.cattle.update(cattle_ids)
+    transaction.on_commit(flush_calendar_refresh)
+
+
+def flush_calendar_refresh():
+    cattle_ids, _pending.cattle = getattr(_pending, 'cattle', set()), set()
+    if cattle_ids:
+        refresh_breeding_calendar(cattle_ids)
+
+
+def _event(kind, expected_date, window_days):
+    return (
+        kind, expected_date,
+        expected_date - timedelta(days=window_days),
+        expected_date + timedelta(days=window_days),
+    )
+
+
+def _heats(anchor, today):
+    # Every cycle from the anchor that is not long past, up to the horizon
+    first = max(1, (today - anchor).days // HEAT_CYCLE_DAYS)
+    last = (today + timedelta(days=CALENDAR_HORIZON_DAYS) - anchor).days // HEAT_CYCLE_DAYS
+    return [
+        _event('heat', anchor + timedelta(days=HEAT_CYCLE_DAYS * cycle), HEAT_WINDOW_DAYS)
+        for cycle in range(first, last + 1)
+    ]
+
+
+def _projected_events(services, last_calving, last_check, today):
+    """
+    Events of one cow from her services [(date, status, expected calving)]
+    in date order, her last calving and her last pregnancy check.
+
+    Services before the last calving belong to an earlier pregnancy. An
+    open cow (calved, or served without success) is watched for heat every
+    cycle. After an unconfirmed service she is watched for a return to heat
+    one cycle later, checked for pregnancy unless a check was recorded
+    since, and expected to calve. A confirmed pregnancy only expects the
+    calving.
+    """
+    if services and (last_calving is None or services[-1][0] > last_calving):
+        served, status, expected_calving = services[-1]
+        if status == 'unsuccessful':
+            return _heats(served, today)
+        calving = _event(
+            'calving', expected_calving or served + timedelta(days=GESTATION_DAYS),
+            CALVING_WINDOW_DAYS,
+        )
+        if status == 'successful':
+            return [calving]
+        events = [_event('heat', served + timedelta(days=HEAT_CYCLE_DAYS), HEAT_WINDOW_DAYS)]
+        if last_check is None or last_check <= served:
+            events.append(_event('pregnancy_check', served + timedelta(days=PREGNANCY_CHECK_DAYS), 0))
+        return events + [calving]
+    if last_calving:
+        return _heats(last_calving, today)
+    return []
+
+
+def refresh_breeding_calendar(cattle_ids=None, today=None):
+    """
+    Regenerate the calendar of these cattle (all cattle when None) from
+    their breeding, insemination and pregnancy check records. Only active
+    females get events. Returns the number of events written.
+    """
+    today = today or timezone.localdate()
+    if cattle_ids is None:
+        cattle_ids = Cattle.objects.values_list('id', flat=True).order_by('id')
+    cattle_ids = list(cattle_ids)
+    written = 0
+    for start in range(0, len(cattle_ids), CALENDAR_REFRESH_CHUNK_SIZE):
+        chunk = cattle_ids[start:start + CALENDAR_REFRESH_CHUNK_SIZE]
+        with transaction.atomic():
+            written += _refresh_chunk(chunk, today)
+    return written
+
+
+def _refresh_chunk(cattle_ids, today):
+    owners = dict(
+        Cattle.objects.filter(id__in=cattle_ids, gender='F', status='active').values_list('id', 'owner_id')
+    )
+    services = {cattle_id: {} for cattle_id in owners}
+    last_calving = {}
+    last_check = {}
+
+    # Insemination records first so a breeding record of the same day wins
+    health_records = HealthRecord.objects.filter(
+        cattle_id__in=owners, record_type__in=CALENDAR_RECORD_TYPES
+    ).values_list('cattle_id', 'record_type', 'date').order_by('cattle_id', 'date')
+    for cattle_id, record_type, day in health_records.iterator():
+        if record_type == 'insemination':
+            services[cattle_id][day] = ('pending', None)
+        else:
+            last_check[cattle_id] = day
+    breedings = Breeding.objects.filter(cattle_id__in=owners).values_list(
+        'cattle_id', 'date', 'status', 'expected_calving_date', 'actual_calving_date'
+    ).order_by('cattle_id', 'date', 'id')
+    for cattle_id, day, status, expected, actual in breedings.iterator():
+        services[cattle_id][day] = (status, expected)
+        if actual and (cattle_id not in last_calving or actual > last_calving[cattle_id]):
+            last_calving[cattle_id] = actual
+
+    events = [
+        BreedingCalendarEvent(
+            owner_id=owners[cattle_id], cattle_id=cattle_id, kind=kind,
+            expected_date=expected_date, start_date=start_date, end_date=end_date,
+        )
+        for cattle_id, served in services.items()
+        for kind, expected_date, start_date, end_date in _projected_events(
+            [(day,) + served[day] for day in sorted(served)],
+            last_calving.get(cattle_id), last_check.get(cattle_id), today,
+        )
+    ]
+    BreedingCalendarEvent.objects.filter(cattle_id__in=cattle_ids).delete()
+    BreedingCalendarEvent.objects.bulk_create(events, batch_size=CALENDAR_BATCH_SIZE)
+    return len(events)
+
+
+def extend_breeding_calendar(today=None):
+    """
+    Regenerate open cows whose projected heats run out within a cycle of
+    the horizon, so the calendar keeps reaching CALENDAR_HORIZON_DAYS ahead.
+    Returns the number of events written.
+    """
+    today = today or timezone.localdate()
+    cutoff = today + timedelta(days=CALENDAR_HORIZON_DAYS - HEAT_CYCLE_DAYS)
+    # Served cows have a calving event and no further heats to project
+    served = BreedingCalendarEvent.objects.filter(kind='calving').values('cattle_id')
+    cattle_ids = BreedingCalendarEvent.objects.filter(kind='heat').exclude(
+        cattle_id__in=served
+    ).values('cattle_id').annotate(
+        last_heat=Max('expected_date')
+    ).filter(last_heat__lt=cutoff).values_list('cattle_id', flat=True)
+    return refresh_breeding_calendar(list(cattle_ids), today)
+
+
+def breeding_events(owner=None, start=None, end=None, kinds=None):
+    """
+    Events whose watch window overlaps start..end (tomorrow by default),
+    for one owner or everyone. One range scan of the (owner, start_date)
+    index: no window is longer than MAX_WINDOW_DAYS.
+    """
+    start = start or timezone.localdate() + timedelta(days=1)
+    end = end or start
+    events = BreedingCalendarEvent.objects.filter(
+        start_date__range=(start - timedelta(days=MAX_WINDOW_DAYS), end),
+        end_date__gte=start,
+    )
+    if owner is not None:
+        events = events.filter(owner=owner)
+    if kinds:
+        events = events.filter(kind__in=kinds)
+    return events.select_related('cattle').order_by('expected_date', 'cattle_id')
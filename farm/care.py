@@ -0,0 +1,165 @@
+# farm/care.py
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Breeding, CareDueItem, Cattle, HealthRecord
+
+CARE_REFRESH_CHUNK_SIZE = 500
+CARE_BATCH_SIZE = 500
+
+# Health records that carry out the scheduled item of their kind; other
+# types (treatment, deworming, ...) may schedule a checkup but close none
+CLOSING_RECORD_TYPES = ('vaccination', 'check_up')
+
+_pending = threading.local()
+
+
+def health_record_kind(record_type):
+    return 'vaccination' if record_type == 'vaccination' else 'checkup'
+
+
+def schedule_care_refresh(cattle_ids):
+    """
+    Queue cattle whose due items must be recomputed once the current
+    transaction commits
+    """
+    if not hasattr(_pending, 'cattle'):
+        _pending.cattle = set()
+    _pending.cattle.update(cattle_ids)
+    transaction.on_commit(flush_care_refresh)
+
+
+def flush_care_refresh():
+    cattle_ids, _pending.cattle = getattr(_pending, 'cattle', set()), set()
+    if cattle_ids:
+        refresh_care_items(cattle_ids)
+
+
+def _desired_items(cattle_ids):
+    """
+    {(kind, source_id): (cattle_id, due_date, status)} for these cattle.
+
+    A health record with a next checkup date opens an item of its kind.
+    A vaccination or check-up marks the open items of its kind done, or
+    superseded if it schedules the next date itself. A calving is done
+    once the breeding has an actual calving date and superseded by a
+    newer breeding.
+    """
+    desired = {}
+
+    open_items = defaultdict(list)
+    health_records = HealthRecord.objects.filter(cattle_id__in=cattle_ids).values_list(
+        'id', 'cattle_id', 'record_type', 'next_checkup_date'
+    ).order_by('cattle_id', 'date', 'id')
+    for record_id, cattle_id, record_type, next_checkup_date in health_records.iterator():
+        kind = health_record_kind(record_type)
+        if record_type in CLOSING_RECORD_TYPES:
+            status = 'superseded' if next_checkup_date else 'done'
+            for previous in open_items.pop((cattle_id, kind), ()):
+                desired[previous] = desired[previous][:2] + (status,)
+        if next_checkup_date:
+            open_items[(cattle_id, kind)].append((kind, record_id))
+            desired[(kind, record_id)] = (cattle_id, next_checkup_date, 'due')
+
+    latest_breeding = {}
+    breedings = Breeding.objects.filter(
+        cattle_id__in=cattle_ids, expected_calving_date__isnull=False
+    ).exclude(status='unsuccessful').values_list(
+        'id', 'cattle_id', 'expected_calving_date', 'actual_calving_date'
+    ).order_by('cattle_id', 'date', 'id')
+    for breeding_id, cattle_id, expected, actual in breedings.iterator():
+        previous = latest_breeding.get(cattle_id)
+        if previous and desired[previous][2] == 'due':
+            desired[previous] = desired[previous][:2] + ('superseded',)
+        latest_breeding[cattle_id] = ('calving', breeding_id)
+        desired[('calving', breeding_id)] = (cattle_id, expected, 'done' if actual else 'due')
+
+    return desired
+
+
+def refresh_care_items(cattle_ids=None):
+    """
+    Bring the due items of these cattle (all cattle when None) in line
+    with their health and breeding records. Items of inactive cattle are
+    superseded; items whose record was deleted are removed. Returns the
+    number of items created, changed or removed.
+    """
+    if cattle_ids is None:
+        cattle_ids = Cattle.objects.values_list('id', flat=True).order_by('id')
+    cattle_ids = list(cattle_ids)
+    changed = 0
+    for start in range(0, len(cattle_ids), CARE_REFRESH_CHUNK_SIZE):
+        chunk = cattle_ids[start:start + CARE_REFRESH_CHUNK_SIZE]
+        with transaction.atomic():
+            changed += _refresh_chunk(chunk)
+    return changed
+
+
+def _refresh_chunk(cattle_ids):
+    cattle = {
+        cattle_id: (owner_id, status)
+        for cattle_id, owner_id, status in Cattle.objects.filter(
+            id__in=cattle_ids
+        ).values_list('id', 'owner_id', 'status')
+    }
+    desired = {}
+    for key, (cattle_id, due_date, status) in _desired_items(cattle_ids).items():
+        owner_id, cattle_status = cattle[cattle_id]
+        if status == 'due' and cattle_status != 'active':
+            status = 'superseded'
+        desired[key] = (owner_id, cattle_id, due_date, status)
+
+    now = timezone.now()
+    stale_ids = []
+    updates = []
+    existing = CareDueItem.objects.filter(cattle_id__in=cattle_ids).only(
+        'id', 'kind', 'source_id', 'owner_id', 'cattle_id', 'due_date', 'status'
+    )
+    for item in existing:
+        values = desired.pop((item.kind, item.source_id), None)
+        if values is None:
+            stale_ids.append(item.pk)
+        elif values != (item.owner_id, item.cattle_id, item.due_date, item.status):
+            item.owner_id, item.cattle_id, item.due_date, item.status = values
+            item.updated_at = now
+            updates.append(item)
+
+    if stale_ids:
+        CareDueItem.objects.filter(id__in=stale_ids).delete()
+    CareDueItem.objects.bulk_update(
+        updates, ['owner', 'cattle', 'due_date', 'status', 'updated_at'],
+        batch_size=CARE_BATCH_SIZE,
+    )
+    # A concurrent refresh of the same cattle may have inserted some already
+    CareDueItem.objects.bulk_create(
+        [
+            CareDueItem(
+                kind=kind, source_id=source_id, owner_id=owner_id,
+                cattle_id=cattle_id, due_date=due_date, status=status,
+            )
+            for (kind, source_id), (owner_id, cattle_id, due_date, status) in desired.items()
+        ],
+        batch_size=CARE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    return len(stale_ids) + len(updates) + len(desired)
+
+
+def due_care_items(owner=None, days=7, today=None, kinds=None, include_overdue=True):
+    """
+    Open care items due within ``days`` days, for one owner or everyone.
+    One range scan of the (owner, status, due_date) index.
+    """
+    today = today or timezone.localdate()
+    items = CareDueItem.objects.filter(status='due', due_date__lte=today + timedelta(days=days))
+    if not include_overdue:
+        items = items.filter(due_date__gte=today)
+    if owner is not None:
+        items = items.filter(owner=owner)
+    if kinds:
+        items = items.filter(kind__in=kinds)
+    return items.select_related('cattle').order_by('due_date', 'id')
@@ -1,9 +1,12 @@
 # farm/context_processors.py
+from .notifications import get_notification_summary
+
+
 def notifications(request):
     if request.user.is_authenticated:
-        unread_notifications = request.user.notification_set.filter(read_at__isnull=True)
+        summary = get_notification_summary(request.user.pk)
         return {
-            'unread_notifications': unread_notifications,
-            'notifications': request.user.notification_set.all()[:5]
+            'unread_notification_count': summary['unread'],
+            'recent_notifications': summary['recent'],
         }
     return {}
@@ -0,0 +1,71 @@
+# farm/events.py
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+# Pending wake-ups per connection; more are coalesced into one
+SUBSCRIBER_QUEUE_SIZE = getattr(settings, 'FARM_EVENTS_QUEUE_SIZE', 1)
+
+
+class NotificationBroker:
+    """
+    In-process pub/sub telling open event streams that a user's
+    notifications changed.
+
+    Each stream owns an asyncio.Queue on its event loop. publish() may be
+    called from any thread (views, on_commit hooks, workers) and only
+    schedules a put on the loops of the users' streams, so an idle
+    connection costs one queue and a set entry.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE))
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription[1]
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            subscriptions = self._subscribers.get(user_id)
+            if not subscriptions:
+                return
+            subscriptions.difference_update(
+                [subscription for subscription in subscriptions if subscription[1] is queue]
+            )
+            if not subscriptions:
+                del self._subscribers[user_id]
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    def publish(self, user_ids):
+        with self._lock:
+            targets = [
+                subscription
+                for user_id in user_ids
+                for subscription in self._subscribers.get(user_id, ())
+            ]
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(_wake, queue)
+            except RuntimeError:
+                # The stream's loop has already closed
+                continue
+
+
+def _wake(queue):
+    try:
+        queue.put_nowait(True)
+    except asyncio.QueueFull:
+        # A wake-up is already pending; the stream reads the latest state anyway
+        pass
+
+
+broker = NotificationBroker()
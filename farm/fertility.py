@@ -0,0 +1,325 @@
+# farm/fertility.py
+import threading
+from datetime import date
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Breeding, CattleFertilityStats, FertilityMonthlyStats, QueuedJob
+
+FERTILITY_BATCH_SIZE = 1000
+BREEDING_TYPES = [value for value, _ in Breeding.BREEDING_TYPE_CHOICES]
+
+# Room for every date ordinal when combining (cow, day) into one sort key
+_DAY_SPAN = 1 << 20
+_EPOCH = date(1970, 1, 1).toordinal()
+
+_pending = threading.local()
+
+
+def normalize_sire(sire_details):
+    return ' '.join(sire_details.split())[:200]
+
+
+def schedule_fertility_refresh(owner_ids):
+    """
+    Queue a recomputation of these owners' fertility figures once the
+    current transaction commits
+    """
+    if not hasattr(_pending, 'owners'):
+        _pending.owners = set()
+    _pending.owners.update(owner_ids)
+    transaction.on_commit(_enqueue_pending)
+
+
+def _enqueue_pending():
+    from .tasks import refresh_fertility_kpis
+
+    owner_ids, _pending.owners = getattr(_pending, 'owners', set()), set()
+    if not owner_ids:
+        return
+    # A refresh that has not started yet will see this change as well
+    kwargs = {'owner_ids': sorted(owner_ids)}
+    if not QueuedJob.objects.filter(
+        name=refresh_fertility_kpis.name, status='queued', attempts=0, kwargs=kwargs
+    ).exists():
+        refresh_fertility_kpis.delay(**kwargs)
+
+
+def load_breeding_history(owner_ids=None):
+    """
+    Every breeding record (of these owners) as numpy columns, sorted by cow
+    and service date, from a single query
+    """
+    breedings = Breeding.objects.all()
+    if owner_ids is not None:
+        breedings = breedings.filter(cattle__owner_id__in=owner_ids)
+    rows = list(breedings.order_by('cattle_id', 'date', 'id').values_list(
+        'cattle_id', 'cattle__owner_id', 'date', 'status', 'breeding_type',
+        'sire_details', 'actual_calving_date'
+    ))
+    count = len(rows)
+    columns = list(zip(*rows)) if rows else [()] * 7
+    calving = np.fromiter(
+        (day.toordinal() if day else -1 for day in columns[6]), dtype=np.int64, count=count
+    )
+    status = np.array(columns[3], dtype=object)
+    sires, sire_index = np.unique(
+        np.array([normalize_sire(sire) for sire in columns[5]], dtype=object), return_inverse=True
+    )
+    type_of = {value: index for index, value in enumerate(BREEDING_TYPES)}
+    # A recorded calving proves the service was successful whatever its status
+    success = (status == 'successful') | (calving >= 0)
+    return {
+        'cattle': np.array(columns[0], dtype=np.int64),
+        'owner': np.array(columns[1], dtype=np.int64),
+        'service': np.fromiter((day.toordinal() for day in columns[2]), dtype=np.int64, count=count),
+        'success': success,
+        'resolved': success | (status == 'unsuccessful'),
+        'breeding_type': np.fromiter(
+            (type_of.get(value, 0) for value in columns[4]), dtype=np.int64, count=count
+        ),
+        'sire': sire_index.astype(np.int64).reshape(count),
+        'sires': sires,
+        'calving': calving,
+    }
+
+
+def _months(ordinals):
+    # Months since January 1970 of date ordinals
+    return (ordinals - _EPOCH).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+def _group_sum(groups, size, weights=None):
+    return np.bincount(groups, weights=weights, minlength=size)
+
+
+def fertility_kpis(history, today=None):
+    """
+    Compute per-cow and per-month fertility figures from
+    load_breeding_history() columns with array arithmetic only.
+
+    A cycle is the run of services of a cow up to and including a
+    conception; services per conception counts the resolved services of
+    each completed cycle. Days open run from the last calving before a
+    conceiving service to that service. Calving intervals are the gaps
+    between consecutive calvings of a cow.
+    """
+    today = (today or timezone.localdate()).toordinal()
+    cattle = history['cattle']
+    cattle_ids, first_row, rank = np.unique(cattle, return_index=True, return_inverse=True)
+    rank = rank.reshape(len(cattle))
+    cows = len(cattle_ids)
+    success = history['success']
+    resolved = history['resolved']
+    service = history['service']
+
+    # Cycles: conceptions seen before each row, counted per cow
+    conceived_before = np.cumsum(success) - success
+    cycle = conceived_before - conceived_before[first_row][rank]
+    cycle_keys, cycle_of = np.unique(rank * (len(cattle) + 1) + cycle, return_inverse=True)
+    services_in_cycle = _group_sum(cycle_of.reshape(len(cattle)), len(cycle_keys), resolved)
+    cycle_services = np.where(success, services_in_cycle[cycle_of.reshape(len(cattle))], 0)
+
+    # Calvings, sorted by cow and date
+    calved = np.flatnonzero(history['calving'] >= 0)
+    calved = calved[np.lexsort((history['calving'][calved], rank[calved]))]
+    calving_rank = rank[calved]
+    calving_day = history['calving'][calved]
+    interval = np.full(len(calved), -1, dtype=np.int64)
+    same_cow = calving_rank[1:] == calving_rank[:-1]
+    interval[1:][same_cow] = (calving_day[1:] - calving_day[:-1])[same_cow]
+
+    # Days open: from the cow's last calving before each conceiving service
+    calving_keys = calving_rank * _DAY_SPAN + calving_day
+    previous = np.searchsorted(calving_keys, rank * _DAY_SPAN + service, side='left') - 1
+    has_previous = (previous >= 0) & success
+    has_previous[has_previous] = calving_rank[previous[has_previous]] == rank[has_previous]
+    days_open = np.zeros(len(cattle), dtype=np.int64)
+    days_open[has_previous] = service[has_previous] - calving_day[previous[has_previous]]
+
+    # Per cow
+    calvings = _group_sum(calving_rank, cows)
+    last_calving = np.full(cows, -1, dtype=np.int64)
+    np.maximum.at(last_calving, calving_rank, calving_day)
+    valid_interval = interval >= 0
+    interval_total = _group_sum(calving_rank, cows, np.where(valid_interval, interval, 0))
+    interval_count = _group_sum(calving_rank, cows, valid_interval)
+    services = _group_sum(rank, cows, resolved)
+    conceptions = _group_sum(rank, cows, success)
+    cycle_total = _group_sum(rank, cows, cycle_services)
+    open_total = _group_sum(rank, cows, days_open)
+    open_count = _group_sum(rank, cows, has_previous)
+
+    # Open days of the current cycle: to the first conception after the
+    # last calving, or to today
+    after_calving = success & (last_calving[rank] >= 0) & (service > last_calving[rank])
+    first_conception = np.full(cows, np.iinfo(np.int64).max)
+    np.minimum.at(first_conception, rank[after_calving], service[after_calving])
+    current_days_open = np.where(
+        first_conception < np.iinfo(np.int64).max, first_conception, today
+    ) - last_calving
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        per_cow = {
+            'cattle_id': cattle_ids,
+            'calvings': calvings,
+            'last_calving': last_calving,
+            'average_calving_interval': interval_total / interval_count,
+            'services': services,
+            'conceptions': conceptions,
+            'services_per_conception': cycle_total / conceptions,
+            'average_days_open': open_total / open_count,
+            'current_days_open': np.where(last_calving >= 0, current_days_open, -1),
+        }
+
+    # Per month: services by service month, calvings by calving month
+    service_rows = np.flatnonzero(resolved)
+    keys = np.concatenate([
+        np.stack([
+            history['owner'][service_rows], _months(service[service_rows]),
+            history['breeding_type'][service_rows], history['sire'][service_rows],
+        ], axis=1),
+        np.stack([
+            history['owner'][calved], _months(calving_day),
+            history['breeding_type'][calved], history['sire'][calved],
+        ], axis=1),
+    ]).reshape(-1, 4)
+    groups, group_of = np.unique(keys, axis=0, return_inverse=True)
+    group_of = group_of.reshape(len(keys))
+    size = len(groups)
+    zeros = np.zeros(len(calved))
+
+    def by_month(service_weights, calving_weights):
+        return _group_sum(group_of, size, np.concatenate([service_weights, calving_weights]))
+
+    ones_services = np.ones(len(service_rows))
+    per_month = {
+        'owner_id': groups[:, 0],
+        'month': groups[:, 1],
+        'breeding_type': groups[:, 2],
+        'sire': groups[:, 3],
+        'services': by_month(ones_services, zeros),
+        'conceptions': by_month(success[service_rows], zeros),
+        'cycle_services': by_month(cycle_services[service_rows], zeros),
+        'days_open_total': by_month(days_open[service_rows], zeros),
+        'days_open_count': by_month(has_previous[service_rows], zeros),
+        'calvings': by_month(np.zeros(len(service_rows)), np.ones(len(calved))),
+        'calving_interval_total': by_month(
+            np.zeros(len(service_rows)), np.where(valid_interval, interval, 0)
+        ),
+        'calving_interval_count': by_month(np.zeros(len(service_rows)), valid_interval),
+    }
+    return per_cow, per_month
+
+
+def _optional(value, cast=float):
+    return cast(value) if np.isfinite(value) and value >= 0 else None
+
+
+def refresh_fertility_stats(owner_ids=None, today=None):
+    """
+    Recompute the materialized fertility figures of these owners (every
+    owner when None) from their whole breeding history in one pass.
+    Returns (cows, monthly rows) written.
+    """
+    history = load_breeding_history(owner_ids)
+    per_cow, per_month = fertility_kpis(history, today)
+
+    cow_stats = [
+        CattleFertilityStats(
+            cattle_id=int(cattle_id),
+            calvings=int(per_cow['calvings'][index]),
+            last_calving_date=(
+                date.fromordinal(int(per_cow['last_calving'][index]))
+                if per_cow['last_calving'][index] >= 0 else None
+            ),
+            average_calving_interval=_optional(per_cow['average_calving_interval'][index]),
+            services=int(per_cow['services'][index]),
+            conceptions=int(per_cow['conceptions'][index]),
+            services_per_conception=_optional(per_cow['services_per_conception'][index]),
+            average_days_open=_optional(per_cow['average_days_open'][index]),
+            current_days_open=_optional(per_cow['current_days_open'][index], int),
+        )
+        for index, cattle_id in enumerate(per_cow['cattle_id'])
+    ]
+    sires = history['sires']
+    monthly_stats = [
+        FertilityMonthlyStats(
+            owner_id=int(per_month['owner_id'][index]),
+            month=(np.datetime64(int(per_month['month'][index]), 'M').astype('datetime64[D]').item()),
+            breeding_type=BREEDING_TYPES[per_month['breeding_type'][index]],
+            sire=sires[per_month['sire'][index]],
+            **{
+                field: int(round(per_month[field][index]))
+                for field in (
+                    'services', 'conceptions', 'cycle_services', 'days_open_total',
+                    'days_open_count', 'calvings', 'calving_interval_total',
+                    'calving_interval_count',
+                )
+            },
+        )
+        for index in range(len(per_month['owner_id']))
+    ]
+
+    existing_cows = CattleFertilityStats.objects.all()
+    existing_months = FertilityMonthlyStats.objects.all()
+    if owner_ids is not None:
+        existing_cows = existing_cows.filter(cattle__owner_id__in=owner_ids)
+        existing_months = existing_months.filter(owner_id__in=owner_ids)
+    with transaction.atomic():
+        existing_cows.delete()
+        existing_months.delete()
+        CattleFertilityStats.objects.bulk_create(cow_stats, batch_size=FERTILITY_BATCH_SIZE)
+        FertilityMonthlyStats.objects.bulk_create(monthly_stats, batch_size=FERTILITY_BATCH_SIZE)
+    return len(cow_stats), len(monthly_stats)
+
+
+def fertility_summary(owner=None, start_month=None, end_month=None, group_by=()):
+    """
+    Fertility KPIs of one herd (every herd when None) from the monthly
+    figures, optionally per ``group_by`` fields such as
+    ('breeding_type', 'sire') or ('month',)
+    """
+    rows = FertilityMonthlyStats.objects.all()
+    if owner is not None:
+        rows = rows.filter(owner=owner)
+    if start_month:
+        rows = rows.filter(month__gte=start_month)
+    if end_month:
+        rows = rows.filter(month__lte=end_month)
+    sums = {
+        'total_services': Sum('services'),
+        'total_conceptions': Sum('conceptions'),
+        'total_cycle_services': Sum('cycle_services'),
+        'total_days_open': Sum('days_open_total'),
+        'days_open_records': Sum('days_open_count'),
+        'total_calvings': Sum('calvings'),
+        'total_calving_interval': Sum('calving_interval_total'),
+        'calving_interval_records': Sum('calving_interval_count'),
+    }
+    if group_by:
+        totals = rows.values(*group_by).annotate(**sums).order_by(*group_by)
+    else:
+        totals = [rows.aggregate(**sums)]
+
+    def ratio(numerator, denominator):
+        return numerator / denominator if denominator else None
+
+    return [
+        {
+            **{field: row[field] for field in group_by},
+            'services': row['total_services'] or 0,
+            'conceptions': row['total_conceptions'] or 0,
+            'calvings': row['total_calvings'] or 0,
+            'conception_rate': ratio(row['total_conceptions'], row['total_services']),
+            'services_per_conception': ratio(row['total_cycle_services'], row['total_conceptions']),
+            'average_days_open': ratio(row['total_days_open'], row['days_open_records']),
+            'average_calving_interval': ratio(
+                row['total_calving_interval'], row['calving_interval_records']
+            ),
+        }
+        for row in totals
+    ]
@@ -1,4 +1,12 @@
+from datetime import timedelta
+
 from django import forms
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from .notifications import NOTIFICATION_PURGE_DAYS, NOTIFICATION_PURGE_MAX_DAYS
+from .pedigree import creates_cycle
+from .search import search_health_records
+from .utils import can_view_all_herds
 from .models import (
     Cattle, MilkProduction, HealthRecord, 
     Breeding, Feed, Notification
@@ -10,13 +18,27 @@ class CattleForm(forms.ModelForm):
         fields = [
             'name', 'tag_number', 'breed', 
             'date_of_birth', 'gender', 'weight',
-            'status', 'notes'
+            'status', 'dam', 'sire', 'notes'
         ]
         widgets = {
             'date_of_birth': forms.DateInput(attrs={'type': 'date'}),
             'notes': forms.Textarea(attrs={'rows': 3}),
         }
 
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if user is not None:
+            for field in ('dam', 'sire'):
+                self.fields[field].queryset = self.fields[field].queryset.filter(owner=user).order_by('name')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field in ('dam', 'sire'):
+            parent = cleaned_data.get(field)
+            if parent and (parent.pk == self.instance.pk or creates_cycle(self.instance, parent)):
+                self.add_error(field, 'A cattle cannot descend from itself.')
+        return cleaned_data
+
 class MilkProductionForm(forms.ModelForm):
     class Meta:
         model = MilkProduction
@@ -29,6 +51,29 @@ class MilkProductionForm(forms.ModelForm):
             'notes': forms.Textarea(attrs={'rows': 3}),
         }
 
+class MilkProductionBulkRowForm(forms.Form):
+    """
+    Validates a single row of a bulk milk session upload.
+    The cattle is identified by tag number and resolved by the caller.
+    """
+    tag_number = forms.CharField(max_length=50)
+    date = forms.DateField()
+    milking_session = forms.ChoiceField(
+        choices=MilkProduction.MILKING_SESSION_CHOICES
+    )
+    quantity = forms.DecimalField(
+        max_digits=6,
+        decimal_places=2,
+        min_value=0
+    )
+    fat_content = forms.DecimalField(
+        max_digits=4,
+        decimal_places=2,
+        min_value=0,
+        required=False
+    )
+    notes = forms.CharField(required=False)
+
 from django import forms
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Row, Column, Submit
@@ -121,6 +166,17 @@ class NotificationForm(forms.ModelForm):
             'message': forms.Textarea(attrs={'rows': 3}),
         }
 
+class NotificationPurgeForm(forms.Form):
+    days = forms.IntegerField(
+        required=False,
+        min_value=0,
+        max_value=NOTIFICATION_PURGE_MAX_DAYS
+    )
+
+    def clean_days(self):
+        days = self.cleaned_data['days']
+        return NOTIFICATION_PURGE_DAYS if days is None else days
+
 # Search Forms
 class CattleSearchForm(forms.Form):
     search = forms.CharField(
@@ -164,6 +220,51 @@ class HealthRecordSearchForm(forms.Form):
         required=False,
         widget=forms.DateInput(attrs={'type': 'date'})
     )
+    cattle = forms.ModelChoiceField(
+        queryset=Cattle.objects.all(),
+        required=False,
+        empty_label="All Cattle"
+    )
+    medicine = forms.CharField(required=False, max_length=200)
+    q = forms.CharField(required=False, max_length=200, label='Search')
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if user is not None:
+            self.fields['cattle'].queryset = Cattle.objects.filter(owner=user).order_by('name')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date = cleaned_data.get('start_date')
+        end_date = cleaned_data.get('end_date')
+        if start_date and end_date and start_date > end_date:
+            raise forms.ValidationError('Start date must be before end date.')
+        return cleaned_data
+
+    def filter(self, queryset, exclude=()):
+        """
+        Apply the valid filters to a HealthRecord queryset. The cattle and
+        date conditions are served by the (cattle, date) index; medicine is
+        a prefix match on the rows that remain. The search text goes through
+        the full-text index. ``exclude`` skips the 'record_type' or 'date'
+        filters, for counting facets.
+        """
+        if not self.is_valid():
+            return queryset
+        data = self.cleaned_data
+        if data['q']:
+            queryset = search_health_records(queryset, data['q'])
+        if data['cattle']:
+            queryset = queryset.filter(cattle=data['cattle'])
+        if data['record_type'] and 'record_type' not in exclude:
+            queryset = queryset.filter(record_type=data['record_type'])
+        if data['start_date'] and 'date' not in exclude:
+            queryset = queryset.filter(date__gte=data['start_date'])
+        if data['end_date'] and 'date' not in exclude:
+            queryset = queryset.filter(date__lte=data['end_date'])
+        if data['medicine']:
+            queryset = queryset.filter(medicine__istartswith=data['medicine'].strip())
+        return queryset
 
 # Filter Forms
 class DateRangeFilterForm(forms.Form):
@@ -176,6 +277,39 @@ class DateRangeFilterForm(forms.Form):
         widget=forms.DateInput(attrs={'type': 'date'})
     )
 
+class AnalyticsFilterForm(DateRangeFilterForm):
+    """
+    Date range and herd for the analytics dashboard, defaulting to the last
+    30 days. Only admins get the owner choice; everyone else always sees
+    their own herd.
+    """
+    owner = forms.ModelChoiceField(
+        queryset=get_user_model().objects.filter(cattle__isnull=False).distinct(),
+        required=False,
+        empty_label="All Herds"
+    )
+
+    def __init__(self, *args, user=None, max_days=366, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_days = max_days
+        if not can_view_all_herds(user):
+            del self.fields['owner']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        end_date = cleaned_data.get('end_date') or timezone.now().date()
+        start_date = cleaned_data.get('start_date') or end_date - timedelta(days=30)
+        if start_date > end_date:
+            raise forms.ValidationError('Start date must be before end date.')
+        if (end_date - start_date).days >= self.max_days:
+            raise forms.ValidationError(
+                f'The date range cannot be longer than {self.max_days} days.'
+            )
+        cleaned_data['start_date'] = start_date
+        cleaned_data['end_date'] = end_date
+        return cleaned_data
+
+
 class FeedFilterForm(forms.Form):
     feed_type = forms.ChoiceField(
         choices=[('', 'All')] + Feed.FEED_TYPE_CHOICES,
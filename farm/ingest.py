@@ -0,0 +1,157 @@
+# farm/ingest.py
+import csv
+import io
+import json
+
+from django.db import transaction
+
+from .forms import MilkProductionBulkRowForm
+from .models import Cattle, MilkProduction
+from .rollups import schedule_rollup_refresh
+
+# Upper bound on rows accepted in a single upload
+MAX_BULK_ROWS = 5000
+# Rows per INSERT statement when writing
+BULK_BATCH_SIZE = 500
+
+
+class BulkPayloadError(ValueError):
+    """
+    Raised when an upload cannot be parsed into rows at all
+    """
+
+
+def parse_bulk_payload(body, content_type):
+    """
+    Turn a JSON or CSV request body into a list of row dicts.
+
+    JSON may be a list of rows or an object with a ``rows`` list; any
+    ``date``/``milking_session`` keys on the object are used as defaults
+    for every row, so a whole session can be posted without repeating them.
+    CSV must have a header row naming the columns.
+    """
+    if isinstance(body, bytes):
+        body = body.decode('utf-8-sig')
+
+    if 'csv' in content_type:
+        reader = csv.DictReader(io.StringIO(body))
+        rows = [
+            {key.strip(): (value or '').strip() for key, value in row.items() if key}
+            for row in reader
+        ]
+    else:
+        try:
+            payload = json.loads(body)
+        except ValueError as exc:
+            raise BulkPayloadError(f"Invalid JSON: {exc}")
+        if isinstance(payload, dict):
+            defaults = {
+                key: payload[key] for key in ('date', 'milking_session')
+                if key in payload
+            }
+            rows = payload.get('rows')
+            if isinstance(rows, list):
+                rows = [
+                    {**defaults, **row} if isinstance(row, dict) else row
+                    for row in rows
+                ]
+        else:
+            rows = payload
+        if not isinstance(rows, list):
+            raise BulkPayloadError("Expected a list of rows.")
+
+    if len(rows) > MAX_BULK_ROWS:
+        raise BulkPayloadError(f"At most {MAX_BULK_ROWS} rows can be uploaded at once.")
+    return rows
+
+
+def ingest_milk_rows(rows, user):
+    """
+    Validate and upsert many milk production rows for ``user``'s herd.
+
+    All rows are validated first, tag numbers are resolved with a single
+    query and the valid rows are written in one transaction with batched
+    INSERTs. Rows that clash on (cattle, date, milking_session) update the
+    existing record instead of failing.
+
+    Returns a dict with ``created``, ``updated`` and per-row ``errors``
+    (row indexes are zero based, matching the upload order).
+    """
+    errors = []
+    cleaned_rows = []
+
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({'row': index, 'errors': {'__all__': ['Row must be an object.']}})
+            continue
+        form = MilkProductionBulkRowForm(row)
+        if form.is_valid():
+            cleaned_rows.append((index, form.cleaned_data))
+        else:
+            errors.append({
+                'row': index,
+                'errors': {field: list(messages) for field, messages in form.errors.items()}
+            })
+
+    tag_numbers = {data['tag_number'] for _, data in cleaned_rows}
+    cattle_ids = dict(
+        Cattle.objects.filter(
+            owner=user,
+            tag_number__in=tag_numbers
+        ).values_list('tag_number', 'id')
+    )
+
+    productions = {}
+    for index, data in cleaned_rows:
+        cattle_id = cattle_ids.get(data['tag_number'])
+        if cattle_id is None:
+            errors.append({
+                'row': index,
+                'errors': {'tag_number': [f"Unknown tag number '{data['tag_number']}'."]}
+            })
+            continue
+        key = (cattle_id, data['date'], data['milking_session'])
+        if key in productions:
+            errors.append({
+                'row': index,
+                'errors': {'__all__': ['Duplicate cattle, date and session in upload.']}
+            })
+            continue
+        productions[key] = MilkProduction(
+            cattle_id=cattle_id,
+            date=data['date'],
+            milking_session=data['milking_session'],
+            quantity=data['quantity'],
+            fat_content=data['fat_content'],
+            notes=data['notes'],
+            recorded_by=user,
+        )
+
+    errors.sort(key=lambda error: error['row'])
+    if not productions:
+        return {'created': 0, 'updated': 0, 'errors': errors}
+
+    with transaction.atomic():
+        existing = set(
+            MilkProduction.objects.filter(
+                cattle_id__in={key[0] for key in productions},
+                date__in={key[1] for key in productions},
+            ).values_list('cattle_id', 'date', 'milking_session')
+        )
+        updated = len(existing & productions.keys())
+
+        MilkProduction.objects.bulk_create(
+            productions.values(),
+            batch_size=BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['cattle', 'date', 'milking_session'],
+            update_fields=['quantity', 'fat_content', 'notes', 'recorded_by', 'updated_at'],
+        )
+        # bulk_create skips model signals, so refresh the rollups explicitly
+        schedule_rollup_refresh({(key[0], key[1]) for key in productions})
+
+    return {
+        'created': len(productions) - updated,
+        'updated': updated,
+        'errors': errors,
+    }
@@ -0,0 +1,299 @@
+# farm/jobs.py
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Avg, Count, F, Max, Q
+from django.utils import timezone
+
+from .models import JobSchedule, QueuedJob
+
+logger = logging.getLogger(__name__)
+
+# Seconds an idle worker thread sleeps before looking for work again
+JOB_POLL_INTERVAL = getattr(settings, 'FARM_JOB_POLL_INTERVAL', 2.0)
+# Longest pause, in seconds, of a worker thread after repeated errors
+JOB_ERROR_BACKOFF = getattr(settings, 'FARM_JOB_ERROR_BACKOFF', 60.0)
+# Finished jobs are deleted after this many days
+JOB_RETENTION_DAYS = getattr(settings, 'FARM_JOB_RETENTION_DAYS', 14)
+# Interval overrides for periodic tasks, {task name: seconds}
+JOB_SCHEDULES = getattr(settings, 'FARM_JOB_SCHEDULES', {})
+
+_registry = {}
+
+
+class Task:
+    """
+    A function registered with the job queue. Calling it runs it inline;
+    delay() queues it for a worker.
+    """
+
+    def __init__(self, func, name, max_attempts, retry_delay, timeout, schedule):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.schedule = schedule
+        self.__doc__ = func.__doc__
+        self.__name__ = func.__name__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return self.enqueue(args=args, kwargs=kwargs)
+
+    def enqueue(self, args=(), kwargs=None, run_at=None):
+        return QueuedJob.objects.create(
+            name=self.name,
+            args=list(args),
+            kwargs=kwargs or {},
+            run_at=run_at or timezone.now(),
+            max_attempts=self.max_attempts,
+        )
+
+
+def task(name=None, max_attempts=3, retry_delay=60, timeout=15 * 60, schedule=None):
+    """
+    Register a function as a job queue task.
+
+    ``retry_delay`` seconds is doubled after every failed attempt;
+    ``timeout`` is the lease a worker holds on a running job, after which
+    another worker may take it over. ``schedule`` (a timedelta) makes the
+    workers enqueue the task periodically.
+    """
+    def register(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        registered = Task(func, task_name, max_attempts, retry_delay, timeout, schedule)
+        _registry[task_name] = registered
+        return registered
+    return register
+
+
+def registered_tasks():
+    return dict(_registry)
+
+
+def _claimable(now):
+    return (
+        Q(status='queued', run_at__lte=now)
+        | Q(status='running', lease_expires_at__lt=now)
+    )
+
+
+def claim_job(worker_id):
+    """
+    Take the next due job, or one whose worker's lease ran out, and lease
+    it to ``worker_id``. The conditional UPDATE makes the claim safe when
+    several workers race for the same row.
+    """
+    while True:
+        now = timezone.now()
+        candidate = QueuedJob.objects.filter(
+            _claimable(now), name__in=list(_registry)
+        ).order_by('run_at', 'id').values_list('id', 'name').first()
+        if candidate is None:
+            return None
+        job_id, name = candidate
+        claimed = QueuedJob.objects.filter(_claimable(now), pk=job_id).update(
+            status='running',
+            locked_by=worker_id,
+            lease_expires_at=now + timedelta(seconds=_registry[name].timeout),
+            started_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return QueuedJob.objects.get(pk=job_id)
+
+
+def run_job(job, worker_id):
+    """
+    Run a claimed job and record its outcome and duration. Failed jobs are
+    retried with exponential backoff until max_attempts is reached.
+    """
+    registered = _registry[job.name]
+    started = time.monotonic()
+    try:
+        result = registered.func(*job.args, **job.kwargs)
+    except Exception as exc:
+        duration_ms = int((time.monotonic() - started) * 1000)
+        logger.exception('Job %s (%s) failed', job.pk, job.name)
+        finished = timezone.now()
+        updates = {
+            'error': ''.join(traceback.format_exception(exc))[-5000:],
+            'duration_ms': duration_ms,
+            'lease_expires_at': None,
+            'locked_by': '',
+        }
+        if job.attempts < job.max_attempts:
+            updates.update(
+                status='queued',
+                run_at=finished + timedelta(
+                    seconds=registered.retry_delay * 2 ** (job.attempts - 1)
+                ),
+            )
+        else:
+            updates.update(status='failed', finished_at=finished)
+        QueuedJob.objects.filter(pk=job.pk, locked_by=worker_id).update(**updates)
+        return False
+
+    QueuedJob.objects.filter(pk=job.pk, locked_by=worker_id).update(
+        status='done',
+        result=_json_result(result),
+        error='',
+        finished_at=timezone.now(),
+        duration_ms=int((time.monotonic() - started) * 1000),
+        lease_expires_at=None,
+        locked_by='',
+    )
+    return True
+
+
+def _json_result(result):
+    if isinstance(result, tuple):
+        return list(result)
+    if isinstance(result, (dict, list, str, int, float, bool)):
+        return result
+    return None
+
+
+def enqueue_due_schedules():
+    """
+    Queue every periodic task whose time has come. Returns the number of
+    jobs queued.
+    """
+    now = timezone.now()
+    periodic = {
+        name: timedelta(seconds=JOB_SCHEDULES[name]) if name in JOB_SCHEDULES else registered.schedule
+        for name, registered in _registry.items()
+        if registered.schedule or name in JOB_SCHEDULES
+    }
+    existing = set(JobSchedule.objects.filter(name__in=periodic).values_list('name', flat=True))
+    JobSchedule.objects.bulk_create(
+        [
+            JobSchedule(
+                name=name,
+                interval_seconds=int(interval.total_seconds()),
+                next_run_at=now,
+            )
+            for name, interval in periodic.items()
+            if name not in existing
+        ],
+        ignore_conflicts=True,
+    )
+
+    queued = 0
+    for name, interval in periodic.items():
+        advanced = JobSchedule.objects.filter(name=name, next_run_at__lte=now).update(
+            next_run_at=now + interval,
+            interval_seconds=int(interval.total_seconds()),
+            last_enqueued_at=now,
+        )
+        if advanced:
+            _registry[name].enqueue()
+            queued += 1
+    return queued
+
+
+@task(schedule=timedelta(days=1))
+def purge_finished_jobs(days=JOB_RETENTION_DAYS):
+    """
+    Delete finished jobs older than ``days`` days
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = QueuedJob.objects.filter(
+        status__in=['done', 'failed'], finished_at__lt=cutoff
+    ).delete()
+    return deleted
+
+
+def job_metrics(since=None):
+    """
+    Per-task run counts and timings of the jobs finished since ``since``
+    (default: the last 24 hours)
+    """
+    since = since or timezone.now() - timedelta(days=1)
+    return list(
+        QueuedJob.objects.filter(finished_at__gte=since)
+        .values('name')
+        .annotate(
+            runs=Count('id'),
+            failures=Count('id', filter=Q(status='failed')),
+            avg_ms=Avg('duration_ms'),
+            max_ms=Max('duration_ms'),
+        )
+        .order_by('name')
+    )
+
+
+class Worker:
+    """
+    ``threads`` threads that claim and run jobs, one of which also queues
+    the periodic tasks. stop() lets running jobs finish.
+    """
+
+    def __init__(self, threads=1, poll_interval=JOB_POLL_INTERVAL, burst=False):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self._stop = threading.Event()
+        self.processed = 0
+        self._lock = threading.Lock()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        workers = [
+            threading.Thread(target=self._loop, args=(index,), name=f'farm-job-{index}')
+            for index in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(0.5)
+        except KeyboardInterrupt:
+            self.stop()
+            for worker in workers:
+                worker.join()
+        return self.processed
+
+    def _loop(self, index):
+        worker_id = f'{self.name}:{index}'
+        errors = 0
+        try:
+            while not self._stop.is_set():
+                try:
+                    close_old_connections()
+                    if index == 0:
+                        enqueue_due_schedules()
+                    job = claim_job(worker_id)
+                    if job is None:
+                        if self.burst:
+                            return
+                        self._stop.wait(self.poll_interval)
+                        continue
+                    run_job(job, worker_id)
+                except Exception:
+                    # e.g. "database is locked": keep the thread alive and
+                    # back off, doubling the pause while errors go on
+                    logger.exception('Job worker %s failed', worker_id)
+                    connection.close()
+                    errors += 1
+                    self._stop.wait(min(self.poll_interval * 2 ** (errors - 1), JOB_ERROR_BACKOFF))
+                    continue
+                errors = 0
+                with self._lock:
+                    self.processed += 1
+        finally:
+            connection.close()
@@ -0,0 +1,147 @@
+# farm/lactation.py
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Breeding, LactationCurve, MilkDailyRollup
+
+# Only the standard lactation length is used for fitting
+MAX_DAYS_IN_MILK = getattr(settings, 'FARM_LACTATION_MAX_DAYS', 305)
+# Fewer daily records than this give unreliable curves
+MIN_FIT_POINTS = getattr(settings, 'FARM_LACTATION_MIN_POINTS', 10)
+
+
+def fit_wood_curves(groups, days_in_milk, yields, group_count):
+    """
+    Fit Wood's curve y = a * t^b * e^(-c*t) to many cows at once.
+
+    ``groups`` assigns every (days_in_milk, yield) point to a cow. The
+    curve is linear in log space, ln y = ln a + b ln t - c t, so each cow
+    is an ordinary least squares problem; the 3x3 normal equations of all
+    cows are accumulated with bincount and solved as one stacked system.
+
+    Returns (a, b, c, points) arrays of length ``group_count``; cows with
+    too few points get NaN parameters.
+    """
+    groups = np.asarray(groups, dtype=np.int64)
+    t = np.asarray(days_in_milk, dtype=np.float64)
+    log_y = np.log(np.asarray(yields, dtype=np.float64))
+    design = np.stack([np.ones_like(t), np.log(t), -t], axis=1)
+
+    xtx = np.empty((group_count, 3, 3))
+    xty = np.empty((group_count, 3))
+    for i in range(3):
+        xty[:, i] = np.bincount(groups, weights=design[:, i] * log_y, minlength=group_count)
+        for j in range(i, 3):
+            xtx[:, i, j] = xtx[:, j, i] = np.bincount(
+                groups, weights=design[:, i] * design[:, j], minlength=group_count
+            )
+    points = np.bincount(groups, minlength=group_count)
+
+    coefficients = np.einsum('nij,nj->ni', np.linalg.pinv(xtx), xty)
+    a = np.exp(coefficients[:, 0])
+    b = coefficients[:, 1]
+    c = coefficients[:, 2]
+    too_few = points < MIN_FIT_POINTS
+    a[too_few] = b[too_few] = c[too_few] = np.nan
+    return a, b, c, points
+
+
+def mark_curves_stale(cattle_ids):
+    """
+    Flag the curves of cattle that received new milk records for refitting
+    """
+    LactationCurve.objects.filter(
+        cattle_id__in=cattle_ids, is_stale=False
+    ).update(is_stale=True)
+
+
+def refit_lactation_curves(cattle_ids=None, refit_all=False):
+    """
+    Fit the current lactation of every cow that needs it in one batch.
+
+    A cow needs fitting when it has a calving date but no curve for it yet,
+    or when its curve was marked stale by new milk records. A cow with
+    fewer than MIN_FIT_POINTS days in milk gets a curve without parameters,
+    so only new milk records bring her back. Returns the number of curves
+    fitted.
+    """
+    calvings = Breeding.objects.filter(actual_calving_date__isnull=False)
+    if cattle_ids is not None:
+        calvings = calvings.filter(cattle_id__in=cattle_ids)
+    latest_calving = dict(
+        calvings.values('cattle_id').annotate(
+            calving=Max('actual_calving_date')
+        ).values_list('cattle_id', 'calving').order_by()
+    )
+    if not latest_calving:
+        return 0
+
+    if not refit_all:
+        fresh = set(
+            LactationCurve.objects.filter(
+                cattle_id__in=latest_calving.keys(), is_stale=False
+            ).values_list('cattle_id', 'calving_date')
+        )
+        latest_calving = {
+            cattle_id: calving for cattle_id, calving in latest_calving.items()
+            if (cattle_id, calving) not in fresh
+        }
+        if not latest_calving:
+            return 0
+
+    cattle_order = list(latest_calving)
+    group_of = {cattle_id: index for index, cattle_id in enumerate(cattle_order)}
+    rows = MilkDailyRollup.objects.filter(
+        cattle_id__in=cattle_order,
+        date__gte=min(latest_calving.values()),
+        total_quantity__gt=0,
+    ).values_list('cattle_id', 'date', 'total_quantity').order_by()
+
+    groups, days_in_milk, yields, last_dates = [], [], [], {}
+    for cattle_id, day, quantity in rows.iterator(chunk_size=5000):
+        t = (day - latest_calving[cattle_id]).days + 1
+        if t < 1 or t > MAX_DAYS_IN_MILK:
+            continue
+        groups.append(group_of[cattle_id])
+        days_in_milk.append(t)
+        yields.append(quantity)
+        if day > last_dates.get(cattle_id, day.min):
+            last_dates[cattle_id] = day
+
+    a, b, c, points = fit_wood_curves(groups, days_in_milk, yields, len(cattle_order))
+    fitted = np.isfinite(a)
+    curves = [
+        LactationCurve(
+            cattle_id=cattle_id,
+            calving_date=latest_calving[cattle_id],
+            a=float(a[index]) if fitted[index] else None,
+            b=float(b[index]) if fitted[index] else None,
+            c=float(c[index]) if fitted[index] else None,
+            points=int(points[index]),
+            fitted_through=last_dates.get(cattle_id),
+            is_stale=False,
+        )
+        for index, cattle_id in enumerate(cattle_order)
+    ]
+    with transaction.atomic():
+        LactationCurve.objects.bulk_create(
+            curves,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['cattle', 'calving_date'],
+            update_fields=['a', 'b', 'c', 'points', 'fitted_through', 'is_stale', 'fitted_at'],
+        )
+    return int(fitted.sum())
+
+
+def current_curve(cattle):
+    """
+    The curve for the cow's most recent lactation, or None when it has
+    not been fitted yet
+    """
+    curve = LactationCurve.objects.filter(cattle=cattle).order_by('-calving_date').first()
+    if curve is None or curve.a is None:
+        return None
+    return curve
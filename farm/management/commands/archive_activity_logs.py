@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from farm.archive import (
+    ACTIVITY_ARCHIVE_CHUNK_SIZE, ACTIVITY_ARCHIVE_KEEP_MONTHS, ACTIVITY_LOG_RETENTION_DAYS,
+    archive_activity_logs, purge_activity_archives
+)
+
+
+class Command(BaseCommand):
+    help = 'Move old activity logs into compressed monthly archive files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=ACTIVITY_LOG_RETENTION_DAYS,
+            help='Archive logs older than this many days',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=ACTIVITY_ARCHIVE_CHUNK_SIZE,
+            help='Number of logs moved per step',
+        )
+        parser.add_argument(
+            '--keep-months',
+            type=int,
+            default=ACTIVITY_ARCHIVE_KEEP_MONTHS,
+            help='Delete archive files older than this many months',
+        )
+
+    def handle(self, *args, **options):
+        moved = archive_activity_logs(options['days'], options['chunk_size'])
+        removed = purge_activity_archives(options['keep_months'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved} activity logs, removed {removed} expired archive months.'
+        ))
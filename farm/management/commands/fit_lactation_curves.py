@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from farm.lactation import refit_lactation_curves
+
+
+class Command(BaseCommand):
+    help = 'Fit lactation curves for cows with new milk records or a new calving'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Refit every current lactation, not just the stale ones',
+        )
+
+    def handle(self, *args, **options):
+        count = refit_lactation_curves(refit_all=options['all'])
+        self.stdout.write(self.style.SUCCESS(f'Fitted {count} lactation curves.'))
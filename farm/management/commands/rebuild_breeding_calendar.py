@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from farm.breeding_calendar import refresh_breeding_calendar
+
+
+class Command(BaseCommand):
+    help = 'Regenerate the predicted heats, pregnancy checks and calvings of every cow'
+
+    def handle(self, *args, **options):
+        written = refresh_breeding_calendar()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} breeding calendar events.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from farm.care import refresh_care_items
+
+
+class Command(BaseCommand):
+    help = 'Recompute the care due items from the health and breeding records'
+
+    def handle(self, *args, **options):
+        changed = refresh_care_items()
+        self.stdout.write(self.style.SUCCESS(f'Updated {changed} care due items.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from farm.rollups import ROLLUP_BATCH_SIZE, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily and monthly milk rollup tables from MilkProduction'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ROLLUP_BATCH_SIZE,
+            help='Number of rollup rows written per INSERT',
+        )
+
+    def handle(self, *args, **options):
+        daily_count, monthly_count = rebuild_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {daily_count} daily and {monthly_count} monthly milk rollups.'
+        ))
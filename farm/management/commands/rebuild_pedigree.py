@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from farm.models import Cattle
+from farm.pedigree import rebuild_ancestry
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ancestry closure table and inbreeding coefficients of the whole herd'
+
+    def handle(self, *args, **options):
+        rows = rebuild_ancestry(Cattle.objects.values_list('id', flat=True))
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} ancestry rows.'))
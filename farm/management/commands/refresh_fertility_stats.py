@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from farm.fertility import refresh_fertility_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-cow and monthly fertility figures from the breeding records'
+
+    def handle(self, *args, **options):
+        cows, months = refresh_fertility_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed fertility figures for {cows} cows in {months} monthly rows.'
+        ))
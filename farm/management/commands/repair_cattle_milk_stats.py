@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from farm.rollups import refresh_cattle_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-cattle milk counters directly from MilkProduction'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'cattle_ids',
+            nargs='*',
+            type=int,
+            help='Only repair these cattle (default: all)',
+        )
+
+    def handle(self, *args, **options):
+        count = refresh_cattle_stats(options['cattle_ids'] or None, from_raw=True)
+        self.stdout.write(self.style.SUCCESS(f'Repaired milk counters for {count} cattle.'))
@@ -0,0 +1,54 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from farm import tasks  # noqa: F401  registers the farm tasks
+from farm.jobs import JOB_POLL_INTERVAL, Worker, job_metrics
+
+
+class Command(BaseCommand):
+    help = 'Run queued and periodic background jobs from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=2,
+            help='Number of jobs run at the same time by this process',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=JOB_POLL_INTERVAL,
+            help='Seconds an idle thread waits before checking the queue again',
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for new jobs',
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Print run counts and timings of the last 24 hours and exit',
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for row in job_metrics():
+                self.stdout.write(
+                    f"{row['name']}: {row['runs']} runs, {row['failures']} failed, "
+                    f"avg {row['avg_ms'] or 0:.0f} ms, max {row['max_ms'] or 0} ms"
+                )
+            return
+
+        worker = Worker(
+            threads=options['threads'],
+            poll_interval=options['poll_interval'],
+            burst=options['burst'],
+        )
+        # Let running jobs finish on shutdown; they are not retried from scratch
+        signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+        signal.signal(signal.SIGINT, lambda *_: worker.stop())
+        processed = worker.run()
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker.name} ran {processed} jobs.'))
@@ -1,13 +1,20 @@
 # middleware.py
+from .activity import current_request
+
 
 class ActivityLogMiddleware:
+    """
+    Exposes the current request to the activity log, so model changes made
+    while handling it are attributed to the requesting user and IP. The
+    entries themselves are written in the background by farm.activity.
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        response = self.get_response(request)
-        return response
-
-    def process_view(self, request, view_func, view_args, view_kwargs):
-        # Add your activity logging logic here if needed
-        return None
+        token = current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            current_request.reset(token)
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:05
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MilkDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('morning_quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=8, verbose_name='Morning (L)')),
+                ('afternoon_quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=8, verbose_name='Afternoon (L)')),
+                ('evening_quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=8, verbose_name='Evening (L)')),
+                ('total_quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=8, verbose_name='Total (L)')),
+                ('record_count', models.PositiveIntegerField(default=0, verbose_name='Record Count')),
+                ('cattle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='milk_daily_rollups', to='farm_management.cattle', verbose_name='Cattle')),
+            ],
+            options={
+                'verbose_name': 'Daily Milk Rollup',
+                'verbose_name_plural': 'Daily Milk Rollups',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='farm_manage_date_79a799_idx')],
+                'unique_together': {('cattle', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MilkMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Month')),
+                ('morning_quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Morning (L)')),
+                ('afternoon_quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Afternoon (L)')),
+                ('evening_quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Evening (L)')),
+                ('total_quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Total (L)')),
+                ('record_count', models.PositiveIntegerField(default=0, verbose_name='Record Count')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='milk_monthly_rollups', to=settings.AUTH_USER_MODEL, verbose_name='Owner')),
+            ],
+            options={
+                'verbose_name': 'Monthly Milk Rollup',
+                'verbose_name_plural': 'Monthly Milk Rollups',
+                'ordering': ['-month'],
+                'indexes': [models.Index(fields=['month'], name='farm_manage_month_b4d1ca_idx')],
+                'unique_together': {('owner', 'month')},
+            },
+        ),
+    ]
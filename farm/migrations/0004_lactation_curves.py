@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0003_report_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LactationCurve',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('calving_date', models.DateField(verbose_name='Calving Date')),
+                ('a', models.FloatField(verbose_name='Scale (a)')),
+                ('b', models.FloatField(verbose_name='Incline (b)')),
+                ('c', models.FloatField(verbose_name='Decline (c)')),
+                ('points', models.PositiveIntegerField(default=0, verbose_name='Days Fitted')),
+                ('fitted_through', models.DateField(blank=True, null=True, verbose_name='Fitted Through')),
+                ('is_stale', models.BooleanField(default=False, verbose_name='Needs Refit')),
+                ('fitted_at', models.DateTimeField(auto_now=True, verbose_name='Fitted At')),
+                ('cattle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lactation_curves', to='farm_management.cattle', verbose_name='Cattle')),
+            ],
+            options={
+                'verbose_name': 'Lactation Curve',
+                'verbose_name_plural': 'Lactation Curves',
+                'ordering': ['-calving_date'],
+                'indexes': [models.Index(fields=['is_stale'], name='farm_manage_is_stal_1d3920_idx')],
+                'unique_together': {('cattle', 'calving_date')},
+            },
+        ),
+    ]
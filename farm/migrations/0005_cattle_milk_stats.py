@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:13
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0004_lactation_curves'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CattleMilkStats',
+            fields=[
+                ('cattle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='milk_stats', serialize=False, to='farm_management.cattle', verbose_name='Cattle')),
+                ('total_quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Lifetime Total (L)')),
+                ('last_30_days_quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='Last 30 Days (L)')),
+                ('record_count', models.PositiveIntegerField(default=0, verbose_name='Record Count')),
+                ('last_milking_date', models.DateField(blank=True, null=True, verbose_name='Last Milking Date')),
+                ('window_end', models.DateField(blank=True, null=True, verbose_name='30-Day Window End')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Cattle Milk Stats',
+                'verbose_name_plural': 'Cattle Milk Stats',
+                'indexes': [models.Index(fields=['window_end'], name='farm_manage_window__46e670_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0006_activity_log_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityLogArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True, verbose_name='Month')),
+                ('file_name', models.CharField(max_length=100, verbose_name='File Name')),
+                ('row_count', models.PositiveIntegerField(default=0, verbose_name='Row Count')),
+                ('first_timestamp', models.DateTimeField(blank=True, null=True, verbose_name='First Timestamp')),
+                ('last_timestamp', models.DateTimeField(blank=True, null=True, verbose_name='Last Timestamp')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Activity Log Archive',
+                'verbose_name_plural': 'Activity Log Archives',
+                'ordering': ['-month'],
+            },
+        ),
+    ]
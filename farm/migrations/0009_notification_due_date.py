@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0008_notification_user_unread_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='due_date',
+            field=models.DateField(blank=True, null=True, verbose_name='Due Date'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('due_date__isnull', False)), fields=('user', 'related_to', 'notification_type', 'due_date'), name='unique_notification_due_date'),
+        ),
+    ]
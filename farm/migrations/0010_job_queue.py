@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0009_notification_due_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Task Name')),
+                ('interval_seconds', models.PositiveIntegerField(verbose_name='Interval (seconds)')),
+                ('next_run_at', models.DateTimeField(verbose_name='Next Run At')),
+                ('last_enqueued_at', models.DateTimeField(blank=True, null=True, verbose_name='Last Enqueued At')),
+            ],
+            options={
+                'verbose_name': 'Job Schedule',
+                'verbose_name_plural': 'Job Schedules',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='QueuedJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Task Name')),
+                ('args', models.JSONField(blank=True, default=list, verbose_name='Arguments')),
+                ('kwargs', models.JSONField(blank=True, default=dict, verbose_name='Keyword Arguments')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10, verbose_name='Status')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Run At')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('max_attempts', models.PositiveIntegerField(default=3, verbose_name='Max Attempts')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='Locked By')),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True, verbose_name='Lease Expires At')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='Result')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Started At')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished At')),
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True, verbose_name='Duration (ms)')),
+            ],
+            options={
+                'verbose_name': 'Queued Job',
+                'verbose_name_plural': 'Queued Jobs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'run_at'], name='farm_manage_status_e07d54_idx'), models.Index(fields=['status', 'lease_expires_at'], name='farm_manage_status_d67aee_idx'), models.Index(fields=['name', 'finished_at'], name='farm_manage_name_d6ded0_idx')],
+            },
+        ),
+    ]
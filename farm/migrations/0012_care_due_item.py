@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0011_healthrecord_cattle_date_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CareDueItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('checkup', 'Health Checkup'), ('vaccination', 'Vaccination'), ('calving', 'Calving')], max_length=20, verbose_name='Kind')),
+                ('due_date', models.DateField(verbose_name='Due Date')),
+                ('status', models.CharField(choices=[('due', 'Due'), ('done', 'Done'), ('superseded', 'Superseded')], default='due', max_length=20, verbose_name='Status')),
+                ('source_id', models.PositiveBigIntegerField(verbose_name='Source Record')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('cattle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='care_due_items', to='farm_management.cattle', verbose_name='Cattle')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='care_due_items', to=settings.AUTH_USER_MODEL, verbose_name='Owner')),
+            ],
+            options={
+                'verbose_name': 'Care Due Item',
+                'verbose_name_plural': 'Care Due Items',
+                'ordering': ['due_date'],
+                'indexes': [models.Index(fields=['owner', 'status', 'due_date'], name='farm_manage_owner_i_3e53a4_idx'), models.Index(fields=['status', 'due_date'], name='farm_manage_status_22e7ed_idx'), models.Index(fields=['cattle', 'kind'], name='farm_manage_cattle__0fc2bf_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'source_id'), name='unique_care_due_source')],
+            },
+        ),
+    ]
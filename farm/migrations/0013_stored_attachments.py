@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:31
+
+import django.utils.timezone
+import farm.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0012_care_due_item'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='healthrecord',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=farm.storage.ContentAddressedStorage(), upload_to='health_records/', verbose_name='Attachment'),
+        ),
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='File Name')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Size (bytes)')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='References')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Stored File',
+                'verbose_name_plural': 'Stored Files',
+                'ordering': ['name'],
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='farm_manage_ref_cou_171c05_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:32
+
+import django.db.models.deletion
+import farm.search
+from django.db import migrations, models
+
+
+# The FTS5 table, its sync triggers and the ranking live in farm/search.py
+def create_index(apps, schema_editor):
+    farm.search.create_search_index(schema_editor, farm.search.CATTLE_SEARCH_TABLE)
+
+
+def drop_index(apps, schema_editor):
+    farm.search.drop_search_index(schema_editor, farm.search.CATTLE_SEARCH_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0013_stored_attachments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CattleSearchIndex',
+            fields=[
+                ('cattle', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='farm_management.cattle', verbose_name='Cattle')),
+                ('document', farm.search.SearchDocumentField(db_column='farm_cattle_fts', verbose_name='Document')),
+                ('rank', models.FloatField(verbose_name='Rank')),
+            ],
+            options={
+                'verbose_name': 'Cattle Search Index',
+                'verbose_name_plural': 'Cattle Search Index',
+                'db_table': 'farm_cattle_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
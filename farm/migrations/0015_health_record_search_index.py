@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:35
+
+import django.db.models.deletion
+import farm.search
+from django.db import migrations, models
+
+
+# The FTS5 table, its sync triggers and the ranking live in farm/search.py
+def create_index(apps, schema_editor):
+    farm.search.create_search_index(schema_editor, farm.search.HEALTH_RECORD_SEARCH_TABLE)
+
+
+def drop_index(apps, schema_editor):
+    farm.search.drop_search_index(schema_editor, farm.search.HEALTH_RECORD_SEARCH_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0014_cattle_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HealthRecordSearchIndex',
+            fields=[
+                ('record', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='farm_management.healthrecord', verbose_name='Health Record')),
+                ('document', farm.search.SearchDocumentField(db_column='farm_healthrecord_fts', verbose_name='Document')),
+                ('rank', models.FloatField(verbose_name='Rank')),
+            ],
+            options={
+                'verbose_name': 'Health Record Search Index',
+                'verbose_name_plural': 'Health Record Search Index',
+                'db_table': 'farm_healthrecord_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
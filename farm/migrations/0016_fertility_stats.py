@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0015_health_record_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CattleFertilityStats',
+            fields=[
+                ('cattle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fertility_stats', serialize=False, to='farm_management.cattle', verbose_name='Cattle')),
+                ('calvings', models.PositiveIntegerField(default=0, verbose_name='Calvings')),
+                ('last_calving_date', models.DateField(blank=True, null=True, verbose_name='Last Calving Date')),
+                ('average_calving_interval', models.FloatField(blank=True, null=True, verbose_name='Average Calving Interval')),
+                ('services', models.PositiveIntegerField(default=0, verbose_name='Services')),
+                ('conceptions', models.PositiveIntegerField(default=0, verbose_name='Conceptions')),
+                ('services_per_conception', models.FloatField(blank=True, null=True, verbose_name='Services per Conception')),
+                ('average_days_open', models.FloatField(blank=True, null=True, verbose_name='Average Days Open')),
+                ('current_days_open', models.PositiveIntegerField(blank=True, null=True, verbose_name='Current Days Open')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Computed At')),
+            ],
+            options={
+                'verbose_name': 'Cattle Fertility Stats',
+                'verbose_name_plural': 'Cattle Fertility Stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='FertilityMonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Month')),
+                ('breeding_type', models.CharField(choices=[('natural', 'Natural'), ('artificial', 'Artificial Insemination')], max_length=20, verbose_name='Breeding Type')),
+                ('sire', models.CharField(max_length=200, verbose_name='Sire')),
+                ('services', models.PositiveIntegerField(default=0, verbose_name='Services')),
+                ('conceptions', models.PositiveIntegerField(default=0, verbose_name='Conceptions')),
+                ('cycle_services', models.PositiveIntegerField(default=0, verbose_name='Services to Conception')),
+                ('days_open_total', models.PositiveIntegerField(default=0, verbose_name='Days Open Total')),
+                ('days_open_count', models.PositiveIntegerField(default=0, verbose_name='Days Open Count')),
+                ('calvings', models.PositiveIntegerField(default=0, verbose_name='Calvings')),
+                ('calving_interval_total', models.PositiveIntegerField(default=0, verbose_name='Calving Interval Total')),
+                ('calving_interval_count', models.PositiveIntegerField(default=0, verbose_name='Calving Interval Count')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fertility_monthly_stats', to=settings.AUTH_USER_MODEL, verbose_name='Owner')),
+            ],
+            options={
+                'verbose_name': 'Monthly Fertility Stats',
+                'verbose_name_plural': 'Monthly Fertility Stats',
+                'ordering': ['-month'],
+                'unique_together': {('owner', 'month', 'breeding_type', 'sire')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0016_fertility_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BreedingCalendarEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('heat', 'Heat'), ('pregnancy_check', 'Pregnancy Check'), ('calving', 'Calving')], max_length=20, verbose_name='Kind')),
+                ('expected_date', models.DateField(verbose_name='Expected Date')),
+                ('start_date', models.DateField(verbose_name='Window Start')),
+                ('end_date', models.DateField(verbose_name='Window End')),
+                ('cattle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='breeding_calendar_events', to='farm_management.cattle', verbose_name='Cattle')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='breeding_calendar_events', to=settings.AUTH_USER_MODEL, verbose_name='Owner')),
+            ],
+            options={
+                'verbose_name': 'Breeding Calendar Event',
+                'verbose_name_plural': 'Breeding Calendar Events',
+                'ordering': ['start_date', 'cattle'],
+                'indexes': [models.Index(fields=['owner', 'start_date'], name='farm_manage_owner_i_97e817_idx'), models.Index(fields=['start_date'], name='farm_manage_start_d_df88d9_idx')],
+            },
+        ),
+    ]
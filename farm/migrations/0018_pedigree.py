@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:46
+
+import django.db.models.deletion
+import farm.search
+from django.db import migrations, models
+
+
+def restore_cattle_search_index(apps, schema_editor):
+    # Adding the foreign keys rebuilt the cattle table, dropping its triggers
+    farm.search.restore_search_index(schema_editor, farm.search.CATTLE_SEARCH_TABLE)
+
+
+def add_self_links(apps, schema_editor):
+    # Every cattle is its own ancestor at depth 0; none has parents yet
+    Cattle = apps.get_model('farm_management', 'Cattle')
+    CattleAncestry = apps.get_model('farm_management', 'CattleAncestry')
+    CattleAncestry.objects.bulk_create(
+        (
+            CattleAncestry(ancestor_id=cattle_id, descendant_id=cattle_id, depth=0)
+            for cattle_id in Cattle.objects.values_list('id', flat=True).iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0017_breeding_calendar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cattle',
+            name='dam',
+            field=models.ForeignKey(blank=True, limit_choices_to={'gender': 'F'}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='offspring_as_dam', to='farm_management.cattle', verbose_name='Dam'),
+        ),
+        migrations.AddField(
+            model_name='cattle',
+            name='inbreeding_coefficient',
+            field=models.FloatField(default=0, editable=False, verbose_name='Inbreeding Coefficient'),
+        ),
+        migrations.AddField(
+            model_name='cattle',
+            name='sire',
+            field=models.ForeignKey(blank=True, limit_choices_to={'gender': 'M'}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='offspring_as_sire', to='farm_management.cattle', verbose_name='Sire'),
+        ),
+        migrations.RunPython(restore_cattle_search_index, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='CattleAncestry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField(verbose_name='Generations')),
+                ('ancestor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='farm_management.cattle', verbose_name='Ancestor')),
+                ('descendant', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='farm_management.cattle', verbose_name='Descendant')),
+            ],
+            options={
+                'verbose_name': 'Cattle Ancestry',
+                'verbose_name_plural': 'Cattle Ancestry',
+                'indexes': [models.Index(fields=['ancestor', 'depth'], name='farm_manage_ancesto_0a3e7f_idx')],
+                'unique_together': {('descendant', 'ancestor')},
+            },
+        ),
+        migrations.RunPython(add_self_links, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm_management', '0018_pedigree'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lactationcurve',
+            name='a',
+            field=models.FloatField(blank=True, null=True, verbose_name='Scale (a)'),
+        ),
+        migrations.AlterField(
+            model_name='lactationcurve',
+            name='b',
+            field=models.FloatField(blank=True, null=True, verbose_name='Incline (b)'),
+        ),
+        migrations.AlterField(
+            model_name='lactationcurve',
+            name='c',
+            field=models.FloatField(blank=True, null=True, verbose_name='Decline (c)'),
+        ),
+    ]
@@ -1,11 +1,15 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 
+import math
 from decimal import Decimal
 from datetime import timedelta
-from django.db.models import Sum
+from django.db.models import F, Sum
+
+from .search import CATTLE_SEARCH_TABLE, HEALTH_RECORD_SEARCH_TABLE, SearchDocumentField
+from .storage import attachment_storage
 
 class Cattle(models.Model):
     GENDER_CHOICES = [
@@ -58,6 +62,30 @@ class Cattle(models.Model):
         default='active',
         verbose_name='Status'
     )
+    dam = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='offspring_as_dam',
+        limit_choices_to={'gender': 'F'},
+        verbose_name='Dam'
+    )
+    sire = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='offspring_as_sire',
+        limit_choices_to={'gender': 'M'},
+        verbose_name='Sire'
+    )
+    # Computed from the pedigree by farm/pedigree.py
+    inbreeding_coefficient = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Inbreeding Coefficient'
+    )
     notes = models.TextField(
         blank=True,
         null=True,
@@ -95,25 +123,111 @@ class Cattle(models.Model):
             age -= 1
         return age
 
+    @property
+    def milk_stats_or_none(self):
+        try:
+            return self.milk_stats
+        except CattleMilkStats.DoesNotExist:
+            return None
+
     def get_total_milk_production(self):
-        return MilkProduction.objects.filter(cattle=self).aggregate(
-            total=Sum('quantity')
-        )['total'] or Decimal('0.00')
+        stats = self.milk_stats_or_none
+        return stats.total_quantity if stats else Decimal('0.00')
 
     def get_average_daily_production(self, days=30):
+        """
+        Average daily yield over the last ``days`` days. The 30-day average
+        reads the milk counters when their window ends today; other spans,
+        and counters the hourly roll_cattle_milk_stats task has not moved
+        to today yet, sum the daily rollups instead.
+        """
         end_date = timezone.now().date()
+        stats = self.milk_stats_or_none
+        if days == 30 and stats and stats.window_end == end_date:
+            total = stats.last_30_days_quantity
+            return total / days if total else Decimal('0.00')
+
         start_date = end_date - timedelta(days=days)
-        productions = MilkProduction.objects.filter(
+        total = MilkDailyRollup.objects.filter(
             cattle=self,
             date__range=[start_date, end_date]
-        )
-        total = productions.aggregate(
-            total=Sum('quantity')
+        ).aggregate(
+            total=Sum('total_quantity')
         )['total'] or Decimal('0.00')
         return total / days if total else Decimal('0.00')
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
+
+class CattleAncestry(models.Model):
+    """
+    Closure table of the pedigree: one row per ancestor of every cattle,
+    with the fewest generations between them, plus the cattle itself at
+    depth 0. Maintained by farm/pedigree.py whenever a dam or sire is set.
+    """
+    # Both covered by the indexes below
+    ancestor = models.ForeignKey(
+        Cattle,
+        on_delete=models.CASCADE,
+        related_name='descendant_links',
+        db_index=False,
+        verbose_name='Ancestor'
+    )
+    descendant = models.ForeignKey(
+        Cattle,
+        on_delete=models.CASCADE,
+        related_name='ancestor_links',
+        db_index=False,
+        verbose_name='Descendant'
+    )
+    depth = models.PositiveSmallIntegerField(
+        verbose_name='Generations'
+    )
+
+    class Meta:
+        unique_together = ['descendant', 'ancestor']
+        verbose_name = 'Cattle Ancestry'
+        verbose_name_plural = 'Cattle Ancestry'
+        indexes = [
+            models.Index(fields=['ancestor', 'depth']),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+
+class CattleSearchIndex(models.Model):
+    """
+    The SQLite FTS5 index over cattle name, tag number, breed and notes.
+    Kept in sync with Cattle by triggers created in migration 0014;
+    queried through farm.search.search_cattle().
+    """
+    cattle = models.OneToOneField(
+        Cattle,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='search_index',
+        verbose_name='Cattle'
+    )
+    document = SearchDocumentField(
+        db_column=CATTLE_SEARCH_TABLE,
+        verbose_name='Document'
+    )
+    rank = models.FloatField(
+        verbose_name='Rank'
+    )
+
+    class Meta:
+        managed = False
+        db_table = CATTLE_SEARCH_TABLE
+        verbose_name = 'Cattle Search Index'
+        verbose_name_plural = 'Cattle Search Index'
+
+    def __str__(self):
+        return f"{self.cattle_id}"
+
+
 class MilkProduction(models.Model):
     MILKING_SESSION_CHOICES = [
         ('morning', 'Morning'),
@@ -184,6 +298,335 @@ class MilkProduction(models.Model):
     
 
 
+class MilkDailyRollup(models.Model):
+    """
+    Per-cattle, per-day milk totals maintained from MilkProduction
+    (see farm/rollups.py). Never edit directly.
+    """
+    cattle = models.ForeignKey(
+        'Cattle',
+        on_delete=models.CASCADE,
+        related_name='milk_daily_rollups',
+        verbose_name='Cattle'
+    )
+    date = models.DateField(
+        verbose_name='Date'
+    )
+    morning_quantity = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Morning (L)'
+    )
+    afternoon_quantity = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Afternoon (L)'
+    )
+    evening_quantity = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Evening (L)'
+    )
+    total_quantity = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Total (L)'
+    )
+    record_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Record Count'
+    )
+
+    class Meta:
+        ordering = ['-date']
+        unique_together = ['cattle', 'date']
+        verbose_name = 'Daily Milk Rollup'
+        verbose_name_plural = 'Daily Milk Rollups'
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.cattle_id} - {self.date}: {self.total_quantity} L"
+
+
+class CattleMilkStats(models.Model):
+    """
+    Denormalized milk counters for one cattle, refreshed together with the
+    rollups (see farm/rollups.py) so lists and the admin need no aggregates.
+    ``last_30_days_quantity`` covers the 30 days up to ``window_end``.
+    """
+    cattle = models.OneToOneField(
+        'Cattle',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='milk_stats',
+        verbose_name='Cattle'
+    )
+    total_quantity = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Lifetime Total (L)'
+    )
+    last_30_days_quantity = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Last 30 Days (L)'
+    )
+    record_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Record Count'
+    )
+    last_milking_date = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name='Last Milking Date'
+    )
+    window_end = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name='30-Day Window End'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Updated At'
+    )
+
+    class Meta:
+        verbose_name = 'Cattle Milk Stats'
+        verbose_name_plural = 'Cattle Milk Stats'
+        indexes = [
+            models.Index(fields=['window_end']),
+        ]
+
+    def __str__(self):
+        return f"{self.cattle_id}: {self.total_quantity} L"
+
+
+class MilkMonthlyRollup(models.Model):
+    """
+    Per-owner, per-month milk totals built from MilkDailyRollup.
+    ``month`` is always the first day of the month.
+    """
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='milk_monthly_rollups',
+        verbose_name='Owner'
+    )
+    month = models.DateField(
+        verbose_name='Month'
+    )
+    morning_quantity = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Morning (L)'
+    )
+    afternoon_quantity = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Afternoon (L)'
+    )
+    evening_quantity = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Evening (L)'
+    )
+    total_quantity = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Total (L)'
+    )
+    record_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Record Count'
+    )
+
+    class Meta:
+        ordering = ['-month']
+        unique_together = ['owner', 'month']
+        verbose_name = 'Monthly Milk Rollup'
+        verbose_name_plural = 'Monthly Milk Rollups'
+        indexes = [
+            models.Index(fields=['month']),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id} - {self.month:%Y-%m}: {self.total_quantity} L"
+
+
+class MilkDataVersion(models.Model):
+    """
+    Counter bumped whenever an owner's milk data changes, used to key
+    caches of anything derived from it (reports, dashboards).
+    """
+    owner = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='milk_data_version',
+        verbose_name='Owner'
+    )
+    version = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Version'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Updated At'
+    )
+
+    class Meta:
+        verbose_name = 'Milk Data Version'
+        verbose_name_plural = 'Milk Data Versions'
+
+    def __str__(self):
+        return f"{self.owner_id} - v{self.version}"
+
+
+class ReportJob(models.Model):
+    REPORT_TYPES = [
+        ('milk_production', 'Milk Production'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='report_jobs',
+        verbose_name='Owner'
+    )
+    report_type = models.CharField(
+        max_length=30,
+        choices=REPORT_TYPES,
+        default='milk_production',
+        verbose_name='Report Type'
+    )
+    filters = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Filters'
+    )
+    cache_key = models.CharField(
+        max_length=64,
+        verbose_name='Cache Key'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name='Status'
+    )
+    file = models.FileField(
+        upload_to='reports/',
+        blank=True,
+        verbose_name='File'
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Error'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Created At'
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Started At'
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Finished At'
+    )
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Report Job'
+        verbose_name_plural = 'Report Jobs'
+        indexes = [
+            models.Index(fields=['cache_key', 'status']),
+            models.Index(fields=['owner', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_report_type_display()} - {self.owner_id} - {self.status}"
+
+
+
+class StoredFile(models.Model):
+    """
+    A file kept once by ContentAddressedStorage, with the number of
+    records referring to it
+    """
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='File Name'
+    )
+    sha256 = models.CharField(
+        max_length=64,
+        db_index=True,
+        verbose_name='SHA-256'
+    )
+    size = models.PositiveBigIntegerField(
+        verbose_name='Size (bytes)'
+    )
+    ref_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='References'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Created At'
+    )
+    updated_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Updated At'
+    )
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Stored File'
+        verbose_name_plural = 'Stored Files'
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
+
+    @classmethod
+    def acquire(cls, name, sha256, size):
+        """
+        Add a reference to ``name``, creating its row on first use
+        """
+        now = timezone.now()
+        if cls.objects.filter(name=name).update(ref_count=F('ref_count') + 1, updated_at=now):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(name=name, sha256=sha256, size=size, ref_count=1, updated_at=now)
+        except IntegrityError:
+            # Created by a concurrent upload of the same content
+            cls.objects.filter(name=name).update(ref_count=F('ref_count') + 1, updated_at=now)
+
 
 class HealthRecord(models.Model):
     RECORD_TYPES = [
@@ -248,6 +691,7 @@ class HealthRecord(models.Model):
     )
     attachment = models.FileField(
         upload_to='health_records/',
+        storage=attachment_storage,
         null=True,
         blank=True,
         verbose_name='Attachment'
@@ -261,6 +705,7 @@ class HealthRecord(models.Model):
             models.Index(fields=['date']),
             models.Index(fields=['next_checkup_date']),
             models.Index(fields=['record_type']),
+            models.Index(fields=['cattle', 'date']),
         ]
 
     def __str__(self):
@@ -273,6 +718,38 @@ class HealthRecord(models.Model):
         
 
 
+class HealthRecordSearchIndex(models.Model):
+    """
+    The SQLite FTS5 index over health record description, medicine, dosage
+    and veterinarian. Kept in sync with HealthRecord by triggers created in
+    migration 0015; queried through farm.search.search_health_records().
+    """
+    record = models.OneToOneField(
+        HealthRecord,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='search_index',
+        verbose_name='Health Record'
+    )
+    document = SearchDocumentField(
+        db_column=HEALTH_RECORD_SEARCH_TABLE,
+        verbose_name='Document'
+    )
+    rank = models.FloatField(
+        verbose_name='Rank'
+    )
+
+    class Meta:
+        managed = False
+        db_table = HEALTH_RECORD_SEARCH_TABLE
+        verbose_name = 'Health Record Search Index'
+        verbose_name_plural = 'Health Record Search Index'
+
+    def __str__(self):
+        return f"{self.record_id}"
+
+
 class Breeding(models.Model):
     BREEDING_TYPE_CHOICES = [
         ('natural', 'Natural'),
@@ -352,6 +829,343 @@ class Breeding(models.Model):
     def __str__(self):
         return f"{self.cattle.name} - {self.breeding_type} - {self.date}"
 
+
+class CareDueItem(models.Model):
+    """
+    One upcoming obligation of a cattle: a checkup or vaccination scheduled
+    by its latest health record, or a calving expected from its latest
+    breeding. Derived from those records by farm/care.py.
+    """
+    KIND_CHOICES = [
+        ('checkup', 'Health Checkup'),
+        ('vaccination', 'Vaccination'),
+        ('calving', 'Calving'),
+    ]
+
+    STATUS_CHOICES = [
+        ('due', 'Due'),
+        ('done', 'Done'),
+        ('superseded', 'Superseded'),
+    ]
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='care_due_items',
+        verbose_name='Owner'
+    )
+    cattle = models.ForeignKey(
+        Cattle,
+        on_delete=models.CASCADE,
+        related_name='care_due_items',
+        verbose_name='Cattle'
+    )
+    kind = models.CharField(
+        max_length=20,
+        choices=KIND_CHOICES,
+        verbose_name='Kind'
+    )
+    due_date = models.DateField(
+        verbose_name='Due Date'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='due',
+        verbose_name='Status'
+    )
+    # HealthRecord id for checkups and vaccinations, Breeding id for calvings
+    source_id = models.PositiveBigIntegerField(
+        verbose_name='Source Record'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Updated At'
+    )
+
+    class Meta:
+        ordering = ['due_date']
+        verbose_name = 'Care Due Item'
+        verbose_name_plural = 'Care Due Items'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'source_id'], name='unique_care_due_source'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', 'status', 'due_date']),
+            models.Index(fields=['status', 'due_date']),
+            models.Index(fields=['cattle', 'kind']),
+        ]
+
+    def __str__(self):
+        return f"{self.cattle_id} - {self.kind} - {self.due_date} ({self.status})"
+
+
+class CattleFertilityStats(models.Model):
+    """
+    Fertility figures of one cow, materialized from its breeding history
+    by farm/fertility.py. Intervals are in days.
+    """
+    cattle = models.OneToOneField(
+        Cattle,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='fertility_stats',
+        verbose_name='Cattle'
+    )
+    calvings = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Calvings'
+    )
+    last_calving_date = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name='Last Calving Date'
+    )
+    average_calving_interval = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name='Average Calving Interval'
+    )
+    services = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Services'
+    )
+    conceptions = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Conceptions'
+    )
+    services_per_conception = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name='Services per Conception'
+    )
+    average_days_open = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name='Average Days Open'
+    )
+    # Since the last calving: to conception, or to today while still open
+    current_days_open = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Current Days Open'
+    )
+    computed_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Computed At'
+    )
+
+    class Meta:
+        verbose_name = 'Cattle Fertility Stats'
+        verbose_name_plural = 'Cattle Fertility Stats'
+
+    def __str__(self):
+        return f"{self.cattle_id} - {self.conceptions}/{self.services}"
+
+
+class FertilityMonthlyStats(models.Model):
+    """
+    Per-owner, per-month fertility counts by breeding type and sire,
+    materialized by farm/fertility.py. Services and conceptions count in
+    the month of service, calvings in the month of calving. Totals and
+    counts are stored instead of averages so any range of months can be
+    summed.
+    """
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='fertility_monthly_stats',
+        verbose_name='Owner'
+    )
+    month = models.DateField(
+        verbose_name='Month'
+    )
+    breeding_type = models.CharField(
+        max_length=20,
+        choices=Breeding.BREEDING_TYPE_CHOICES,
+        verbose_name='Breeding Type'
+    )
+    sire = models.CharField(
+        max_length=200,
+        verbose_name='Sire'
+    )
+    services = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Services'
+    )
+    conceptions = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Conceptions'
+    )
+    # Services of the cycles that ended in these conceptions
+    cycle_services = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Services to Conception'
+    )
+    days_open_total = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Days Open Total'
+    )
+    days_open_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Days Open Count'
+    )
+    calvings = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Calvings'
+    )
+    calving_interval_total = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Calving Interval Total'
+    )
+    calving_interval_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Calving Interval Count'
+    )
+
+    class Meta:
+        ordering = ['-month']
+        unique_together = ['owner', 'month', 'breeding_type', 'sire']
+        verbose_name = 'Monthly Fertility Stats'
+        verbose_name_plural = 'Monthly Fertility Stats'
+
+    def __str__(self):
+        return f"{self.owner_id} - {self.month:%Y-%m} - {self.breeding_type} - {self.sire}"
+
+
+class BreedingCalendarEvent(models.Model):
+    """
+    A predicted heat, pregnancy check or calving of a breeding-eligible
+    female, projected from her latest service or calving by
+    farm/breeding_calendar.py. The cow should be watched from start_date to
+    end_date; expected_date is the most likely day.
+    """
+    KIND_CHOICES = [
+        ('heat', 'Heat'),
+        ('pregnancy_check', 'Pregnancy Check'),
+        ('calving', 'Calving'),
+    ]
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='breeding_calendar_events',
+        verbose_name='Owner'
+    )
+    cattle = models.ForeignKey(
+        Cattle,
+        on_delete=models.CASCADE,
+        related_name='breeding_calendar_events',
+        verbose_name='Cattle'
+    )
+    kind = models.CharField(
+        max_length=20,
+        choices=KIND_CHOICES,
+        verbose_name='Kind'
+    )
+    expected_date = models.DateField(
+        verbose_name='Expected Date'
+    )
+    start_date = models.DateField(
+        verbose_name='Window Start'
+    )
+    end_date = models.DateField(
+        verbose_name='Window End'
+    )
+
+    class Meta:
+        ordering = ['start_date', 'cattle']
+        verbose_name = 'Breeding Calendar Event'
+        verbose_name_plural = 'Breeding Calendar Events'
+        indexes = [
+            models.Index(fields=['owner', 'start_date']),
+            models.Index(fields=['start_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.cattle_id} - {self.kind} - {self.expected_date}"
+
+
+class LactationCurve(models.Model):
+    """
+    Wood's lactation curve y(t) = a * t^b * e^(-c*t) fitted to one
+    lactation of a cow, t being days in milk since ``calving_date``.
+    Maintained by farm/lactation.py. Lactations with too few days of milk
+    to fit have no parameters.
+    """
+    cattle = models.ForeignKey(
+        Cattle,
+        on_delete=models.CASCADE,
+        related_name='lactation_curves',
+        verbose_name='Cattle'
+    )
+    calving_date = models.DateField(
+        verbose_name='Calving Date'
+    )
+    a = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name='Scale (a)'
+    )
+    b = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name='Incline (b)'
+    )
+    c = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name='Decline (c)'
+    )
+    points = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Days Fitted'
+    )
+    fitted_through = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name='Fitted Through'
+    )
+    is_stale = models.BooleanField(
+        default=False,
+        verbose_name='Needs Refit'
+    )
+    fitted_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Fitted At'
+    )
+
+    class Meta:
+        ordering = ['-calving_date']
+        unique_together = ['cattle', 'calving_date']
+        verbose_name = 'Lactation Curve'
+        verbose_name_plural = 'Lactation Curves'
+        indexes = [
+            models.Index(fields=['is_stale']),
+        ]
+
+    def __str__(self):
+        return f"{self.cattle_id} - {self.calving_date}"
+
+    def days_in_milk(self, on_date=None):
+        on_date = on_date or timezone.now().date()
+        return (on_date - self.calving_date).days + 1
+
+    def expected_yield(self, on_date=None):
+        """
+        Expected daily yield in litres on ``on_date`` (default today)
+        """
+        t = self.days_in_milk(on_date)
+        if t < 1 or self.a is None:
+            return None
+        return self.a * t ** self.b * math.exp(-self.c * t)
+
+    @property
+    def peak_day(self):
+        if self.a is not None and self.b > 0 and self.c > 0:
+            return self.b / self.c
+        return None
+
 class Feed(models.Model):
     FEED_TYPE_CHOICES = [
         ('forage', 'Forage'),
@@ -424,55 +1238,7 @@ class Feed(models.Model):
     def total_cost(self):
         return self.quantity * self.cost_per_unit
 
-class ActivityLog(models.Model):
-    ACTION_CHOICES = [
-        ('create', 'Create'),
-        ('update', 'Update'),
-        ('delete', 'Delete'),
-    ]
-
-    user = models.ForeignKey(
-        settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE,
-        verbose_name='User'
-    )
-    action = models.CharField(
-        max_length=10,
-        choices=ACTION_CHOICES,
-        verbose_name='Action'
-    )
-    model_name = models.CharField(
-        max_length=50,
-        verbose_name='Model Name'
-    )
-    object_id = models.PositiveIntegerField(
-        verbose_name='Object ID'
-    )
-    description = models.TextField(
-        verbose_name='Description'
-    )
-    timestamp = models.DateTimeField(
-        auto_now_add=True,
-        verbose_name='Timestamp'
-    )
-    ip_address = models.GenericIPAddressField(
-        null=True,
-        blank=True,
-        verbose_name='IP Address'
-    )
-
-    class Meta:
-        ordering = ['-timestamp']
-        verbose_name = 'Activity Log'
-        verbose_name_plural = 'Activity Logs'
-        indexes = [
-            models.Index(fields=['timestamp']),
-            models.Index(fields=['user']),
-            models.Index(fields=['action']),
-        ]
 
-    def __str__(self):
-        return f"{self.user.username} - {self.action} - {self.model_name} - {self.timestamp}"
 class Notification(models.Model):
     NOTIFICATION_TYPES = [
         ('health_checkup', 'Health Checkup Due'),
@@ -534,6 +1300,11 @@ class Notification(models.Model):
         related_name='notifications',
         verbose_name='Related Cattle'
     )
+    due_date = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name='Due Date'
+    )
 
     class Meta:
         ordering = ['-created_at']
@@ -543,6 +1314,15 @@ class Notification(models.Model):
             models.Index(fields=['created_at']),
             models.Index(fields=['notification_type']),
             models.Index(fields=['is_read']),
+            models.Index(fields=['user', 'is_read']),
+        ]
+        constraints = [
+            # One reminder per cattle, type and due date
+            models.UniqueConstraint(
+                fields=['user', 'related_to', 'notification_type', 'due_date'],
+                condition=models.Q(due_date__isnull=False),
+                name='unique_notification_due_date',
+            ),
         ]
 
     def __str__(self):
@@ -555,8 +1335,6 @@ class Notification(models.Model):
             self.save()
 
 
-# In models.py, update the ActivityLog model
-
 class ActivityLog(models.Model):
     ACTION_CHOICES = [
         ('create', 'Create'),
@@ -585,7 +1363,7 @@ class ActivityLog(models.Model):
         verbose_name='Description'
     )
     timestamp = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         verbose_name='Timestamp'
     )
     ip_address = models.GenericIPAddressField(
@@ -620,3 +1398,172 @@ class ActivityLog(models.Model):
             description=description,
             ip_address=ip_address
         )
+
+
+class ActivityLogArchive(models.Model):
+    """
+    One month of activity logs moved out of ActivityLog into a gzip
+    compressed JSON lines file under FARM_ACTIVITY_ARCHIVE_DIR.
+    """
+    month = models.DateField(
+        unique=True,
+        verbose_name='Month'
+    )
+    file_name = models.CharField(
+        max_length=100,
+        verbose_name='File Name'
+    )
+    row_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Row Count'
+    )
+    first_timestamp = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='First Timestamp'
+    )
+    last_timestamp = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Last Timestamp'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Updated At'
+    )
+
+    class Meta:
+        ordering = ['-month']
+        verbose_name = 'Activity Log Archive'
+        verbose_name_plural = 'Activity Log Archives'
+
+    def __str__(self):
+        return f"{self.month:%Y-%m}: {self.row_count} logs"
+
+
+class QueuedJob(models.Model):
+    """
+    A background task run by the farm job queue (see farm.jobs and the
+    run_jobs command).
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(
+        max_length=100,
+        verbose_name='Task Name'
+    )
+    args = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name='Arguments'
+    )
+    kwargs = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Keyword Arguments'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='queued',
+        verbose_name='Status'
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Run At'
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Attempts'
+    )
+    max_attempts = models.PositiveIntegerField(
+        default=3,
+        verbose_name='Max Attempts'
+    )
+    locked_by = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Locked By'
+    )
+    lease_expires_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Lease Expires At'
+    )
+    result = models.JSONField(
+        null=True,
+        blank=True,
+        verbose_name='Result'
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Error'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Created At'
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Started At'
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Finished At'
+    )
+    duration_ms = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Duration (ms)'
+    )
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Queued Job'
+        verbose_name_plural = 'Queued Jobs'
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+            models.Index(fields=['status', 'lease_expires_at']),
+            models.Index(fields=['name', 'finished_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} - {self.status}"
+
+
+class JobSchedule(models.Model):
+    """
+    Next due time of a periodic task; workers advance it with a
+    conditional UPDATE so each run is enqueued exactly once.
+    """
+    name = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='Task Name'
+    )
+    interval_seconds = models.PositiveIntegerField(
+        verbose_name='Interval (seconds)'
+    )
+    next_run_at = models.DateTimeField(
+        verbose_name='Next Run At'
+    )
+    last_enqueued_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Last Enqueued At'
+    )
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Job Schedule'
+        verbose_name_plural = 'Job Schedules'
+
+    def __str__(self):
+        return f"{self.name} every {self.interval_seconds}s"
@@ -0,0 +1,208 @@
+# farm/notifications.py
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .events import broker
+from .care import due_care_items
+from .models import Notification
+
+# Latest notifications shown in the navbar dropdown
+NOTIFICATION_HEADERS = getattr(settings, 'FARM_NOTIFICATION_HEADERS', 5)
+NOTIFICATION_CACHE_TIMEOUT = getattr(settings, 'FARM_NOTIFICATION_CACHE_TIMEOUT', 24 * 60 * 60)
+# Read notifications older than this are removed by a purge without a day count
+NOTIFICATION_PURGE_DAYS = getattr(settings, 'FARM_NOTIFICATION_PURGE_DAYS', 30)
+# Largest day count a purge accepts
+NOTIFICATION_PURGE_MAX_DAYS = getattr(settings, 'FARM_NOTIFICATION_PURGE_MAX_DAYS', 3650)
+# Health checks due within this many days get a reminder
+CHECKUP_NOTICE_DAYS = getattr(settings, 'FARM_CHECKUP_NOTICE_DAYS', 1)
+NOTIFICATION_BATCH_SIZE = 500
+
+HEADER_FIELDS = ('id', 'title', 'message', 'notification_type', 'priority', 'is_read', 'created_at')
+
+_pending = threading.local()
+
+
+def _cache_key(user_id):
+    return f'farm:notifications:{user_id}'
+
+
+def _compute_summary(user_id):
+    notifications = Notification.objects.filter(user_id=user_id)
+    return {
+        'unread': notifications.filter(is_read=False).count(),
+        'recent': list(notifications.order_by('-created_at', '-id').values(*HEADER_FIELDS)[:NOTIFICATION_HEADERS]),
+    }
+
+
+def get_notification_summary(user_id):
+    """
+    Unread count and latest notification headers of a user, from the cache.
+
+    A miss is filled with add() rather than set(), so a reader that saw the
+    data before a concurrent write committed cannot overwrite the value the
+    writer stores after its commit.
+    """
+    summary = cache.get(_cache_key(user_id))
+    if summary is None:
+        summary = _compute_summary(user_id)
+        cache.add(_cache_key(user_id), summary, NOTIFICATION_CACHE_TIMEOUT)
+    return summary
+
+
+def notification_marker(user_id):
+    """
+    (latest notification id, unread count) of a user from one query. Open
+    event streams compare it on every heartbeat to notice changes made by
+    other processes, whose broker cannot reach them.
+    """
+    marker = Notification.objects.filter(user_id=user_id).aggregate(
+        latest=Max('id'), unread=Count('id', filter=Q(is_read=False))
+    )
+    return marker['latest'], marker['unread']
+
+
+def refresh_notification_summaries(user_ids):
+    cache.set_many(
+        {_cache_key(user_id): _compute_summary(user_id) for user_id in user_ids},
+        NOTIFICATION_CACHE_TIMEOUT,
+    )
+
+
+def notifications_changed(user_ids, refresh=True):
+    """
+    Recompute the cached summaries of these users once the current
+    transaction commits. Must be called after any write that does not send
+    model signals, such as bulk_create() or QuerySet.update().
+
+    With ``refresh=False`` the summaries are only dropped and rebuilt on
+    the next page view, which suits fan-outs touching many users.
+    """
+    user_ids = set(user_ids)
+    keys = [_cache_key(user_id) for user_id in user_ids]
+    # Readers in the meantime fall back to the database
+    cache.delete_many(keys)
+    if not refresh:
+        transaction.on_commit(lambda: _drop_and_publish(keys, user_ids))
+        return
+    if not hasattr(_pending, 'users'):
+        _pending.users = set()
+    _pending.users.update(user_ids)
+    transaction.on_commit(_flush_pending)
+
+
+def _flush_pending():
+    user_ids, _pending.users = getattr(_pending, 'users', set()), set()
+    if user_ids:
+        refresh_notification_summaries(user_ids)
+        broker.publish(user_ids)
+
+
+def _drop_and_publish(keys, user_ids):
+    cache.delete_many(keys)
+    broker.publish(user_ids)
+
+
+# Each of these runs as one UPDATE or DELETE statement and returns the
+# number of notifications affected. Notification has no delete signal
+# receivers or reverse relations, so Django deletes without fetching rows.
+
+def mark_notifications_read(user, ids=None):
+    """
+    Mark the user's unread notifications read; only ``ids`` if given
+    """
+    notifications = Notification.objects.filter(user=user, is_read=False)
+    if ids is not None:
+        notifications = notifications.filter(id__in=ids)
+    count = notifications.update(is_read=True, read_at=timezone.now())
+    if count:
+        notifications_changed({user.pk})
+    return count
+
+
+def delete_notifications(user, ids):
+    count, _ = Notification.objects.filter(user=user, id__in=ids).delete()
+    if count:
+        notifications_changed({user.pk})
+    return count
+
+
+def purge_read_notifications(user, older_than_days=NOTIFICATION_PURGE_DAYS):
+    """
+    Delete the user's notifications that were read more than
+    ``older_than_days`` days ago
+    """
+    older_than_days = min(max(older_than_days, 0), NOTIFICATION_PURGE_MAX_DAYS)
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    count, _ = Notification.objects.filter(
+        user=user, is_read=True, read_at__lt=cutoff
+    ).delete()
+    if count:
+        notifications_changed({user.pk})
+    return count
+
+
+def fan_out_health_checkups(today=None, notice_days=CHECKUP_NOTICE_DAYS):
+    """
+    Create one reminder per (owner, cattle, type, due date) for the open
+    checkup and vaccination items falling between today and
+    ``notice_days`` from now, skipping reminders already sent.
+
+    Runs as one range scan of the due items, one SELECT of existing
+    reminders and batched INSERTs, however many farms are involved.
+    Returns the number of notifications created.
+    """
+    today = today or timezone.localdate()
+    horizon = today + timedelta(days=notice_days)
+    due = due_care_items(
+        days=notice_days, today=today, kinds=['checkup', 'vaccination'], include_overdue=False
+    ).values_list('cattle_id', 'cattle__name', 'owner_id', 'kind', 'due_date').order_by()
+
+    reminders = {}
+    for cattle_id, cattle_name, owner_id, kind, due_date in due.iterator():
+        notification_type = 'vaccination' if kind == 'vaccination' else 'health_checkup'
+        reminders[(owner_id, cattle_id, notification_type, due_date)] = cattle_name
+    if not reminders:
+        return 0
+
+    sent = Notification.objects.filter(
+        user_id__in={key[0] for key in reminders},
+        notification_type__in={key[2] for key in reminders},
+        due_date__range=[today, horizon],
+    )
+    already_sent = set(sent.values_list('user_id', 'related_to_id', 'notification_type', 'due_date'))
+    labels = dict(Notification.NOTIFICATION_TYPES)
+    notifications = [
+        Notification(
+            user_id=owner_id,
+            related_to_id=cattle_id,
+            notification_type=notification_type,
+            due_date=due_date,
+            title=labels[notification_type],
+            message=(
+                f"{labels[notification_type]} for {cattle_name} "
+                f"{'today' if due_date == today else 'on ' + due_date.strftime('%b %d, %Y')}."
+            ),
+            priority='high' if due_date == today else 'medium',
+        )
+        for (owner_id, cattle_id, notification_type, due_date), cattle_name in reminders.items()
+        if (owner_id, cattle_id, notification_type, due_date) not in already_sent
+    ]
+    if not notifications:
+        return 0
+    # The unique constraint settles races with a concurrent run, so the
+    # rows actually inserted are counted rather than the objects passed
+    with transaction.atomic():
+        before = sent.count()
+        Notification.objects.bulk_create(
+            notifications, batch_size=NOTIFICATION_BATCH_SIZE, ignore_conflicts=True
+        )
+        created = sent.count() - before
+    if created:
+        notifications_changed({notification.user_id for notification in notifications}, refresh=False)
+    return created
@@ -0,0 +1,132 @@
+# farm/pagination.py
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_PARAM = 'cursor'
+CURSOR_SALT = 'farm.pagination'
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor, params):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def _querystring(self, cursor):
+        params = self._params.copy()
+        params[CURSOR_PARAM] = cursor
+        return params.urlencode()
+
+    @property
+    def next_querystring(self):
+        return self._querystring(self.next_cursor) if self.next_cursor else ''
+
+    @property
+    def previous_querystring(self):
+        return self._querystring(self.previous_cursor) if self.previous_cursor else ''
+
+
+class KeysetPaginator:
+    """
+    Cursor based paginator over a unique, indexed ordering such as
+    ('-date', '-id').
+
+    Each page is fetched with a range condition on the ordering columns
+    instead of an OFFSET, and no COUNT(*) is run, so every page costs the
+    same as the first one. Cursors are signed, opaque tokens.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-date', '-id')):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.model_fields = [queryset.model._meta.get_field(name) for name in self.fields]
+
+    def _encode(self, obj, direction):
+        values = [
+            field.value_to_string(obj)
+            for field in self.model_fields
+        ]
+        return signing.dumps([direction, values], salt=CURSOR_SALT, compress=True)
+
+    def _decode(self, cursor):
+        try:
+            direction, values = signing.loads(cursor, salt=CURSOR_SALT)
+            values = [
+                field.to_python(value)
+                for field, value in zip(self.model_fields, values)
+            ]
+        except (signing.BadSignature, TypeError, ValueError):
+            return None, None
+        if direction not in ('next', 'previous') or len(values) != len(self.fields):
+            return None, None
+        return direction, values
+
+    def _after(self, values, ordering):
+        """
+        Q selecting rows that come strictly after ``values`` in ``ordering``
+        """
+        condition = Q()
+        for index, name in enumerate(ordering):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            term = Q(**{f'{field}__{lookup}': values[index]})
+            for previous_field, value in zip(self.fields[:index], values):
+                term &= Q(**{previous_field: value})
+            condition |= term
+        return condition
+
+    def get_page(self, params):
+        """
+        Return the page addressed by the cursor in ``params`` (a QueryDict,
+        usually request.GET); the first page when there is none or it is invalid.
+        """
+        direction, values = self._decode(params.get(CURSOR_PARAM, ''))
+
+        if direction == 'previous':
+            reverse_ordering = tuple(
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in self.ordering
+            )
+            rows = list(
+                self.queryset.filter(self._after(values, reverse_ordering))
+                .order_by(*reverse_ordering)[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            object_list = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            queryset = self.queryset.order_by(*self.ordering)
+            if direction == 'next':
+                queryset = queryset.filter(self._after(values, self.ordering))
+            rows = list(queryset[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            object_list = rows[:self.per_page]
+            has_previous = direction == 'next'
+
+        next_cursor = previous_cursor = None
+        if object_list and has_next:
+            next_cursor = self._encode(object_list[-1], 'next')
+        if object_list and has_previous:
+            previous_cursor = self._encode(object_list[0], 'previous')
+        return KeysetPage(object_list, next_cursor, previous_cursor, params)
@@ -0,0 +1,299 @@
+# farm/pedigree.py
+import heapq
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from .models import Cattle, CattleAncestry
+
+PEDIGREE_BATCH_SIZE = 1000
+
+
+class PedigreeCycleError(ValueError):
+    """
+    A dam or sire that is the animal itself or one of its descendants
+    """
+
+
+def _topological_order(parents):
+    """
+    Ids of ``parents`` ({id: (dam_id, sire_id)}) ordered so that parents
+    known to the mapping come before their offspring
+    """
+    order = []
+    state = {}
+    for root in parents:
+        if root in state:
+            continue
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                state[node] = 'done'
+                order.append(node)
+                continue
+            if state.get(node) == 'done':
+                continue
+            if state.get(node) == 'open':
+                raise PedigreeCycleError(f'Cattle {node} is its own ancestor')
+            state[node] = 'open'
+            stack.append((node, True))
+            for parent in parents[node]:
+                if parent in parents and state.get(parent) != 'done':
+                    if state.get(parent) == 'open':
+                        raise PedigreeCycleError(f'Cattle {parent} is its own ancestor')
+                    stack.append((parent, False))
+    return order
+
+
+def creates_cycle(cattle, parent):
+    """
+    Whether making ``parent`` a dam or sire of ``cattle`` would make it
+    its own ancestor
+    """
+    if not cattle.pk or not parent:
+        return False
+    return CattleAncestry.objects.filter(ancestor_id=cattle.pk, descendant_id=parent.pk).exists()
+
+
+def rebuild_ancestry(cattle_ids):
+    """
+    Rewrite the closure rows of these cattle and all their descendants,
+    and their inbreeding coefficients, after a dam or sire was set. A new
+    calf is a single insert of its parents' rows one generation deeper.
+    Returns the number of closure rows written.
+    """
+    cattle_ids = set(cattle_ids)
+    subtree = cattle_ids | set(
+        CattleAncestry.objects.filter(ancestor_id__in=cattle_ids).values_list('descendant_id', flat=True)
+    )
+    if len(subtree) == 1:
+        with transaction.atomic():
+            written = _insert_leaf_ancestry(subtree.pop())
+            refresh_inbreeding(cattle_ids)
+        return written
+
+    parents = {
+        cattle_id: (dam_id, sire_id)
+        for cattle_id, dam_id, sire_id in Cattle.objects.filter(id__in=subtree).values_list('id', 'dam_id', 'sire_id')
+    }
+
+    # Ancestors of parents outside the subtree are already right
+    outside = {parent for pair in parents.values() for parent in pair if parent and parent not in parents}
+    ancestry = {parent: {} for parent in outside}
+    for descendant_id, ancestor_id, depth in CattleAncestry.objects.filter(
+        descendant_id__in=outside
+    ).values_list('descendant_id', 'ancestor_id', 'depth'):
+        ancestry[descendant_id][ancestor_id] = depth
+
+    rows = []
+    for cattle_id in _topological_order(parents):
+        ancestors = {cattle_id: 0}
+        for parent in parents[cattle_id]:
+            for ancestor_id, depth in ancestry.get(parent, {}).items():
+                if depth + 1 < ancestors.get(ancestor_id, depth + 2):
+                    ancestors[ancestor_id] = depth + 1
+        ancestry[cattle_id] = ancestors
+        rows.extend(
+            CattleAncestry(ancestor_id=ancestor_id, descendant_id=cattle_id, depth=depth)
+            for ancestor_id, depth in ancestors.items()
+        )
+
+    with transaction.atomic():
+        CattleAncestry.objects.filter(descendant_id__in=parents).delete()
+        CattleAncestry.objects.bulk_create(rows, batch_size=PEDIGREE_BATCH_SIZE)
+        refresh_inbreeding(list(parents))
+    return len(rows)
+
+
+def _insert_leaf_ancestry(cattle_id):
+    # The parents' rows one generation deeper, without a round trip
+    table = connection.ops.quote_name(CattleAncestry._meta.db_table)
+    cattle_table = connection.ops.quote_name(Cattle._meta.db_table)
+    CattleAncestry.objects.filter(descendant_id=cattle_id).delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (ancestor_id, descendant_id, depth) '
+            f'SELECT %s, %s, 0 UNION ALL '
+            f'SELECT ancestor_id, %s, MIN(depth) + 1 FROM {table} WHERE descendant_id IN '
+            f'(SELECT dam_id FROM {cattle_table} WHERE id = %s '
+            f'UNION SELECT sire_id FROM {cattle_table} WHERE id = %s) '
+            f'GROUP BY ancestor_id',
+            [cattle_id] * 5,
+        )
+        return cursor.rowcount
+
+
+def ancestors(cattle, max_depth=None):
+    """
+    Ancestors of a cattle, each annotated with ``generation`` (1 for its
+    dam and sire), from one lookup of the closure table
+    """
+    links = Q(descendant_links__descendant=cattle, descendant_links__depth__gte=1)
+    if max_depth is not None:
+        links &= Q(descendant_links__depth__lte=max_depth)
+    return Cattle.objects.filter(links).annotate(
+        generation=F('descendant_links__depth')
+    ).order_by('generation', 'id')
+
+
+def descendants(cattle, max_depth=None):
+    """
+    Descendants of a cattle, each annotated with ``generation`` (1 for
+    its calves), from one lookup of the closure table
+    """
+    links = Q(ancestor_links__ancestor=cattle, ancestor_links__depth__gte=1)
+    if max_depth is not None:
+        links &= Q(ancestor_links__depth__lte=max_depth)
+    return Cattle.objects.filter(links).annotate(
+        generation=F('ancestor_links__depth')
+    ).order_by('generation', 'id')
+
+
+class Pedigree:
+    """
+    A set of cattle with all their ancestors, numbered 1..n so that
+    parents come before offspring (0 stands for an unknown parent), for
+    inbreeding and kinship by Meuwissen & Luo (1992).
+
+    Each animal is a sum of contributions of its ancestors, halved every
+    generation, plus its own Mendelian sampling term. Its inbreeding is
+    the sum of its squared contributions times their sampling variances,
+    minus one; the kinship of two animals is half the variance-weighted
+    product of their contributions.
+    """
+
+    def __init__(self, rows, recompute=None):
+        """
+        ``rows`` are (id, dam_id, sire_id, stored inbreeding). Inbreeding
+        is computed for the ids in ``recompute`` (all when None); the others
+        keep their stored value.
+        """
+        parents = {}
+        stored = {}
+        for cattle_id, dam_id, sire_id, inbreeding in rows:
+            parents[cattle_id] = (dam_id, sire_id)
+            stored[cattle_id] = inbreeding
+        self.ids = [None] + _topological_order(parents)
+        self.index = {cattle_id: number for number, cattle_id in enumerate(self.ids) if number}
+        count = len(self.ids)
+        self.dam = np.zeros(count, dtype=np.int64)
+        self.sire = np.zeros(count, dtype=np.int64)
+        for number, cattle_id in enumerate(self.ids[1:], start=1):
+            dam_id, sire_id = parents[cattle_id]
+            self.dam[number] = self.index.get(dam_id, 0)
+            self.sire[number] = self.index.get(sire_id, 0)
+        self.inbreeding = np.zeros(count)
+        self.inbreeding[0] = -1
+        self.variance = np.zeros(count)
+        self._compute(stored, recompute)
+
+    @classmethod
+    def load(cls, cattle_ids=None, recompute=None):
+        """
+        The pedigree of these cattle (the whole herd when None); their
+        ancestors come from one closure table lookup
+        """
+        cattle = Cattle.objects.all()
+        if cattle_ids is not None:
+            cattle = cattle.filter(
+                id__in=CattleAncestry.objects.filter(descendant_id__in=cattle_ids).values('ancestor_id')
+            )
+        rows = cattle.values_list('id', 'dam_id', 'sire_id', 'inbreeding_coefficient')
+        return cls(rows.iterator(), recompute)
+
+    def _contributions(self, number):
+        """
+        {ancestor number: contribution} of one animal, itself included.
+        Ancestors are visited youngest first so each one has received the
+        shares of all its offspring before passing half to its parents.
+        """
+        contributions = {number: 1.0}
+        queue = [-number]
+        done = {}
+        while queue:
+            current = -heapq.heappop(queue)
+            share = contributions.pop(current)
+            done[current] = share
+            for parent in (self.dam[current], self.sire[current]):
+                if parent:
+                    if parent not in contributions:
+                        heapq.heappush(queue, -parent)
+                        contributions[parent] = 0.0
+                    contributions[parent] += share / 2
+        return done
+
+    def _compute(self, stored, recompute):
+        computed = False
+        for number in range(1, len(self.ids)):
+            dam, sire = self.dam[number], self.sire[number]
+            self.variance[number] = 0.5 - 0.25 * (self.inbreeding[dam] + self.inbreeding[sire])
+            previous_computed, computed = computed, recompute is None or self.ids[number] in recompute
+            if not computed:
+                self.inbreeding[number] = stored[self.ids[number]]
+            elif not dam or not sire:
+                self.inbreeding[number] = 0.0
+            elif previous_computed and dam == self.dam[number - 1] and sire == self.sire[number - 1]:
+                # Full sibs share the coefficient
+                self.inbreeding[number] = self.inbreeding[number - 1]
+            else:
+                contributions = self._contributions(number)
+                self.inbreeding[number] = sum(
+                    share * share * self.variance[ancestor] for ancestor, share in contributions.items()
+                ) - 1
+
+    def inbreeding_of(self, cattle_id):
+        return float(self.inbreeding[self.index[cattle_id]])
+
+    def contribution_matrix(self, cattle_ids):
+        """
+        Ancestor contributions of each of these cattle, one row each, one
+        column per animal of the pedigree
+        """
+        matrix = np.zeros((len(cattle_ids), len(self.ids)))
+        for row, cattle_id in enumerate(cattle_ids):
+            if cattle_id in self.index:
+                contributions = self._contributions(self.index[cattle_id])
+                matrix[row, list(contributions)] = list(contributions.values())
+        return matrix
+
+    def kinship_matrix(self, first_ids, second_ids):
+        """
+        Coefficients of kinship of every first with every second cattle:
+        the inbreeding coefficient their calf would have
+        """
+        first = self.contribution_matrix(first_ids)
+        second = self.contribution_matrix(second_ids)
+        return 0.5 * (first * self.variance) @ second.T
+
+
+def refresh_inbreeding(cattle_ids=None):
+    """
+    Recompute the stored inbreeding coefficients of these cattle (the
+    whole herd when None) from their ancestors' stored coefficients.
+    ``cattle_ids`` must include the descendants of any cattle whose
+    parents changed. Returns the number that changed.
+    """
+    recompute = None if cattle_ids is None else set(cattle_ids)
+    pedigree = Pedigree.load(recompute, recompute)
+    changed = []
+    for cattle in Cattle.objects.filter(id__in=list(recompute or pedigree.index)).only('id', 'inbreeding_coefficient'):
+        value = pedigree.inbreeding_of(cattle.pk)
+        if abs(value - cattle.inbreeding_coefficient) > 1e-12:
+            cattle.inbreeding_coefficient = value
+            changed.append(cattle)
+    Cattle.objects.bulk_update(changed, ['inbreeding_coefficient'], batch_size=PEDIGREE_BATCH_SIZE)
+    return len(changed)
+
+
+def kinship_matrix(dam_ids, sire_ids):
+    """
+    Kinship of every dam with every sire, as an array of shape
+    (len(dam_ids), len(sire_ids)): the inbreeding of each possible calf.
+    One pedigree walk per animal and one matrix product, over the
+    ancestors found in the closure table.
+    """
+    dam_ids, sire_ids = list(dam_ids), list(sire_ids)
+    pedigree = Pedigree.load(set(dam_ids) | set(sire_ids), recompute=())
+    return pedigree.kinship_matrix(dam_ids, sire_ids)
@@ -0,0 +1,130 @@
+# farm/reports.py
+import json
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+from .jobs import task
+from .models import MilkProduction, ReportJob
+from .rollups import get_milk_data_version
+from .utils import generate_milk_production_pdf
+
+logger = logging.getLogger(__name__)
+
+# Pending/running jobs older than this are assumed lost (e.g. a restart)
+REPORT_JOB_TIMEOUT = timedelta(minutes=getattr(settings, 'FARM_REPORT_JOB_TIMEOUT_MINUTES', 15))
+
+
+def report_cache_key(owner_id, report_type, filters, version):
+    """
+    Key identifying one rendering of a report. Signed with SECRET_KEY so the
+    resulting file names under MEDIA_ROOT cannot be guessed.
+    """
+    material = json.dumps(
+        [owner_id, report_type, filters, version],
+        sort_keys=True,
+        default=str,
+    )
+    return salted_hmac('farm.reports', material, algorithm='sha256').hexdigest()
+
+
+def milk_production_queryset(owner, filters):
+    productions = MilkProduction.objects.filter(cattle__owner=owner)
+    if filters.get('start_date'):
+        productions = productions.filter(date__gte=filters['start_date'])
+    if filters.get('end_date'):
+        productions = productions.filter(date__lte=filters['end_date'])
+    if filters.get('cattle'):
+        productions = productions.filter(cattle_id=filters['cattle'])
+    return productions
+
+
+def enqueue_report(owner, filters, report_type='milk_production'):
+    """
+    Return the job for this report, creating and queueing it if needed.
+
+    A finished job for the same owner, filters and data version is returned
+    as is, and an identical job still in progress is shared rather than
+    started again.
+    """
+    cache_key = report_cache_key(
+        owner.pk, report_type, filters, get_milk_data_version(owner.pk)
+    )
+    cutoff = timezone.now() - REPORT_JOB_TIMEOUT
+    job = ReportJob.objects.filter(cache_key=cache_key, status='done').first()
+    if job and job.file and default_storage.exists(job.file.name):
+        return job
+    job = ReportJob.objects.filter(
+        cache_key=cache_key,
+        status__in=['pending', 'running'],
+        created_at__gte=cutoff,
+    ).first()
+    if job:
+        return job
+
+    job = ReportJob.objects.create(
+        owner=owner,
+        report_type=report_type,
+        filters=filters,
+        cache_key=cache_key,
+    )
+    transaction.on_commit(lambda: run_report_job.delay(job.pk))
+    return job
+
+
+# Failures are recorded on the ReportJob; the user asks again rather than
+# waiting on retries
+@task(max_attempts=1, timeout=int(REPORT_JOB_TIMEOUT.total_seconds()))
+def run_report_job(job_id):
+    """
+    Render a queued report to MEDIA_ROOT/reports/. Runs on a job queue
+    worker.
+    """
+    claimed = ReportJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', started_at=timezone.now()
+    )
+    if not claimed:
+        return
+    job = ReportJob.objects.select_related('owner').get(pk=job_id)
+    try:
+        relative_path = os.path.join('reports', f'{job.cache_key}.pdf')
+        full_path = default_storage.path(relative_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        temp_path = f'{full_path}.{job_id}.tmp'
+        with open(temp_path, 'wb') as output:
+            generate_milk_production_pdf(
+                milk_production_queryset(job.owner, job.filters),
+                output=output,
+            )
+        os.replace(temp_path, full_path)
+    except Exception as exc:
+        logger.exception('Report job %s failed', job_id)
+        ReportJob.objects.filter(pk=job_id).update(
+            status='failed', error=str(exc), finished_at=timezone.now()
+        )
+        return
+
+    ReportJob.objects.filter(pk=job_id).update(
+        status='done', file=relative_path, finished_at=timezone.now()
+    )
+    _discard_superseded(job, relative_path)
+
+
+def _discard_superseded(job, relative_path):
+    # Older renderings of the same report are stale once a newer one exists
+    superseded = ReportJob.objects.filter(
+        owner_id=job.owner_id,
+        report_type=job.report_type,
+        filters=job.filters,
+        status='done',
+    ).exclude(cache_key=job.cache_key)
+    for name in superseded.exclude(file=relative_path).values_list('file', flat=True):
+        if name and default_storage.exists(name):
+            default_storage.delete(name)
+    superseded.delete()
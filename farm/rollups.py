@@ -0,0 +1,356 @@
+# farm/rollups.py
+import threading
+from datetime import date as date_cls, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Max, Q, Sum, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .lactation import mark_curves_stale
+from .models import (
+    Cattle, CattleMilkStats, MilkDailyRollup, MilkDataVersion,
+    MilkMonthlyRollup, MilkProduction
+)
+
+ROLLUP_BATCH_SIZE = 500
+# Days before today covered by CattleMilkStats.last_30_days_quantity
+STATS_WINDOW_DAYS = 30
+
+_pending = threading.local()
+
+
+def _session_sum(session, field='quantity'):
+    return Sum(
+        Case(
+            When(milking_session=session, then=field),
+            default=Decimal('0.00'),
+            output_field=DecimalField(),
+        )
+    )
+
+
+def _month_start(day):
+    return date_cls(day.year, day.month, 1)
+
+
+def _next_month(month):
+    if month.month == 12:
+        return date_cls(month.year + 1, 1, 1)
+    return date_cls(month.year, month.month + 1, 1)
+
+
+def _pending_work():
+    if not hasattr(_pending, 'days'):
+        _pending.days = set()
+        _pending.owners = set()
+    return _pending
+
+
+def schedule_rollup_refresh(cattle_dates=(), owner_ids=()):
+    """
+    Queue (cattle_id, date) pairs and whole owners for a rollup refresh
+    once the current transaction commits. Many writes inside one
+    transaction (a bulk upload, a cascading delete) are refreshed together.
+    """
+    pending = _pending_work()
+    pending.days.update(cattle_dates)
+    pending.owners.update(owner_ids)
+    transaction.on_commit(flush_rollup_refresh)
+
+
+def flush_rollup_refresh():
+    pending = _pending_work()
+    cattle_dates, pending.days = pending.days, set()
+    owner_ids, pending.owners = pending.owners, set()
+    if cattle_dates:
+        refresh_daily_rollups(cattle_dates)
+        mark_curves_stale({cattle_id for cattle_id, _ in cattle_dates})
+    if owner_ids:
+        refresh_monthly_rollups(owner_ids=owner_ids)
+
+
+def _daily_rows(queryset):
+    return queryset.values('cattle_id', 'date').annotate(
+        morning=_session_sum('morning'),
+        afternoon=_session_sum('afternoon'),
+        evening=_session_sum('evening'),
+        total=Sum('quantity'),
+        records=Count('id'),
+    ).order_by()
+
+
+def _daily_rollup(row):
+    return MilkDailyRollup(
+        cattle_id=row['cattle_id'],
+        date=row['date'],
+        morning_quantity=row['morning'] or 0,
+        afternoon_quantity=row['afternoon'] or 0,
+        evening_quantity=row['evening'] or 0,
+        total_quantity=row['total'] or 0,
+        record_count=row['records'],
+    )
+
+
+def refresh_daily_rollups(cattle_dates):
+    """
+    Recompute the daily rollups for the given (cattle_id, date) pairs from
+    MilkProduction, then the monthly rollups those days fall into.
+    """
+    cattle_dates = set(cattle_dates)
+    cattle_ids = {cattle_id for cattle_id, _ in cattle_dates}
+    dates = {day for _, day in cattle_dates}
+
+    with transaction.atomic():
+        rollups = [
+            _daily_rollup(row)
+            for row in _daily_rows(
+                MilkProduction.objects.filter(cattle_id__in=cattle_ids, date__in=dates)
+            )
+            if (row['cattle_id'], row['date']) in cattle_dates
+        ]
+        MilkDailyRollup.objects.bulk_create(
+            rollups,
+            batch_size=ROLLUP_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['cattle', 'date'],
+            update_fields=[
+                'morning_quantity', 'afternoon_quantity',
+                'evening_quantity', 'total_quantity', 'record_count',
+            ],
+        )
+
+        # Days whose last record was removed
+        present = {(rollup.cattle_id, rollup.date) for rollup in rollups}
+        stale_ids = [
+            rollup_id
+            for rollup_id, cattle_id, day in MilkDailyRollup.objects.filter(
+                cattle_id__in=cattle_ids, date__in=dates
+            ).values_list('id', 'cattle_id', 'date')
+            if (cattle_id, day) in cattle_dates and (cattle_id, day) not in present
+        ]
+        if stale_ids:
+            MilkDailyRollup.objects.filter(id__in=stale_ids).delete()
+
+        refresh_cattle_stats(cattle_ids)
+
+        owners = dict(
+            Cattle.objects.filter(id__in=cattle_ids).values_list('id', 'owner_id')
+        )
+        owner_months = {
+            (owners[cattle_id], _month_start(day))
+            for cattle_id, day in cattle_dates
+            if cattle_id in owners
+        }
+        refresh_monthly_rollups(owner_months=owner_months)
+
+
+def refresh_cattle_stats(cattle_ids=None, from_raw=False, today=None):
+    """
+    Recompute CattleMilkStats for the given cattle (all cattle when None).
+
+    Normally computed from the daily rollups, right after them in the
+    post-commit rollup flush, so a reader may briefly see the counters of
+    the previous commit. ``from_raw`` reads MilkProduction directly, which
+    is what the repair command uses. Returns the number of cattle refreshed.
+    """
+    today = today or timezone.now().date()
+    window_start = today - timedelta(days=STATS_WINDOW_DAYS)
+
+    if from_raw:
+        source = MilkProduction.objects.all()
+        quantity, records = 'quantity', Count('id')
+    else:
+        source = MilkDailyRollup.objects.all()
+        quantity, records = 'total_quantity', Sum('record_count')
+    cattle = Cattle.objects.all()
+    if cattle_ids is not None:
+        source = source.filter(cattle_id__in=cattle_ids)
+        cattle = cattle.filter(id__in=cattle_ids)
+
+    totals = {
+        row['cattle_id']: row
+        for row in source.values('cattle_id').annotate(
+            total=Sum(quantity),
+            recent=Sum(Case(
+                When(date__range=[window_start, today], then=quantity),
+                default=Decimal('0.00'),
+                output_field=DecimalField(),
+            )),
+            records=records,
+            last_date=Max('date'),
+        ).order_by()
+    }
+
+    with transaction.atomic():
+        stats = [
+            CattleMilkStats(
+                cattle_id=cattle_id,
+                total_quantity=totals.get(cattle_id, {}).get('total') or 0,
+                last_30_days_quantity=totals.get(cattle_id, {}).get('recent') or 0,
+                record_count=totals.get(cattle_id, {}).get('records') or 0,
+                last_milking_date=totals.get(cattle_id, {}).get('last_date'),
+                window_end=today,
+            )
+            for cattle_id in cattle.values_list('id', flat=True).iterator()
+        ]
+        CattleMilkStats.objects.bulk_create(
+            stats,
+            batch_size=ROLLUP_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['cattle'],
+            update_fields=[
+                'total_quantity', 'last_30_days_quantity', 'record_count',
+                'last_milking_date', 'window_end', 'updated_at',
+            ],
+        )
+    return len(stats)
+
+
+def roll_cattle_stats_window(today=None):
+    """
+    Recompute the stats whose 30-day window ended before today. Meant to run
+    once a day so the sliding window stays current without any new records.
+    """
+    today = today or timezone.now().date()
+    stale = CattleMilkStats.objects.filter(
+        Q(window_end__lt=today) | Q(window_end__isnull=True)
+    ).values_list('cattle_id', flat=True)
+    refreshed = 0
+    batch = []
+    for cattle_id in stale.iterator(chunk_size=ROLLUP_BATCH_SIZE):
+        batch.append(cattle_id)
+        if len(batch) >= ROLLUP_BATCH_SIZE:
+            refreshed += refresh_cattle_stats(batch, today=today)
+            batch = []
+    if batch:
+        refreshed += refresh_cattle_stats(batch, today=today)
+    return refreshed
+
+
+def refresh_monthly_rollups(owner_months=(), owner_ids=()):
+    """
+    Recompute monthly rollups from the daily rollups, either for specific
+    (owner_id, month) pairs or for every month of the given owners.
+    """
+    owner_months = set(owner_months)
+    owner_ids = set(owner_ids)
+    if not owner_months and not owner_ids:
+        return
+
+    daily_filter = Q(cattle__owner_id__in=owner_ids)
+    existing_filter = Q(owner_id__in=owner_ids)
+    for owner_id, month in owner_months:
+        daily_filter |= Q(
+            cattle__owner_id=owner_id,
+            date__gte=month,
+            date__lt=_next_month(month),
+        )
+        existing_filter |= Q(owner_id=owner_id, month=month)
+    daily = MilkDailyRollup.objects.filter(daily_filter)
+    existing = MilkMonthlyRollup.objects.filter(existing_filter)
+
+    def wanted(owner_id, month):
+        return owner_id in owner_ids or (owner_id, month) in owner_months
+
+    with transaction.atomic():
+        rollups = [
+            MilkMonthlyRollup(
+                owner_id=row['cattle__owner_id'],
+                month=row['month'],
+                morning_quantity=row['morning'] or 0,
+                afternoon_quantity=row['afternoon'] or 0,
+                evening_quantity=row['evening'] or 0,
+                total_quantity=row['total'] or 0,
+                record_count=row['records'] or 0,
+            )
+            for row in daily.annotate(month=TruncMonth('date')).values(
+                'cattle__owner_id', 'month'
+            ).annotate(
+                morning=Sum('morning_quantity'),
+                afternoon=Sum('afternoon_quantity'),
+                evening=Sum('evening_quantity'),
+                total=Sum('total_quantity'),
+                records=Sum('record_count'),
+            ).order_by()
+            if wanted(row['cattle__owner_id'], row['month'])
+        ]
+        MilkMonthlyRollup.objects.bulk_create(
+            rollups,
+            batch_size=ROLLUP_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['owner', 'month'],
+            update_fields=[
+                'morning_quantity', 'afternoon_quantity',
+                'evening_quantity', 'total_quantity', 'record_count',
+            ],
+        )
+        present = {(rollup.owner_id, rollup.month) for rollup in rollups}
+        stale_ids = [
+            rollup_id
+            for rollup_id, owner_id, month in existing.values_list('id', 'owner_id', 'month')
+            if (owner_id, month) not in present
+        ]
+        if stale_ids:
+            MilkMonthlyRollup.objects.filter(id__in=stale_ids).delete()
+
+        bump_milk_data_versions(owner_ids | {owner_id for owner_id, _ in owner_months})
+
+
+def bump_milk_data_versions(owner_ids):
+    """
+    Mark the milk data of the given owners as changed
+    """
+    owner_ids = set(
+        get_user_model().objects.filter(id__in=owner_ids).values_list('id', flat=True)
+    )
+    if not owner_ids:
+        return
+    MilkDataVersion.objects.bulk_create(
+        [MilkDataVersion(owner_id=owner_id) for owner_id in owner_ids],
+        ignore_conflicts=True,
+    )
+    MilkDataVersion.objects.filter(owner_id__in=owner_ids).update(
+        version=F('version') + 1,
+        updated_at=timezone.now(),
+    )
+
+
+def get_milk_data_version(owner_id):
+    return MilkDataVersion.objects.filter(
+        owner_id=owner_id
+    ).values_list('version', flat=True).first() or 0
+
+
+def rebuild_rollups(batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Drop and rebuild every rollup from MilkProduction. Used for backfill.
+    Returns the number of (daily, monthly) rows written.
+    """
+    with transaction.atomic():
+        MilkMonthlyRollup.objects.all().delete()
+        MilkDailyRollup.objects.all().delete()
+
+        daily_count = 0
+        batch = []
+        for row in _daily_rows(MilkProduction.objects.all()).iterator(chunk_size=batch_size):
+            batch.append(_daily_rollup(row))
+            if len(batch) >= batch_size:
+                MilkDailyRollup.objects.bulk_create(batch)
+                daily_count += len(batch)
+                batch = []
+        if batch:
+            MilkDailyRollup.objects.bulk_create(batch)
+            daily_count += len(batch)
+
+        owner_ids = set(
+            Cattle.objects.filter(milk_daily_rollups__isnull=False)
+            .values_list('owner_id', flat=True).distinct()
+        )
+        refresh_monthly_rollups(owner_ids=owner_ids)
+        refresh_cattle_stats()
+        monthly_count = MilkMonthlyRollup.objects.count()
+
+    return daily_count, monthly_count
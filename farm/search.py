@@ -0,0 +1,189 @@
+# farm/search.py
+import re
+from collections import Counter
+from operator import itemgetter
+
+from django.db import connections, models
+from django.db.models import Count, F, Q
+
+# Tables of the SQLite FTS5 indexes, created by migrations 0014 and 0015
+CATTLE_SEARCH_TABLE = 'farm_cattle_fts'
+HEALTH_RECORD_SEARCH_TABLE = 'farm_healthrecord_fts'
+# Results returned to the type-ahead
+TYPEAHEAD_LIMIT = 10
+# Newest matches the type-ahead ranks; the index scan stops there
+TYPEAHEAD_CANDIDATES = 200
+
+SEARCH_TOKEN = re.compile(r'\w+')
+
+# External content FTS5 tables: (content table, indexed columns, prefix
+# index lengths, bm25 column weights). Triggers keep each in sync with
+# every write, including QuerySet.update() and raw SQL.
+SEARCH_INDEXES = {
+    CATTLE_SEARCH_TABLE: (
+        'farm_management_cattle', ('name', 'tag_number', 'breed', 'notes'),
+        '1 2 3', (5.0, 10.0, 2.0, 1.0),
+    ),
+    HEALTH_RECORD_SEARCH_TABLE: (
+        'farm_management_healthrecord', ('description', 'medicine', 'dosage', 'vet_name'),
+        '2 3', (2.0, 10.0, 1.0, 3.0),
+    ),
+}
+
+
+def _trigger_statements(table):
+    content_table, columns, _, _ = SEARCH_INDEXES[table]
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    insert = f'INSERT INTO {table}(rowid, {names}) VALUES (new.id, {new_values});'
+    delete = f"INSERT INTO {table}({table}, rowid, {names}) VALUES ('delete', old.id, {old_values});"
+    return [
+        f'CREATE TRIGGER {table}_insert AFTER INSERT ON {content_table} BEGIN {insert} END',
+        f'CREATE TRIGGER {table}_delete AFTER DELETE ON {content_table} BEGIN {delete} END',
+        f'CREATE TRIGGER {table}_update AFTER UPDATE OF {names} ON {content_table} '
+        f'BEGIN {delete} {insert} END',
+    ]
+
+
+def _drop_trigger_statements(table):
+    return [f'DROP TRIGGER IF EXISTS {table}_{event}' for event in ('insert', 'delete', 'update')]
+
+
+def _execute_on_sqlite(schema_editor, statements):
+    # Other databases fall back to LIKE search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(schema_editor, table):
+    """
+    Create one of SEARCH_INDEXES with its triggers and fill it. For
+    migrations (RunPython).
+    """
+    content_table, columns, prefix, weights = SEARCH_INDEXES[table]
+    _execute_on_sqlite(schema_editor, [
+        f"CREATE VIRTUAL TABLE {table} USING fts5({', '.join(columns)}, "
+        f"content='{content_table}', content_rowid='id', prefix='{prefix}')",
+        f"INSERT INTO {table}({table}, rank) VALUES "
+        f"('rank', 'bm25({', '.join(str(weight) for weight in weights)})')",
+    ] + _trigger_statements(table) + [f"INSERT INTO {table}({table}) VALUES ('rebuild')"])
+
+
+def drop_search_index(schema_editor, table):
+    _execute_on_sqlite(schema_editor, _drop_trigger_statements(table) + [f'DROP TABLE IF EXISTS {table}'])
+
+
+def restore_search_index(schema_editor, table):
+    """
+    Recreate the triggers of a search index and refill it. SQLite drops
+    the triggers whenever a migration rebuilds the content table (adding
+    a foreign key, for one), so such migrations must end with this.
+    """
+    _execute_on_sqlite(
+        schema_editor,
+        _drop_trigger_statements(table) + _trigger_statements(table)
+        + [f"INSERT INTO {table}({table}) VALUES ('rebuild')"],
+    )
+
+
+class SearchDocumentField(models.TextField):
+    """
+    The hidden column of an FTS5 table named after the table itself;
+    ``__match`` on it searches every indexed column
+    """
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+def fts_query(text):
+    """
+    FTS5 query matching every word of ``text`` as a prefix, so
+    'KE-12 dai' finds tag KE-1234 named Daisy. Words are quoted, which
+    keeps FTS5 operators typed by the user from being interpreted.
+    """
+    return ' '.join(f'"{token}"*' for token in SEARCH_TOKEN.findall(text.lower()))
+
+
+def search_cattle(queryset, text):
+    """
+    Narrow a Cattle queryset to the animals whose name, tag number, breed
+    or notes match ``text``, best matches first. Uses the FTS5 index on
+    SQLite and a LIKE scan on other databases.
+    """
+    query = fts_query(text)
+    if not query:
+        return queryset
+    if connections[queryset.db].vendor != 'sqlite':
+        return queryset.filter(
+            Q(tag_number__icontains=text) | Q(name__icontains=text)
+        )
+    return queryset.filter(search_index__document__match=query).order_by(
+        'search_index__rank', '-created_at'
+    )
+
+
+def typeahead_cattle(queryset, text, limit=TYPEAHEAD_LIMIT):
+    """
+    The best ``limit`` matches for ``text`` as dicts of id, name and tag
+    number. Ranking every match of a one or two letter prefix would read
+    most of the index, so only the newest TYPEAHEAD_CANDIDATES matches are
+    fetched, in rowid order so the scan stops early, and ranked here.
+    """
+    query = fts_query(text)
+    if not query:
+        return []
+    if connections[queryset.db].vendor != 'sqlite':
+        return list(search_cattle(queryset, text).values('id', 'name', 'tag_number')[:limit])
+    candidates = queryset.filter(search_index__document__match=query).order_by(
+        F('search_index__cattle_id').desc()
+    ).values('id', 'name', 'tag_number', rank=F('search_index__rank'))[:TYPEAHEAD_CANDIDATES]
+    return sorted(candidates, key=itemgetter('rank'))[:limit]
+
+
+def search_health_records(queryset, text):
+    """
+    Narrow a HealthRecord queryset to the records whose description,
+    medicine, dosage or veterinarian match ``text``. The order is left to
+    the caller, as health records are listed by date.
+    """
+    query = fts_query(text)
+    if not query:
+        return queryset
+    if connections[queryset.db].vendor != 'sqlite':
+        return queryset.filter(
+            Q(description__icontains=text) | Q(medicine__icontains=text)
+            | Q(dosage__icontains=text) | Q(vet_name__icontains=text)
+        )
+    return queryset.filter(search_index__document__match=query)
+
+
+def record_type_facet(queryset):
+    """
+    [{'record_type', 'count'}] of a HealthRecord queryset, largest first
+    """
+    return list(
+        queryset.order_by().values('record_type').annotate(count=Count('id')).order_by('-count')
+    )
+
+
+def year_facet(queryset):
+    """
+    [{'year', 'count'}] of a HealthRecord queryset, latest year first.
+    Counted per day in SQL and summed here: on SQLite a year extraction
+    runs as a Python function for every row.
+    """
+    years = Counter()
+    for row in queryset.order_by().values('date').annotate(count=Count('id')):
+        years[row['date'].year] += row['count']
+    return [{'year': year, 'count': count} for year, count in sorted(years.items(), reverse=True)]
@@ -0,0 +1,192 @@
+# farm/signals.py
+from django.db import transaction
+from django.db.models import Model, Q
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .activity import current_request, record_activity
+from .breeding_calendar import schedule_calendar_refresh
+from .care import schedule_care_refresh
+from .fertility import schedule_fertility_refresh
+from .models import Breeding, Cattle, Feed, HealthRecord, MilkProduction, Notification
+from .notifications import notifications_changed
+from .pedigree import rebuild_ancestry
+from .rollups import bump_milk_data_versions, schedule_rollup_refresh
+from .storage import attachment_storage
+
+# Models whose changes made during a request go to the activity log
+AUDITED_MODELS = (Cattle, MilkProduction, HealthRecord, Breeding, Feed)
+
+
+@receiver(pre_save, sender=MilkProduction)
+def remember_previous_milk_day(sender, instance, **kwargs):
+    # An edit may move the record to another cattle or day; both need refreshing
+    instance._rollup_previous = None
+    if instance.pk:
+        instance._rollup_previous = MilkProduction.objects.filter(
+            pk=instance.pk
+        ).values_list('cattle_id', 'date').first()
+
+
+@receiver(post_save, sender=MilkProduction)
+def milk_production_saved(sender, instance, **kwargs):
+    cattle_dates = {(instance.cattle_id, instance.date)}
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        cattle_dates.add(previous)
+    schedule_rollup_refresh(cattle_dates)
+
+
+@receiver(post_delete, sender=MilkProduction)
+def milk_production_deleted(sender, instance, **kwargs):
+    schedule_rollup_refresh({(instance.cattle_id, instance.date)})
+
+
+@receiver(post_delete, sender=Cattle)
+def cattle_deleted(sender, instance, **kwargs):
+    # Daily rollups cascade with the cattle; the owner's months must be rebuilt
+    schedule_rollup_refresh(owner_ids={instance.owner_id})
+    # So do the cattle's notifications
+    notifications_changed({instance.owner_id})
+    # Its breedings leave the owner's monthly fertility figures
+    schedule_fertility_refresh({instance.owner_id})
+
+
+@receiver(pre_save, sender=Cattle)
+def remember_previous_parents(sender, instance, **kwargs):
+    instance._previous_parents = None
+    if instance.pk:
+        instance._previous_parents = Cattle.objects.filter(
+            pk=instance.pk
+        ).values_list('dam_id', 'sire_id').first()
+
+
+@receiver(post_save, sender=Cattle)
+def cattle_parents_saved(sender, instance, created, **kwargs):
+    # The closure table must be right as soon as the cattle is
+    if created or getattr(instance, '_previous_parents', None) != (instance.dam_id, instance.sire_id):
+        rebuild_ancestry({instance.pk})
+
+
+@receiver(pre_delete, sender=Cattle)
+def remember_offspring(sender, instance, **kwargs):
+    instance._offspring = list(Cattle.objects.filter(
+        Q(dam=instance) | Q(sire=instance)
+    ).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Cattle)
+def cattle_parent_deleted(sender, instance, **kwargs):
+    # Offspring lose the deleted parent and everything above it
+    offspring = getattr(instance, '_offspring', None)
+    if offspring:
+        rebuild_ancestry(offspring)
+
+
+@receiver(post_save, sender=Cattle)
+def cattle_saved(sender, instance, created, **kwargs):
+    # Reports and dashboards show cattle names, so renames invalidate them
+    if not created:
+        bump_milk_data_versions({instance.owner_id})
+        # Status and owner changes carry over to the cattle's due items
+        schedule_care_refresh({instance.pk})
+        # and to its calendar, as do gender changes
+        schedule_calendar_refresh({instance.pk})
+
+
+@receiver(pre_save, sender=HealthRecord)
+@receiver(pre_save, sender=Breeding)
+def remember_previous_care_cattle(sender, instance, **kwargs):
+    # A record moved to another cattle changes the due items of both
+    instance._care_previous_cattle = None
+    if instance.pk:
+        instance._care_previous_cattle = sender.objects.filter(
+            pk=instance.pk
+        ).values_list('cattle_id', flat=True).first()
+
+
+@receiver(post_save, sender=HealthRecord)
+@receiver(post_save, sender=Breeding)
+def care_record_saved(sender, instance, **kwargs):
+    cattle_ids = {instance.cattle_id}
+    previous = getattr(instance, '_care_previous_cattle', None)
+    if previous:
+        cattle_ids.add(previous)
+    schedule_care_refresh(cattle_ids)
+    schedule_calendar_refresh(cattle_ids)
+
+
+@receiver(post_delete, sender=HealthRecord)
+@receiver(post_delete, sender=Breeding)
+def care_record_deleted(sender, instance, origin=None, **kwargs):
+    # Due items and calendar events cascade with a deleted cattle
+    if isinstance(origin, Cattle):
+        return
+    schedule_care_refresh({instance.cattle_id})
+    schedule_calendar_refresh({instance.cattle_id})
+
+
+@receiver(post_save, sender=Breeding)
+def breeding_saved(sender, instance, **kwargs):
+    owner_ids = {instance.cattle.owner_id}
+    previous = getattr(instance, '_care_previous_cattle', None)
+    if previous and previous != instance.cattle_id:
+        owner_ids.update(Cattle.objects.filter(pk=previous).values_list('owner_id', flat=True))
+    schedule_fertility_refresh(owner_ids)
+
+
+@receiver(post_delete, sender=Breeding)
+def breeding_deleted(sender, instance, origin=None, **kwargs):
+    # Covered by cattle_deleted
+    if isinstance(origin, Cattle):
+        return
+    schedule_fertility_refresh({instance.cattle.owner_id})
+
+
+@receiver(pre_save, sender=HealthRecord)
+def remember_previous_attachment(sender, instance, **kwargs):
+    instance._previous_attachment = None
+    if instance.pk:
+        instance._previous_attachment = HealthRecord.objects.filter(
+            pk=instance.pk
+        ).values_list('attachment', flat=True).first()
+
+
+@receiver(post_save, sender=HealthRecord)
+def release_replaced_attachment(sender, instance, **kwargs):
+    # Stored attachments are shared and reference counted
+    previous = getattr(instance, '_previous_attachment', None)
+    if previous and previous != instance.attachment.name:
+        transaction.on_commit(lambda: attachment_storage.delete(previous))
+
+
+@receiver(post_delete, sender=HealthRecord)
+def release_deleted_attachment(sender, instance, **kwargs):
+    name = instance.attachment.name
+    if name:
+        transaction.on_commit(lambda: attachment_storage.delete(name))
+
+
+# No post_delete receiver: it would make every bulk delete of notifications
+# fetch and signal row by row. Deletes go through farm.notifications.
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, **kwargs):
+    notifications_changed({instance.user_id})
+
+
+def log_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or current_request.get() is None:
+        return
+    record_activity(None, 'create' if created else 'update', instance, str(instance))
+
+
+def log_deleted(sender, instance, origin=None, **kwargs):
+    # Rows removed by cascade are covered by the entry of the deleted parent
+    if current_request.get() is None or (isinstance(origin, Model) and origin is not instance):
+        return
+    record_activity(None, 'delete', instance, str(instance))
+
+
+for audited_model in AUDITED_MODELS:
+    post_save.connect(log_saved, sender=audited_model, dispatch_uid=f'activity_saved_{audited_model.__name__}')
+    post_delete.connect(log_deleted, sender=audited_model, dispatch_uid=f'activity_deleted_{audited_model.__name__}')
@@ -0,0 +1,170 @@
+# farm/storage.py
+import hashlib
+import os
+import posixpath
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db.models import Count, F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+# Bytes read, hashed and written at a time
+ATTACHMENT_CHUNK_SIZE = getattr(settings, 'FARM_ATTACHMENT_CHUNK_SIZE', 64 * 1024)
+# Unreferenced files are kept this long before they are removed
+ATTACHMENT_GRACE_HOURS = getattr(settings, 'FARM_ATTACHMENT_GRACE_HOURS', 24)
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every upload to a temporary file, whatever its size, and
+    computes its SHA-256 on the way so the storage does not read it again
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.hasher.hexdigest()
+        return file
+
+
+@deconstructible(path='farm.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each distinct file once, named after its SHA-256, and counts
+    the references to it in StoredFile.
+
+    save() adds a reference (and writes the file only if it is new);
+    delete() drops one. Files left without references are removed by
+    purge_unreferenced_attachments(). Files saved before this storage was
+    used have no StoredFile row and are deleted outright.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save()
+        return name
+
+    def _spool(self, content):
+        """
+        Copy ``content`` chunk by chunk to a temporary file next to the
+        destination, hashing it. Returns (path, sha256).
+        """
+        os.makedirs(self.location, exist_ok=True)
+        hasher = hashlib.sha256()
+        handle, temp_path = tempfile.mkstemp(dir=self.location, prefix='.upload-')
+        try:
+            with os.fdopen(handle, 'wb') as temp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(ATTACHMENT_CHUNK_SIZE):
+                    hasher.update(chunk)
+                    temp_file.write(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return temp_path, hasher.hexdigest()
+
+    def _save(self, name, content):
+        from .models import StoredFile
+
+        digest = getattr(content, 'sha256', None)
+        spooled = None
+        if digest is None or not hasattr(content, 'temporary_file_path'):
+            spooled, digest = self._spool(content)
+
+        directory, file_name = posixpath.split(name)
+        extension = os.path.splitext(file_name)[1].lower()
+        name = posixpath.join(directory, digest[:2], digest + extension)
+
+        StoredFile.acquire(name, digest, content.size)
+
+        path = self.path(name)
+        if os.path.exists(path):
+            if spooled:
+                os.remove(spooled)
+            return name
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if spooled:
+            os.replace(spooled, path)
+        else:
+            file_move_safe(content.temporary_file_path(), path, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        return name
+
+    def delete(self, name):
+        from .models import StoredFile
+
+        if not name:
+            return
+        if not StoredFile.objects.filter(name=name).exists():
+            super().delete(name)
+            return
+        StoredFile.objects.filter(name=name, ref_count__gt=0).update(
+            ref_count=F('ref_count') - 1, updated_at=timezone.now()
+        )
+
+    def digest(self, name):
+        from .models import StoredFile
+
+        return StoredFile.objects.filter(name=name).values_list('sha256', flat=True).first()
+
+
+attachment_storage = ContentAddressedStorage()
+
+
+def purge_unreferenced_attachments(grace_hours=ATTACHMENT_GRACE_HOURS):
+    """
+    Recount the references to every stored attachment from the health
+    records, then delete the files nobody has referred to for
+    ``grace_hours``. The recount repairs counts left behind by rolled back
+    saves. Returns the number of files removed.
+    """
+    from .models import HealthRecord, StoredFile
+
+    cutoff = timezone.now() - timedelta(hours=grace_hours)
+    references = dict(
+        HealthRecord.objects.exclude(attachment='').values_list('attachment')
+        .annotate(count=Count('id')).order_by()
+    )
+    # Rows touched during the grace period may have saves still in flight
+    settled = StoredFile.objects.filter(updated_at__lt=cutoff).values_list(
+        'id', 'name', 'ref_count', 'updated_at'
+    )
+    for file_id, name, ref_count, updated_at in settled.iterator():
+        if references.get(name, 0) != ref_count:
+            StoredFile.objects.filter(pk=file_id, updated_at=updated_at).update(
+                ref_count=references.get(name, 0)
+            )
+
+    removed = 0
+    unreferenced = StoredFile.objects.filter(ref_count=0, updated_at__lt=cutoff).values_list('id', 'name')
+    for file_id, name in unreferenced.iterator():
+        # Moved aside first: a save of the same content in the meantime
+        # finds no file and writes it again, or revives the row
+        path = attachment_storage.path(name)
+        doomed = f'{path}.deleting'
+        try:
+            os.replace(path, doomed)
+        except FileNotFoundError:
+            doomed = None
+        deleted, _ = StoredFile.objects.filter(pk=file_id, ref_count=0).delete()
+        if not doomed:
+            continue
+        if deleted:
+            os.remove(doomed)
+            removed += 1
+        else:
+            os.replace(doomed, path)
+    return removed
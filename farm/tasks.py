@@ -1,50 +1,130 @@
-# farm/tasks.py (using Celery for background tasks)
-from celery import shared_task
+# farm/tasks.py (background tasks, run by `manage.py run_jobs`)
 from .models import *
 from datetime import datetime, timedelta
-from django.db.models import Avg
+from .analytics import load_herd_series
+from .lactation import refit_lactation_curves
+from .rollups import roll_cattle_stats_window
+from .archive import archive_activity_logs, purge_activity_archives
+from .storage import purge_unreferenced_attachments
+from .fertility import refresh_fertility_stats
+from .breeding_calendar import extend_breeding_calendar
+from .notifications import fan_out_health_checkups, notifications_changed
+from .reports import run_report_job  # noqa: F401  registered in farm.reports
+from .jobs import task
 
-@shared_task
+@task(schedule=timedelta(days=1))
 def check_health_checkups():
-    tomorrow = datetime.now().date() + timedelta(days=1)
-    upcoming_checkups = HealthRecord.objects.filter(
-        next_check_up=tomorrow
-    ).select_related('cattle', 'cattle__owner')
-
-    for record in upcoming_checkups:
-        Notification.objects.create(
-            user=record.cattle.owner,
-            title=f"Health Check-up Due Tomorrow",
-            message=f"Health check-up due tomorrow for {record.cattle.name}",
-            priority='high',
-            related_url=f'/farm/cattle/{record.cattle.id}/'
-        )
+    """
+    Remind owners of health checks and vaccinations that are due soon
+    """
+    return fan_out_health_checkups()
+
+
+# Trailing days used as each cattle's baseline
+ANOMALY_WINDOW_DAYS = 30
+# Alert when yield drops by this fraction of the baseline...
+ANOMALY_DROP_THRESHOLD = 0.3
+# ...or falls this many standard deviations below it
+ANOMALY_Z_THRESHOLD = -3.0
+ANOMALY_MIN_HISTORY_DAYS = 7
+
 
-@shared_task
+@task(schedule=timedelta(days=1))
 def check_milk_production_anomalies():
+    """
+    Flag cattle whose yield yesterday dropped well below their own recent
+    baseline. The whole herd's trailing window is loaded with one query and
+    scored in bulk; alerts are written with one bulk insert.
+    """
     yesterday = datetime.now().date() - timedelta(days=1)
-    productions = MilkProduction.objects.filter(
-        date=yesterday
-    ).select_related('cattle', 'cattle__owner')
-
-    for prod in productions:
-        # Calculate the average production for the same cattle on previous days
-        avg_result = MilkProduction.objects.filter(
-            cattle=prod.cattle,
-            date__lt=yesterday
-        ).aggregate(
-            avg_morning=Avg('morning_amount'),
-            avg_evening=Avg('evening_amount')
+    series = load_herd_series(
+        None, yesterday - timedelta(days=ANOMALY_WINDOW_DAYS), yesterday
+    )
+    anomalies = series.last_day_anomalies(
+        drop_threshold=ANOMALY_DROP_THRESHOLD,
+        z_threshold=ANOMALY_Z_THRESHOLD,
+        min_history=ANOMALY_MIN_HISTORY_DAYS,
+    )
+    if not anomalies:
+        return 0
+
+    cattle = Cattle.objects.in_bulk([cattle_id for cattle_id, *_ in anomalies])
+    already_alerted = set(
+        Notification.objects.filter(
+            notification_type='milk_production',
+            related_to_id__in=cattle.keys(),
+            created_at__date__gte=datetime.now().date(),
+        ).values_list('related_to_id', flat=True)
+    )
+
+    notifications = [
+        Notification(
+            user_id=cattle[cattle_id].owner_id,
+            title="Low Milk Production Alert",
+            message=(
+                f"Milk production for {cattle[cattle_id].name} on {yesterday} was "
+                f"{actual:.2f} L, {drop:.0%} below its {ANOMALY_WINDOW_DAYS}-day "
+                f"average of {baseline:.2f} L (z-score {z_score:.1f})."
+            ),
+            notification_type='milk_production',
+            priority='high',
+            related_to=cattle[cattle_id],
         )
+        for cattle_id, actual, baseline, drop, z_score in anomalies
+        if cattle_id in cattle and cattle_id not in already_alerted
+    ]
+    Notification.objects.bulk_create(notifications, batch_size=500)
+    notifications_changed({notification.user_id for notification in notifications})
+    return len(notifications)
+
+
+@task(schedule=timedelta(hours=1))
+def refit_stale_lactation_curves():
+    """
+    Refit the lactation curves of cows with new milk records or a new calving
+    """
+    return refit_lactation_curves()
+
+
+@task(schedule=timedelta(hours=1))
+def roll_cattle_milk_stats():
+    """
+    Move the 30-day window of the per-cattle milk counters forward. Runs
+    hourly so the counters are current soon after midnight; until the day
+    changes a run finds nothing to do.
+    """
+    return roll_cattle_stats_window()
+
+
+@task(schedule=timedelta(days=1))
+def archive_old_activity_logs():
+    """
+    Move old activity logs to the monthly archive files and drop expired archives
+    """
+    return archive_activity_logs(), purge_activity_archives()
+
+
+@task(schedule=timedelta(days=1))
+def collect_unused_attachments():
+    """
+    Delete stored attachment files no health record refers to any more
+    """
+    return purge_unreferenced_attachments()
+
+
+@task(schedule=timedelta(days=1))
+def refresh_fertility_kpis(owner_ids=None):
+    """
+    Recompute calving intervals, days open and conception figures. Breeding
+    edits queue this for their owner; the daily run moves current days
+    open along.
+    """
+    return refresh_fertility_stats(owner_ids)
+
 
-        # Sum the averages of morning and evening amounts
-        avg_production = (avg_result['avg_morning'] or 0) + (avg_result['avg_evening'] or 0)
-
-        if avg_production > 0 and prod.total_amount < (avg_production * 0.7):  # 30% decrease
-            Notification.objects.create(
-                user=prod.cattle.owner,
-                title="Low Milk Production Alert",
-                message=f"Significant decrease in milk production for {prod.cattle.name}",
-                priority='high',
-                related_url=f'/farm/cattle/{prod.cattle.id}/'
-            )
+@task(schedule=timedelta(days=1))
+def extend_heat_predictions():
+    """
+    Keep projecting the heats of open cows as the days go by
+    """
+    return extend_breeding_calendar()
@@ -1,3 +1,1341 @@
-from django.test import TestCase
+import csv
+import datetime
+import json
+import os
+import random
+import statistics
+import tempfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError
+from django.db.models import Count, QuerySet, Sum
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import analytics, archive, jobs, notifications, utils, views
+from .breeding_calendar import breeding_events, extend_breeding_calendar, refresh_breeding_calendar
+from .forms import CattleForm
+from .fertility import fertility_summary, refresh_fertility_stats
+from .ingest import BulkPayloadError, ingest_milk_rows, parse_bulk_payload
+from .notifications import fan_out_health_checkups
+from .models import (
+    ActivityLog, ActivityLogArchive, Breeding, CareDueItem, Cattle, CattleAncestry, CattleFertilityStats,
+    CattleMilkStats, HealthRecord, MilkDailyRollup, MilkMonthlyRollup, MilkProduction, Notification,
+    QueuedJob, StoredFile
+)
+from .pedigree import ancestors, descendants, kinship_matrix, refresh_inbreeding
+from .pagination import CURSOR_PARAM, CURSOR_SALT, KeysetPaginator
+from .rollups import refresh_cattle_stats, refresh_daily_rollups, roll_cattle_stats_window
+from .search import search_cattle, search_health_records
+from .tasks import ANOMALY_WINDOW_DAYS, check_milk_production_anomalies
+from .storage import attachment_storage, purge_unreferenced_attachments
+
+
+def make_cattle(owner, tag_number, gender='F', **fields):
+    values = {
+        'name': f'Cow {tag_number}', 'breed': 'Friesian',
+        'date_of_birth': datetime.date(2020, 1, 1), 'weight': 450,
+    }
+    values.update(fields)
+    return Cattle.objects.create(owner=owner, tag_number=tag_number, gender=gender, **values)
+
+
+class SearchIndexTests(TestCase):
+    """
+    Runs on the fully migrated schema: a migration that rebuilds a content
+    table must restore the index triggers
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+
+    def test_new_cattle_is_found(self):
+        cattle = make_cattle(self.user, 'KE-1234', name='Daisy')
+        self.assertEqual(list(search_cattle(Cattle.objects.all(), 'dai')), [cattle])
+        self.assertEqual(list(search_cattle(Cattle.objects.all(), 'KE-12')), [cattle])
+
+    def test_edited_cattle_is_found_by_new_name(self):
+        cattle = make_cattle(self.user, 'KE-1', name='Daisy')
+        cattle.name = 'Bella'
+        cattle.save()
+        self.assertEqual(list(search_cattle(Cattle.objects.all(), 'bella')), [cattle])
+        self.assertEqual(list(search_cattle(Cattle.objects.all(), 'daisy')), [])
+
+    def test_new_health_record_is_found(self):
+        cattle = make_cattle(self.user, 'KE-2')
+        record = HealthRecord.objects.create(
+            cattle=cattle, record_type='treatment', date=datetime.date(2024, 5, 1),
+            description='Mastitis', medicine='Oxytetracycline', cost=0, recorded_by=self.user,
+        )
+        self.assertEqual(list(search_health_records(HealthRecord.objects.all(), 'oxytet')), [record])
+
+
+class MilkIngestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+        cls.cattle = make_cattle(cls.user, 'KE-1')
+        make_cattle(get_user_model().objects.create_user('neighbour'), 'KE-9')
+
+    def row(self, **fields):
+        values = {'tag_number': 'KE-1', 'date': '2024-05-01', 'milking_session': 'morning', 'quantity': '12.5'}
+        values.update(fields)
+        return values
+
+    def test_existing_rows_are_updated(self):
+        result = ingest_milk_rows([self.row(), self.row(milking_session='evening')], self.user)
+        self.assertEqual((result['created'], result['updated'], result['errors']), (2, 0, []))
+
+        result = ingest_milk_rows([self.row(quantity='14'), self.row(date='2024-05-02')], self.user)
+        self.assertEqual((result['created'], result['updated']), (1, 1))
+        self.assertEqual(MilkProduction.objects.count(), 3)
+        morning = MilkProduction.objects.get(date=datetime.date(2024, 5, 1), milking_session='morning')
+        self.assertEqual(morning.quantity, Decimal('14'))
+
+    def test_invalid_rows_are_rejected_and_valid_ones_kept(self):
+        result = ingest_milk_rows([
+            self.row(),
+            self.row(quantity='-1'),
+            self.row(tag_number='KE-9'),
+            'not a row',
+            self.row(quantity='13'),
+        ], self.user)
+        self.assertEqual((result['created'], result['updated']), (1, 0))
+        self.assertEqual([error['row'] for error in result['errors']], [1, 2, 3, 4])
+        self.assertIn('quantity', result['errors'][0]['errors'])
+        self.assertIn('tag_number', result['errors'][1]['errors'])
+        self.assertEqual(MilkProduction.objects.get().quantity, Decimal('12.5'))
+
+    def test_upload_without_valid_rows_is_a_bad_request(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('farm:milk_production_bulk'),
+            json.dumps({'date': '2024-05-01', 'milking_session': 'morning', 'rows': [
+                {'tag_number': 'KE-1', 'quantity': 'lots'},
+                {'tag_number': 'KE-404', 'quantity': '10'},
+            ]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()['errors']), 2)
+        self.assertFalse(MilkProduction.objects.exists())
+
+    def test_payloads(self):
+        rows = parse_bulk_payload(
+            b'tag_number,date,milking_session,quantity\nKE-1,2024-05-01,morning,12.5\n', 'text/csv'
+        )
+        self.assertEqual(rows, [self.row()])
+        rows = parse_bulk_payload('{"date": "2024-05-01", "rows": [{"tag_number": "KE-1"}]}', 'application/json')
+        self.assertEqual(rows, [{'date': '2024-05-01', 'tag_number': 'KE-1'}])
+        with self.assertRaises(BulkPayloadError):
+            parse_bulk_payload('{"rows": 1}', 'application/json')
+        with self.assertRaises(BulkPayloadError):
+            parse_bulk_payload('[', 'application/json')
+
+
+class MilkRecordTestCase(TestCase):
+    """
+    Rollups and counters are refreshed when the transaction commits
+    """
+
+    def record(self, cattle, day, session, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            return MilkProduction.objects.create(
+                cattle=cattle, date=day, milking_session=session, quantity=quantity
+            )
+
+
+class MilkRollupTests(MilkRecordTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+        cls.daisy = make_cattle(cls.user, 'KE-1')
+        cls.bella = make_cattle(cls.user, 'KE-2')
+
+    def assertRollupsMatchRecords(self):
+        daily = {
+            (row['cattle_id'], row['date']): (row['total'], row['records'])
+            for row in MilkProduction.objects.values('cattle_id', 'date').annotate(
+                total=Sum('quantity'), records=Count('id')
+            ).order_by()
+        }
+        self.assertEqual({
+            (rollup.cattle_id, rollup.date): (rollup.total_quantity, rollup.record_count)
+            for rollup in MilkDailyRollup.objects.all()
+        }, daily)
+        monthly = {}
+        for (_, day), (total, records) in daily.items():
+            month = day.replace(day=1)
+            previous = monthly.get(month, (0, 0))
+            monthly[month] = (previous[0] + total, previous[1] + records)
+        self.assertEqual({
+            rollup.month: (rollup.total_quantity, rollup.record_count)
+            for rollup in MilkMonthlyRollup.objects.filter(owner=self.user)
+        }, monthly)
+
+    def test_create(self):
+        self.record(self.daisy, datetime.date(2024, 5, 1), 'morning', '10.5')
+        self.record(self.daisy, datetime.date(2024, 5, 1), 'evening', '8')
+        self.record(self.bella, datetime.date(2024, 5, 31), 'morning', '12')
+        self.record(self.bella, datetime.date(2024, 6, 1), 'morning', '11.25')
+        self.assertRollupsMatchRecords()
+        rollup = MilkDailyRollup.objects.get(cattle=self.daisy, date=datetime.date(2024, 5, 1))
+        self.assertEqual((rollup.morning_quantity, rollup.evening_quantity), (Decimal('10.5'), Decimal('8')))
+
+    def test_update_moving_a_record(self):
+        record = self.record(self.daisy, datetime.date(2024, 5, 31), 'morning', '10')
+        self.record(self.bella, datetime.date(2024, 6, 1), 'morning', '12')
+        record.cattle, record.date, record.quantity = self.bella, datetime.date(2024, 6, 2), Decimal('9')
+        with self.captureOnCommitCallbacks(execute=True):
+            record.save()
+        self.assertRollupsMatchRecords()
+        self.assertFalse(MilkDailyRollup.objects.filter(cattle=self.daisy).exists())
+        self.assertFalse(MilkMonthlyRollup.objects.filter(month=datetime.date(2024, 5, 1)).exists())
+
+    def test_delete(self):
+        kept = self.record(self.daisy, datetime.date(2024, 5, 1), 'morning', '10')
+        removed = self.record(self.daisy, datetime.date(2024, 5, 1), 'evening', '7')
+        self.record(self.bella, datetime.date(2024, 5, 2), 'morning', '12')
+        with self.captureOnCommitCallbacks(execute=True):
+            removed.delete()
+        self.assertRollupsMatchRecords()
+        with self.captureOnCommitCallbacks(execute=True):
+            kept.delete()
+        self.assertRollupsMatchRecords()
+
+    def test_bulk_upload_is_rolled_up(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_milk_rows([
+                {'tag_number': tag, 'date': '2024-05-01', 'milking_session': session, 'quantity': '5'}
+                for tag in ('KE-1', 'KE-2') for session in ('morning', 'afternoon', 'evening')
+            ], self.user)
+        self.assertRollupsMatchRecords()
+        self.assertEqual(MilkMonthlyRollup.objects.get().total_quantity, Decimal('30'))
+
+
+class CattleMilkStatsTests(MilkRecordTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+        cls.daisy = make_cattle(cls.user, 'KE-1')
+        cls.today = datetime.date.today()
+
+    def stats(self):
+        stats = CattleMilkStats.objects.get(cattle=self.daisy)
+        return stats.total_quantity, stats.last_30_days_quantity, stats.record_count, stats.last_milking_date
+
+    def test_counters_follow_records(self):
+        old = self.record(self.daisy, self.today - datetime.timedelta(days=40), 'morning', '10')
+        recent = self.record(self.daisy, self.today - datetime.timedelta(days=2), 'morning', '6')
+        self.record(self.daisy, self.today - datetime.timedelta(days=2), 'evening', '4')
+        self.assertEqual(self.stats(), (20, 10, 3, recent.date))
+
+        recent.quantity = Decimal('7.5')
+        with self.captureOnCommitCallbacks(execute=True):
+            recent.save()
+        self.assertEqual(self.stats(), (Decimal('21.5'), Decimal('11.5'), 3, recent.date))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            old.delete()
+        self.assertEqual(self.stats(), (Decimal('11.5'), Decimal('11.5'), 2, recent.date))
+
+        stored = self.stats()
+        refresh_cattle_stats([self.daisy.pk], from_raw=True)
+        self.assertEqual(self.stats(), stored)
+
+    def test_window_rolls_forward(self):
+        self.record(self.daisy, self.today - datetime.timedelta(days=25), 'morning', '10')
+        self.assertEqual(self.stats()[1], 10)
+        self.assertEqual(roll_cattle_stats_window(self.today + datetime.timedelta(days=10)), 1)
+        self.assertEqual(self.stats()[:3], (10, 0, 1))
+
+    def test_average_falls_back_until_the_window_rolls(self):
+        self.record(self.daisy, self.today - datetime.timedelta(days=3), 'morning', '15')
+        CattleMilkStats.objects.filter(cattle=self.daisy).update(
+            last_30_days_quantity=0, window_end=self.today - datetime.timedelta(days=1)
+        )
+        # Counters from yesterday: the rollups are summed instead
+        cattle = Cattle.objects.select_related('milk_stats').get(pk=self.daisy.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(cattle.get_average_daily_production(), Decimal('0.5'))
+
+        self.assertEqual(roll_cattle_stats_window(self.today), 1)
+        cattle = Cattle.objects.select_related('milk_stats').get(pk=self.daisy.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(cattle.get_average_daily_production(), Decimal('0.5'))
+
+
+class MilkExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+        other = get_user_model().objects.create_user('neighbour', password='pw')
+        cls.daisy = make_cattle(cls.user, 'KE-1', name='Daisy')
+        day = datetime.date(2024, 5, 1)
+        MilkProduction.objects.bulk_create([
+            MilkProduction(cattle=cls.daisy, date=day, milking_session='evening', quantity='4.50',
+                           notes='Kicked, "twice"', recorded_by=cls.user),
+            MilkProduction(cattle=cls.daisy, date=day, milking_session='morning', quantity='10.00',
+                           fat_content='3.80', recorded_by=cls.user),
+            MilkProduction(cattle=cls.daisy, date=day + datetime.timedelta(days=1),
+                           milking_session='morning', quantity='9.00', recorded_by=cls.user),
+            MilkProduction(cattle=make_cattle(other, 'KE-9'), date=day, milking_session='morning',
+                           quantity='20.00', recorded_by=other),
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def export(self, **params):
+        response = self.client.get(reverse('farm:milk_production_export'), params)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        return list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+
+    def test_exports_own_records_in_date_order(self):
+        self.assertEqual(self.export(), [
+            views.EXPORT_COLUMNS,
+            ['2024-05-01', 'KE-1', 'Daisy', 'evening', '4.50', '', 'Kicked, "twice"'],
+            ['2024-05-01', 'KE-1', 'Daisy', 'morning', '10.00', '3.80', ''],
+            ['2024-05-02', 'KE-1', 'Daisy', 'morning', '9.00', '', ''],
+        ])
+        self.assertEqual(
+            [row[0] for row in self.export(start_date='2024-05-02')[1:]], ['2024-05-02']
+        )
+
+    def test_stream_is_chunked_by_rows(self):
+        rows = [[number, 'x'] for number in range(5)]
+        chunks = list(views._stream_csv(['n', 'value'], rows, chunk_size=2))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks[0], 'n,value\r\n0,x\r\n1,x\r\n')
+        self.assertEqual(chunks[2], '4,x\r\n')
+
+
+class HerdMilkSeriesTests(MilkRecordTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+        cls.daisy = make_cattle(cls.user, 'KE-1')
+        cls.bella = make_cattle(cls.user, 'KE-2')
+        cls.other = make_cattle(get_user_model().objects.create_user('neighbour'), 'KE-9')
+        cls.start = datetime.date(2024, 5, 1)
+
+    def setUp(self):
+        day = self.start
+        self.record(self.daisy, day, 'morning', '10')
+        self.record(self.daisy, day, 'evening', '5')
+        self.record(self.bella, day + datetime.timedelta(days=1), 'morning', '6')
+        self.record(self.daisy, day + datetime.timedelta(days=2), 'morning', '8')
+        self.record(self.other, day, 'morning', '20')
+
+    def test_loads_the_herd_into_dense_arrays(self):
+        with self.assertNumQueries(1):
+            series = analytics.load_herd_series(self.user, self.start, self.start + datetime.timedelta(days=3))
+        self.assertEqual(series.cattle_ids.tolist(), [self.daisy.pk, self.bella.pk])
+        self.assertEqual(series.dates[-1], datetime.date(2024, 5, 4))
+        self.assertEqual(series.totals.tolist(), [[15, 0, 8, 0], [0, 6, 0, 0]])
+        self.assertEqual(
+            series.observed.tolist(), [[True, False, True, False], [False, True, False, False]]
+        )
+        self.assertEqual(series.sessions[0].tolist(), [10, 0, 5])
+        self.assertEqual(series.daily_totals().tolist(), [15, 6, 8, 0])
+        self.assertEqual(series.cattle_totals().tolist(), [23, 6])
+        self.assertEqual(series.top_cattle(), [(self.daisy.pk, 23.0), (self.bella.pk, 6.0)])
+
+        everyone = analytics.load_herd_series(None, self.start, self.start)
+        self.assertEqual(everyone.daily_totals().tolist(), [35])
+
+        empty = analytics.load_herd_series(self.user, datetime.date(2023, 1, 1), datetime.date(2023, 1, 7))
+        self.assertEqual(empty.totals.shape, (0, 7))
+        self.assertEqual(empty.top_cattle(), [])
+
+    def test_rolling_figures_skip_days_without_records(self):
+        series = analytics.load_herd_series(self.user, self.start, self.start + datetime.timedelta(days=3))
+        self.assertEqual(
+            [analytics.as_chart_list(row) for row in series.rolling_mean(window=2)],
+            [[15.0, 15.0, 8.0, 8.0], [None, 6.0, 6.0, None]],
+        )
+        self.assertEqual(series.herd_rolling_mean(window=2).tolist(), [15, 10.5, 7, 4])
+        self.assertAlmostEqual(series.herd_delta(2), (8 - 21) / 21)
+        self.assertIsNone(series.herd_delta(3))
+        self.assertEqual(
+            analytics.as_chart_list(series.period_delta(2)), [round((8 - 15) / 15, 2), None]
+        )
+
+
+class MilkAnomalyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+        cls.yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        cls.start = cls.yesterday - datetime.timedelta(days=ANOMALY_WINDOW_DAYS)
+        rng = random.Random(7)
+        # {tag: (baseline yields, yield yesterday)}
+        herd = {
+            'DROP': ([rng.uniform(14, 18) for _ in range(30)], 7),
+            'NORMAL': ([rng.uniform(14, 18) for _ in range(30)], 15),
+            'STEADY': ([10] * 29 + [10.5], 9.5),
+            'NEW': ([rng.uniform(14, 18) for _ in range(5)], 2),
+            'DRY': ([rng.uniform(14, 18) for _ in range(30)], None),
+            'GAPS': ([rng.uniform(14, 18) if day % 3 else None for day in range(30)], 10),
+        }
+        cls.cattle = {}
+        productions = []
+        for tag, (history, last) in herd.items():
+            cattle = cls.cattle[tag] = make_cattle(cls.user, tag)
+            yields = history[-ANOMALY_WINDOW_DAYS:] + [last]
+            first = cls.yesterday - datetime.timedelta(days=len(yields) - 1)
+            productions.extend(
+                MilkProduction(
+                    cattle=cattle, date=first + datetime.timedelta(days=offset),
+                    milking_session='morning', quantity=Decimal(f'{quantity:.2f}'),
+                )
+                for offset, quantity in enumerate(yields)
+                if quantity is not None
+            )
+        MilkProduction.objects.bulk_create(productions)
+        refresh_daily_rollups(
+            {(production.cattle_id, production.date) for production in productions}
+        )
+
+    def looped_anomalies(self, drop_threshold=0.3, z_threshold=-3.0, min_history=7):
+        # One cattle at a time, as the detection worked before vectorizing
+        anomalies = []
+        for cattle in Cattle.objects.order_by('id'):
+            daily = dict(
+                MilkDailyRollup.objects.filter(
+                    cattle=cattle, date__range=[self.start, self.yesterday]
+                ).values_list('date', 'total_quantity')
+            )
+            if self.yesterday not in daily:
+                continue
+            actual = float(daily.pop(self.yesterday))
+            history = [float(quantity) for quantity in daily.values()]
+            if len(history) < min_history:
+                continue
+            mean = statistics.fmean(history)
+            std = statistics.pstdev(history)
+            drop = (mean - actual) / mean
+            z_score = (actual - mean) / std if std else 0.0
+            if drop >= drop_threshold or z_score <= z_threshold:
+                anomalies.append((cattle.pk, actual, mean, drop, z_score))
+        return anomalies
+
+    def test_matches_the_per_cattle_loop(self):
+        series = analytics.load_herd_series(None, self.start, self.yesterday)
+        looped = self.looped_anomalies()
+        vectorized = series.last_day_anomalies()
+        self.assertEqual(
+            [cattle_id for cattle_id, *_ in vectorized],
+            [self.cattle['DROP'].pk, self.cattle['STEADY'].pk, self.cattle['GAPS'].pk],
+        )
+        self.assertEqual([row[0] for row in vectorized], [row[0] for row in looped])
+        for ours, theirs in zip(vectorized, looped):
+            for value, expected in zip(ours[1:], theirs[1:]):
+                self.assertAlmostEqual(value, expected, places=4)
+
+    def test_alerts_once_a_day(self):
+        self.assertEqual(check_milk_production_anomalies(), 3)
+        self.assertEqual(check_milk_production_anomalies(), 0)
+        alert = Notification.objects.get(related_to=self.cattle['DROP'])
+        self.assertEqual((alert.user, alert.notification_type, alert.priority),
+                         (self.user, 'milk_production', 'high'))
+        self.assertIn('7.00 L', alert.message)
+
+
+class HealthRecordListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+        cls.daisy = make_cattle(cls.user, 'KE-1', name='Daisy')
+        cls.bella = make_cattle(cls.user, 'KE-2', name='Bella')
+        cls.theirs = make_cattle(get_user_model().objects.create_user('neighbour'), 'KE-9')
+        cls.records = {}
+        for key, cattle, record_type, day, description, medicine in [
+            ('old', cls.daisy, 'treatment', datetime.date(2023, 3, 1), 'Mastitis left rear', 'Oxytetracycline'),
+            ('daisy', cls.daisy, 'treatment', datetime.date(2024, 2, 1), 'Mastitis again', 'Penicillin'),
+            ('bella', cls.bella, 'vaccination', datetime.date(2024, 4, 1), 'Mastitis vaccine', 'Startvac'),
+            ('checkup', cls.bella, 'check_up', datetime.date(2024, 5, 1), 'Routine visit', ''),
+            ('theirs', cls.theirs, 'treatment', datetime.date(2024, 2, 1), 'Mastitis', 'Penicillin'),
+        ]:
+            cls.records[key] = HealthRecord.objects.create(
+                cattle=cattle, record_type=record_type, date=day, description=description,
+                medicine=medicine, cost=0, recorded_by=cls.user,
+            )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def listed(self, **params):
+        response = self.client.get(reverse('farm:health_record_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, [record.pk for record in response.context['health_records']]
+
+    def ids(self, *keys):
+        return [self.records[key].pk for key in keys]
+
+    def test_lists_the_users_herd_newest_first(self):
+        response, listed = self.listed()
+        self.assertEqual(listed, self.ids('checkup', 'bella', 'daisy', 'old'))
+        self.assertIsNone(response.context['facets'])
+        self.assertEqual(
+            list(response.context['form'].fields['cattle'].queryset), [self.bella, self.daisy]
+        )
+
+        self.assertEqual(self.listed(cattle=self.daisy.pk)[1], self.ids('daisy', 'old'))
+        self.assertEqual(self.listed(medicine='peni')[1], self.ids('daisy'))
+        self.assertEqual(
+            self.listed(start_date='2024-01-01', end_date='2024-04-30')[1], self.ids('bella', 'daisy')
+        )
+        # Another herd's cattle is not a valid choice and filters nothing in
+        response, listed = self.listed(cattle=self.theirs.pk)
+        self.assertIn('cattle', response.context['form'].errors)
+        self.assertNotIn(self.records['theirs'].pk, listed)
+
+    def test_search_facets_count_every_filter_but_their_own(self):
+        response, listed = self.listed(q='mastitis', record_type='treatment', start_date='2024-01-01')
+        self.assertEqual(listed, self.ids('daisy'))
+        facets = response.context['facets']
+        record_types = {row['label']: row for row in facets['record_type']}
+        self.assertEqual(
+            {label: row['count'] for label, row in record_types.items()},
+            {'Treatment': 1, 'Vaccination': 1},
+        )
+        self.assertEqual([(row['label'], row['count']) for row in facets['year']], [(2024, 1), (2023, 1)])
+        self.assertIn('record_type=vaccination', record_types['Vaccination']['querystring'])
+        self.assertIn('start_date=2023-01-01', facets['year'][1]['querystring'])
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user('farmer', password='pw')
+        cattle = make_cattle(user, 'KE-1')
+        # Several records share a date, so pages must break ties on id
+        MilkProduction.objects.bulk_create(
+            MilkProduction(
+                cattle=cattle, date=datetime.date(2024, 5, 1) + datetime.timedelta(days=day),
+                milking_session=session, quantity=10,
+            )
+            for day in range(3) for session in ('morning', 'afternoon', 'evening')
+        )
+        cls.ordered = list(MilkProduction.objects.order_by('-date', '-id'))
+
+    def page(self, cursor=None, **params):
+        query = QueryDict(mutable=True)
+        query.update(params)
+        if cursor:
+            query[CURSOR_PARAM] = cursor
+        return KeysetPaginator(MilkProduction.objects.all(), 4).get_page(query)
+
+    def test_cursors_walk_forward_and_back(self):
+        pages = [self.page(status='x')]
+        while pages[-1].has_next():
+            self.assertIn('status=x', pages[-1].next_querystring)
+            pages.append(self.page(pages[-1].next_cursor, status='x'))
+        self.assertEqual([len(page) for page in pages], [4, 4, 1])
+        self.assertEqual([obj for page in pages for obj in page], self.ordered)
+        self.assertFalse(pages[0].has_previous())
+
+        back = self.page(self.page(pages[2].previous_cursor).previous_cursor)
+        self.assertEqual(list(back), list(pages[0]))
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_tampered_cursor_gives_first_page(self):
+        cursor = self.page().next_cursor
+        forged = [
+            cursor[:-2] + ('AA' if cursor[-2:] != 'AA' else 'BB'),
+            signing.dumps(['next', ['2024-05-02', '1']], salt='other'),
+            signing.dumps(['sideways', ['2024-05-02', '1']], salt=CURSOR_SALT),
+            signing.dumps(['next', ['2024-05-02']], salt=CURSOR_SALT),
+            'garbage',
+        ]
+        for cursor in forged:
+            page = self.page(cursor)
+            self.assertEqual(list(page), self.ordered[:4])
+            self.assertFalse(page.has_previous())
+
+
+class ActivityLogArchiveTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(archive, 'ACTIVITY_ARCHIVE_DIR', directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        user = get_user_model().objects.create_user('farmer', password='pw')
+        january = timezone.make_aware(datetime.datetime(2024, 1, 10, 12))
+        february = timezone.make_aware(datetime.datetime(2024, 2, 10, 12))
+        ActivityLog.objects.bulk_create(
+            [
+                ActivityLog(
+                    user=user, action='update', model_name='Cattle', object_id=number,
+                    description=f'Change {number}', timestamp=january + datetime.timedelta(hours=number),
+                )
+                for number in range(15)
+            ] + [
+                ActivityLog(
+                    user=user, action='create', model_name='MilkProduction', object_id=number,
+                    description=f'Record {number}', timestamp=february + datetime.timedelta(hours=number),
+                    ip_address='10.0.0.1',
+                )
+                for number in range(10)
+            ] + [
+                ActivityLog(user=user, action='delete', model_name='Feed', object_id=1, description='Recent')
+            ]
+        )
+        self.original = list(ActivityLog.objects.order_by('id').values(*archive.ARCHIVE_FIELDS))
+
+    def test_archive_and_restore_keep_every_row(self):
+        self.assertEqual(archive.archive_activity_logs(older_than_days=30, chunk_size=4), 25)
+        self.assertEqual(ActivityLog.objects.count(), 1)
+        self.assertEqual(
+            dict(ActivityLogArchive.objects.values_list('month', 'row_count')),
+            {datetime.date(2024, 1, 1): 15, datetime.date(2024, 2, 1): 10},
+        )
+
+        archived = list(archive.iter_archived_logs())
+        self.assertEqual(len(archived), 25)
+        ActivityLog.objects.bulk_create(archived)
+        self.assertEqual(list(ActivityLog.objects.order_by('id').values(*archive.ARCHIVE_FIELDS)), self.original)
+
+    def test_rows_written_twice_are_read_once(self):
+        # A crash between writing a chunk and deleting it leaves duplicates
+        rows = list(ActivityLog.objects.filter(model_name='Cattle').values(*archive.ARCHIVE_FIELDS))
+        archive._append_rows(datetime.date(2024, 1, 1), rows[:5])
+        archive.archive_activity_logs(older_than_days=30)
+        self.assertEqual(len(list(archive.iter_archived_logs())), 25)
+        self.assertEqual(len(list(archive.iter_archived_logs(
+            date_from=datetime.date(2024, 2, 1), model_name='MilkProduction'
+        ))), 10)
+
+
+class AttachmentStorageTests(TestCase):
+    """
+    References are released when the transaction commits
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = get_user_model().objects.create_user('farmer', password='pw')
+        self.cattle = make_cattle(self.user, 'KE-1')
+
+    def record(self, content):
+        return HealthRecord.objects.create(
+            cattle=self.cattle, record_type='treatment', date=datetime.date(2024, 5, 1),
+            description='Lab result', cost=0, recorded_by=self.user,
+            attachment=SimpleUploadedFile('result.pdf', content),
+        )
+
+    def references(self):
+        return dict(StoredFile.objects.values_list('name', 'ref_count'))
+
+    def test_identical_uploads_share_one_file(self):
+        first, second = self.record(b'blood count'), self.record(b'blood count')
+        self.assertEqual(first.attachment.name, second.attachment.name)
+        self.assertEqual(self.references(), {first.attachment.name: 2})
+        with first.attachment.open() as attachment:
+            self.assertEqual(attachment.read(), b'blood count')
+
+    def test_replace_and_delete_release_references(self):
+        first, second = self.record(b'blood count'), self.record(b'blood count')
+        shared = first.attachment.name
+
+        first.attachment = SimpleUploadedFile('result.pdf', b'revised count')
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+        self.assertEqual(self.references(), {shared: 1, first.attachment.name: 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.references(), {shared: 0, first.attachment.name: 1})
+
+        self.assertEqual(purge_unreferenced_attachments(grace_hours=0), 1)
+        self.assertEqual(self.references(), {first.attachment.name: 1})
+        self.assertFalse(os.path.exists(attachment_storage.path(shared)))
+        self.assertTrue(os.path.exists(attachment_storage.path(first.attachment.name)))
+
+
+class FertilityKpiTests(TestCase):
+    """
+    Figures checked against a herd worked out by hand
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+        cls.daisy = make_cattle(cls.user, 'KE-1')
+        cls.bella = make_cattle(cls.user, 'KE-2')
+        services = [
+            (cls.daisy, '2023-01-10', 'unsuccessful', None),
+            (cls.daisy, '2023-02-01', 'successful', '2023-11-10'),
+            (cls.daisy, '2024-01-20', 'unsuccessful', None),
+            (cls.daisy, '2024-02-10', 'unsuccessful', None),
+            (cls.daisy, '2024-03-02', 'successful', '2024-12-05'),
+            (cls.daisy, '2025-02-01', 'pending', None),
+            (cls.bella, '2024-03-15', 'unsuccessful', None),
+            (cls.bella, '2024-04-05', 'successful', None),
+        ]
+        for cattle, day, status, calving in services:
+            Breeding.objects.create(
+                cattle=cattle, breeding_type='artificial', date=day, sire_details='Bull  A',
+                status=status, actual_calving_date=calving, cost=0, recorded_by=cls.user,
+            )
+        refresh_fertility_stats(today=datetime.date(2025, 3, 1))
+
+    def test_cow_figures(self):
+        daisy = CattleFertilityStats.objects.get(cattle=self.daisy)
+        self.assertEqual(daisy.calvings, 2)
+        self.assertEqual(daisy.last_calving_date, datetime.date(2024, 12, 5))
+        # 2023-11-10 to 2024-12-05
+        self.assertEqual(daisy.average_calving_interval, 391)
+        # The pending service is not counted; 2 + 3 services for 2 conceptions
+        self.assertEqual((daisy.services, daisy.conceptions), (5, 2))
+        self.assertEqual(daisy.services_per_conception, 2.5)
+        # 2023-11-10 to 2024-03-02; the first conception had no calving before it
+        self.assertEqual(daisy.average_days_open, 113)
+        # 2024-12-05 to today
+        self.assertEqual(daisy.current_days_open, 86)
+
+        bella = CattleFertilityStats.objects.get(cattle=self.bella)
+        self.assertEqual((bella.calvings, bella.services, bella.conceptions), (0, 2, 1))
+        self.assertEqual(bella.services_per_conception, 2)
+        self.assertIsNone(bella.average_calving_interval)
+        self.assertIsNone(bella.average_days_open)
+        self.assertIsNone(bella.current_days_open)
+
+    def test_herd_summary(self):
+        [herd] = fertility_summary(self.user)
+        self.assertEqual((herd['services'], herd['conceptions'], herd['calvings']), (7, 3, 2))
+        self.assertAlmostEqual(herd['conception_rate'], 3 / 7)
+        self.assertAlmostEqual(herd['services_per_conception'], 7 / 3)
+        self.assertEqual(herd['average_days_open'], 113)
+        self.assertEqual(herd['average_calving_interval'], 391)
+
+        [by_sire] = fertility_summary(self.user, group_by=('sire',))
+        self.assertEqual((by_sire['sire'], by_sire['services']), ('Bull A', 7))
+        in_2024 = fertility_summary(
+            self.user, datetime.date(2024, 1, 1), datetime.date(2024, 12, 1)
+        )[0]
+        self.assertEqual((in_2024['services'], in_2024['conceptions'], in_2024['calvings']), (5, 2, 1))
+
+
+class PedigreeTests(TestCase):
+    """
+    A and B are founders with full sibs C and D; E is their calf. G is a
+    half sib of C by the founder X, and H a calf of C and G. I is a calf
+    of A and her son D.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+        cls.a = make_cattle(cls.user, 'A')
+        cls.b = make_cattle(cls.user, 'B', gender='M')
+        cls.x = make_cattle(cls.user, 'X', gender='M')
+        cls.c = make_cattle(cls.user, 'C', dam=cls.a, sire=cls.b)
+        cls.d = make_cattle(cls.user, 'D', gender='M', dam=cls.a, sire=cls.b)
+        cls.e = make_cattle(cls.user, 'E', dam=cls.c, sire=cls.d)
+        cls.g = make_cattle(cls.user, 'G', gender='M', dam=cls.a, sire=cls.x)
+        cls.h = make_cattle(cls.user, 'H', dam=cls.c, sire=cls.g)
+        cls.i = make_cattle(cls.user, 'I', dam=cls.a, sire=cls.d)
+
+    def inbreeding(self, cattle):
+        return Cattle.objects.get(pk=cattle.pk).inbreeding_coefficient
+
+    def test_closure_rows(self):
+        self.assertEqual(
+            [(cattle.tag_number, cattle.generation) for cattle in ancestors(self.e)],
+            [('C', 1), ('D', 1), ('A', 2), ('B', 2)],
+        )
+        self.assertEqual(
+            [(cattle.tag_number, cattle.generation) for cattle in ancestors(self.h, max_depth=1)],
+            [('C', 1), ('G', 1)],
+        )
+        self.assertEqual(
+            sorted(cattle.tag_number for cattle in descendants(self.b)), ['C', 'D', 'E', 'H', 'I']
+        )
+        # One row per pair, itself included, at the shortest depth
+        self.assertEqual(CattleAncestry.objects.filter(descendant=self.i).count(), 4)
+        self.assertEqual(CattleAncestry.objects.get(descendant=self.i, ancestor=self.a).depth, 1)
+
+    def test_inbreeding(self):
+        self.assertEqual(self.inbreeding(self.c), 0)
+        self.assertAlmostEqual(self.inbreeding(self.e), 0.25)
+        self.assertAlmostEqual(self.inbreeding(self.h), 0.125)
+        self.assertAlmostEqual(self.inbreeding(self.i), 0.25)
+        self.assertEqual(refresh_inbreeding(), 0)
+        kinship = kinship_matrix([self.c.pk, self.a.pk], [self.d.pk, self.g.pk])
+        self.assertEqual(kinship.shape, (2, 2))
+        # C with D is the inbreeding of E, C with G that of H
+        self.assertAlmostEqual(kinship[0, 0], 0.25)
+        self.assertAlmostEqual(kinship[0, 1], 0.125)
+        self.assertAlmostEqual(kinship[1, 0], 0.25)
+
+    def test_changing_a_parent_updates_descendants(self):
+        self.c.sire = self.x
+        self.c.save()
+        self.assertEqual(
+            [(cattle.tag_number, cattle.generation) for cattle in ancestors(self.e)],
+            [('C', 1), ('D', 1), ('A', 2), ('B', 2), ('X', 2)],
+        )
+        # C and D are now half sibs
+        self.assertAlmostEqual(self.inbreeding(self.e), 0.125)
+
+        self.d.delete()
+        self.assertEqual([cattle.tag_number for cattle in ancestors(self.e)], ['C', 'A', 'X'])
+        self.assertEqual(self.inbreeding(self.e), 0)
+
+    def form_data(self, cattle, **fields):
+        data = {
+            'name': cattle.name, 'tag_number': cattle.tag_number, 'breed': cattle.breed,
+            'date_of_birth': cattle.date_of_birth, 'gender': cattle.gender, 'weight': cattle.weight,
+            'status': cattle.status, 'dam': cattle.dam_id or '', 'sire': cattle.sire_id or '',
+        }
+        data.update(fields)
+        return data
+
+    def test_form_rejects_cycles(self):
+        form = CattleForm(self.form_data(self.a, dam=self.e.pk), instance=self.a, user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['dam'], ['A cattle cannot descend from itself.'])
+
+        form = CattleForm(self.form_data(self.d, sire=self.d.pk), instance=self.d, user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertIn('sire', form.errors)
+
+        form = CattleForm(self.form_data(self.a, sire=self.x.pk), instance=self.a, user=self.user)
+        self.assertTrue(form.is_valid(), form.errors)
+
+
+class BreedingCalendarTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+        cls.cow = make_cattle(cls.user, 'KE-1')
+        cls.today = datetime.date(2024, 6, 1)
+
+    def days(self, count):
+        return self.today + datetime.timedelta(days=count)
+
+    def serve(self, day, status='pending', **fields):
+        return Breeding.objects.create(
+            cattle=self.cow, breeding_type='artificial', date=day, sire_details='Bull A',
+            status=status, cost=0, recorded_by=self.user, **fields,
+        )
+
+    def events(self, today=None):
+        refresh_breeding_calendar([self.cow.pk], today or self.today)
+        return [
+            (event.kind, event.expected_date, event.start_date, event.end_date)
+            for event in self.cow.breeding_calendar_events.order_by('expected_date')
+        ]
+
+    def test_unconfirmed_service(self):
+        self.serve(self.days(-10), expected_calving_date=self.days(270))
+        self.assertEqual(self.events(), [
+            ('heat', self.days(11), self.days(10), self.days(12)),
+            ('pregnancy_check', self.days(25), self.days(25), self.days(25)),
+            ('calving', self.days(270), self.days(260), self.days(280)),
+        ])
+
+        # A pregnancy check since the service replaces the predicted one
+        HealthRecord.objects.create(
+            cattle=self.cow, record_type='pregnancy_check', date=self.days(-1),
+            description='Scan', cost=0, recorded_by=self.user,
+        )
+        self.assertEqual([event[0] for event in self.events()], ['heat', 'calving'])
+
+    def test_confirmed_and_failed_services(self):
+        breeding = self.serve(self.days(-40), status='successful')
+        self.assertEqual(self.events(), [
+            ('calving', self.days(243), self.days(233), self.days(253)),
+        ])
+
+        breeding.status = 'unsuccessful'
+        breeding.save()
+        heats = self.events()
+        self.assertEqual({event[0] for event in heats}, {'heat'})
+        # From the cycle in progress onwards
+        self.assertEqual(
+            [event[1] for event in heats], [self.days(-19 + 21 * cycle) for cycle in range(len(heats))]
+        )
+        self.assertLessEqual(heats[-1][1], self.days(90))
+        self.assertGreater(heats[-1][1], self.days(90 - 21))
+
+    def test_calving_starts_a_new_cycle(self):
+        self.serve(datetime.date(2023, 8, 1), status='successful', actual_calving_date=self.days(-5))
+        self.assertEqual(self.events()[0][:2], ('heat', self.days(16)))
+
+        # Only active cows have a calendar
+        Cattle.objects.filter(pk=self.cow.pk).update(status='sold')
+        self.assertEqual(self.events(), [])
+
+    def test_heats_are_queried_by_window_and_extended(self):
+        self.serve(self.days(-19), status='unsuccessful')
+        self.events()
+        self.assertEqual(
+            [(event.kind, event.expected_date) for event in breeding_events(self.user, self.days(3))],
+            [('heat', self.days(2))],
+        )
+        self.assertEqual(list(breeding_events(self.user, self.days(4), self.days(20))), [])
+
+        # Heats reach the horizon again once the calendar runs short
+        self.assertEqual(extend_breeding_calendar(self.today), 0)
+        later = self.days(80)
+        self.assertGreater(extend_breeding_calendar(later), 0)
+        last_heat = self.cow.breeding_calendar_events.order_by('expected_date').last()
+        self.assertGreater(last_heat.expected_date, later + datetime.timedelta(days=90 - 21))
+
+
+class DashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+        cls.daisy = make_cattle(cls.user, 'KE-1', name='Daisy')
+        cls.other = make_cattle(get_user_model().objects.create_user('neighbour'), 'KE-9')
+        cls.today = timezone.localdate()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def health_record(self, cattle, record_type, day, next_checkup_date=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return HealthRecord.objects.create(
+                cattle=cattle, record_type=record_type, date=day, description='Visit',
+                next_checkup_date=next_checkup_date, cost=0, recorded_by=self.user,
+            )
+
+    def test_care_due(self):
+        soon = self.health_record(self.daisy, 'check_up', self.today, self.today + datetime.timedelta(days=3))
+        self.health_record(self.daisy, 'vaccination', self.today, self.today + datetime.timedelta(days=60))
+        self.health_record(self.other, 'check_up', self.today, self.today + datetime.timedelta(days=1))
+
+        response = self.client.get(reverse('farm:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(item.cattle, item.kind, item.source_id) for item in response.context['care_due']],
+            [(self.daisy, 'checkup', soon.pk)],
+        )
+
+    def test_watch_tomorrow(self):
+        # Served 20 days ago: a return to heat is watched from tomorrow
+        served = self.today - datetime.timedelta(days=20)
+        with self.captureOnCommitCallbacks(execute=True):
+            Breeding.objects.create(
+                cattle=self.daisy, breeding_type='artificial', date=served, sire_details='Bull A',
+                status='pending', cost=0, recorded_by=self.user,
+            )
+            Breeding.objects.create(
+                cattle=self.other, breeding_type='artificial', date=served, sire_details='Bull A',
+                status='pending', cost=0, recorded_by=self.user,
+            )
+
+        response = self.client.get(reverse('farm:dashboard'))
+        self.assertEqual(
+            [(event.cattle, event.kind, event.expected_date) for event in response.context['watch_tomorrow']],
+            [(self.daisy, 'heat', served + datetime.timedelta(days=21))],
+        )
+        self.assertContains(response, 'Daisy')
+
+
+class CareItemTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+        cls.daisy = make_cattle(cls.user, 'KE-1')
+        cls.day = datetime.date(2024, 5, 1)
+
+    def health_record(self, record_type, days, next_in=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return HealthRecord.objects.create(
+                cattle=self.daisy, record_type=record_type,
+                date=self.day + datetime.timedelta(days=days), description='Visit',
+                next_checkup_date=self.day + datetime.timedelta(days=next_in) if next_in else None,
+                cost=0, recorded_by=self.user,
+            )
+
+    def statuses(self):
+        return dict(CareDueItem.objects.values_list('source_id', 'status'))
+
+    def test_only_check_ups_close_checkups(self):
+        checkup = self.health_record('check_up', 0, next_in=30)
+        self.health_record('treatment', 1)
+        self.health_record('deworming', 2)
+        self.assertEqual(self.statuses(), {checkup.pk: 'due'})
+
+        # A treatment asking for a follow-up opens its own item
+        follow_up = self.health_record('treatment', 3, next_in=10)
+        self.assertEqual(self.statuses(), {checkup.pk: 'due', follow_up.pk: 'due'})
+
+        self.health_record('check_up', 12)
+        self.assertEqual(self.statuses(), {checkup.pk: 'done', follow_up.pk: 'done'})
+
+    def test_kinds_are_closed_separately(self):
+        vaccination = self.health_record('vaccination', 0, next_in=180)
+        checkup = self.health_record('check_up', 0, next_in=30)
+        booster = self.health_record('vaccination', 170, next_in=360)
+        self.assertEqual(
+            self.statuses(), {vaccination.pk: 'superseded', checkup.pk: 'due', booster.pk: 'due'}
+        )
+        self.assertEqual(
+            dict(CareDueItem.objects.values_list('source_id', 'kind')),
+            {vaccination.pk: 'vaccination', checkup.pk: 'checkup', booster.pk: 'vaccination'},
+        )
+
+        # Deleting the record removes its item and reopens the earlier one
+        with self.captureOnCommitCallbacks(execute=True):
+            booster.delete()
+        self.assertEqual(self.statuses(), {vaccination.pk: 'due', checkup.pk: 'due'})
+
+
+class MilkProductionPdfTests(TestCase):
+
+    def test_tables_stay_above_the_page_number(self):
+        cattle = make_cattle(get_user_model().objects.create_user('farmer'), 'KE-1')
+        MilkProduction.objects.bulk_create(
+            MilkProduction(
+                cattle=cattle, date=datetime.date(2024, 1, 1) + datetime.timedelta(days=day),
+                milking_session=session, quantity=10,
+            )
+            for day in range(60) for session in ('morning', 'evening')
+        )
+        drawn = []
+        draw = utils._draw_on_page
+
+        def record_draw(pdf, flowable, y):
+            bottom = draw(pdf, flowable, y)
+            drawn.append((pdf.getPageNumber(), bottom))
+            return bottom
+
+        with mock.patch.object(utils, '_draw_on_page', record_draw):
+            output = utils.generate_milk_production_pdf(MilkProduction.objects.all())
+        self.assertTrue(output.getvalue().startswith(b'%PDF'))
+        self.assertGreater(drawn[-1][0], 1)
+        # The page number is drawn half an inch from the bottom
+        self.assertGreaterEqual(min(bottom for _, bottom in drawn), utils.inch)
+
+
+class NotificationSummaryCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+
+    def notify(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(
+                user=self.user, title=title, message='...', notification_type='general', priority='low',
+            )
+
+    def summary(self):
+        return notifications.get_notification_summary(self.user.pk)
+
+    def test_summary_is_computed_once_until_notifications_change(self):
+        for number in range(notifications.NOTIFICATION_HEADERS + 1):
+            self.notify(f'N{number}')
+        with mock.patch.object(notifications, '_compute_summary', wraps=notifications._compute_summary) as compute:
+            self.assertEqual(self.summary()['unread'], notifications.NOTIFICATION_HEADERS + 1)
+            self.summary()
+            self.assertEqual(compute.call_count, 0)
+
+            # Refreshed when the write commits, not on the next read
+            latest = self.notify('Latest')
+            self.assertEqual(compute.call_count, 1)
+            summary = self.summary()
+            self.assertEqual(compute.call_count, 1)
+        self.assertEqual(len(summary['recent']), notifications.NOTIFICATION_HEADERS)
+        self.assertEqual(summary['recent'][0]['id'], latest.pk)
+
+    def test_bulk_writes_refresh_the_summary(self):
+        self.notify('A')
+        self.notify('B')
+        self.assertEqual(self.summary()['unread'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.mark_notifications_read(self.user)
+        self.assertEqual(self.summary()['unread'], 0)
+
+    def test_fan_outs_only_drop_the_summary(self):
+        self.notify('A')
+        self.summary()
+        with mock.patch.object(notifications, '_compute_summary', wraps=notifications._compute_summary) as compute:
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.bulk_create([Notification(
+                    user=self.user, title='B', message='...', notification_type='general', priority='low',
+                )])
+                notifications.notifications_changed({self.user.pk}, refresh=False)
+            self.assertIsNone(notifications.cache.get(notifications._cache_key(self.user.pk)))
+            self.assertEqual(compute.call_count, 0)
+            self.assertEqual(self.summary()['unread'], 2)
+            self.assertEqual(compute.call_count, 1)
+
+
+class NotificationEventStreamTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+
+    def notify(self, title):
+        # Written as another process would: no signal reaches this broker
+        return Notification.objects.bulk_create([Notification(
+            user=self.user, title=title, message='...', notification_type='general', priority='low',
+        )])[0]
+
+    @mock.patch.object(views, 'EVENT_STREAM_HEARTBEAT', 0.01)
+    def test_changes_from_other_processes_are_streamed(self):
+        self.notify('Old')
+
+        async def read_stream():
+            events = []
+            stream = views._notification_event_stream(self.user.pk, None)
+            events.append(await anext(stream))
+            await sync_to_async(self.notify)('New')
+            for _ in range(10):
+                event = await anext(stream)
+                if not event.startswith(':'):
+                    events.append(event)
+                if len(events) == 3:
+                    break
+            await stream.aclose()
+            return events
+
+        events = async_to_sync(read_stream)()
+        self.assertEqual(len(events), 3)
+        self.assertIn('"count": 1', events[0])
+        self.assertTrue(events[1].startswith('event: notification'))
+        self.assertIn('"title": "New"', events[1])
+        self.assertIn('"count": 2', events[2])
+
+
+class NotificationBulkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+        cls.other = get_user_model().objects.create_user('neighbour', password='pw')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def notify(self, user, title, read_days_ago=None):
+        notification = Notification.objects.create(
+            user=user, title=title, message='...', notification_type='general', priority='low',
+        )
+        if read_days_ago is not None:
+            Notification.objects.filter(pk=notification.pk).update(
+                is_read=True, read_at=timezone.now() - datetime.timedelta(days=read_days_ago)
+            )
+        return notification
+
+    def post(self, name, data=None):
+        return self.client.post(reverse(f'farm:{name}'), data or {}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_mark_all_read(self):
+        self.notify(self.user, 'A')
+        self.notify(self.user, 'B')
+        theirs = self.notify(self.other, 'C')
+        response = self.post('mark_all_notifications_read')
+        self.assertEqual(response.json(), {'status': 'success', 'count': 2, 'unread_count': 0})
+        theirs.refresh_from_db()
+        self.assertFalse(theirs.is_read)
+
+    def test_selected_ids_are_scoped_to_the_user(self):
+        mine = self.notify(self.user, 'A')
+        kept = self.notify(self.user, 'B')
+        theirs = self.notify(self.other, 'C')
+        response = self.post('mark_selected_notifications_read', {'ids': [mine.pk, theirs.pk, 'x']})
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(response.json()['unread_count'], 1)
+
+        response = self.post('delete_selected_notifications', {'ids': [kept.pk, theirs.pk]})
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(
+            set(Notification.objects.values_list('title', flat=True)), {'A', 'C'}
+        )
+
+    def test_purge_read_notifications(self):
+        self.notify(self.user, 'Old', read_days_ago=40)
+        self.notify(self.user, 'Recent', read_days_ago=5)
+        self.notify(self.user, 'Unread')
+        self.notify(self.other, 'Theirs', read_days_ago=40)
+        self.assertEqual(self.post('purge_notifications').json()['count'], 1)
+        self.assertEqual(self.post('purge_notifications', {'days': 1}).json()['count'], 1)
+        self.assertEqual(
+            set(Notification.objects.values_list('title', flat=True)), {'Unread', 'Theirs'}
+        )
+
+    def test_purge_rejects_bad_day_counts(self):
+        self.notify(self.user, 'Old', read_days_ago=40)
+        for days in ['soon', '-1', '99999999999']:
+            response = self.post('purge_notifications', {'days': days})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('days', response.json()['errors'])
+        self.assertEqual(Notification.objects.count(), 1)
+
+
+class CheckupFanOutTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+        cls.today = datetime.date(2024, 5, 1)
+        cls.herd = [make_cattle(cls.user, f'KE-{number}') for number in range(2)]
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for cattle in self.herd:
+                HealthRecord.objects.create(
+                    cattle=cattle, record_type='check_up', date=self.today - datetime.timedelta(days=30),
+                    description='Visit', next_checkup_date=self.today + datetime.timedelta(days=1),
+                    cost=0, recorded_by=self.user,
+                )
+
+    def test_reminders_are_sent_once(self):
+        self.assertEqual(fan_out_health_checkups(self.today), 2)
+        self.assertEqual(fan_out_health_checkups(self.today), 0)
+        self.assertEqual(
+            sorted(Notification.objects.values_list('related_to_id', 'notification_type', 'priority')),
+            [(cattle.pk, 'health_checkup', 'medium') for cattle in self.herd],
+        )
+
+    def test_reminders_of_a_concurrent_run_are_not_counted(self):
+        count = QuerySet.count
+
+        def concurrent_run_after_snapshot(queryset):
+            # Another run inserts one of the reminders this run is about to
+            if queryset.model is Notification and not Notification.objects.exists():
+                Notification.objects.create(
+                    user=self.user, related_to=self.herd[0], notification_type='health_checkup',
+                    due_date=self.today + datetime.timedelta(days=1), title='Due', message='...',
+                )
+            return count(queryset)
+
+        with mock.patch.object(QuerySet, 'count', concurrent_run_after_snapshot):
+            self.assertEqual(fan_out_health_checkups(self.today), 1)
+        self.assertEqual(Notification.objects.count(), 2)
+
+
+class DashboardCacheTests(MilkRecordTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pw')
+        cls.other = get_user_model().objects.create_user('neighbour', password='pw')
+        cls.daisy = make_cattle(cls.user, 'KE-1')
+        cls.start, cls.end = datetime.date(2024, 5, 1), datetime.date(2024, 5, 31)
+
+    def test_built_once_per_data_version(self):
+        self.record(self.daisy, datetime.date(2024, 5, 2), 'morning', '10')
+        with mock.patch.object(analytics, 'build_dashboard', wraps=analytics.build_dashboard) as build:
+            first = analytics.get_dashboard(self.user, self.start, self.end)
+            self.assertEqual(analytics.get_dashboard(self.user, self.start, self.end), first)
+            self.assertEqual(build.call_count, 1)
+            self.assertEqual(first['total_production'], 10)
+
+            # Other ranges and herds have their own entries
+            analytics.get_dashboard(self.user, self.start, datetime.date(2024, 5, 15))
+            analytics.get_dashboard(self.other, self.start, self.end)
+            self.assertEqual(build.call_count, 3)
+
+            # New milk data moves the herd to a new key
+            self.record(self.daisy, datetime.date(2024, 5, 3), 'morning', '5')
+            self.assertEqual(analytics.get_dashboard(self.user, self.start, self.end)['total_production'], 15)
+            self.assertEqual(build.call_count, 4)
+
+    def test_waits_for_a_build_in_another_process(self):
+        version = analytics.herd_data_version(self.user)
+        key = analytics.dashboard_cache_key(self.user, self.start, self.end, version)
+        built = {'total_production': 42}
+        # Another process holds the lock and stores its result meanwhile
+        analytics.cache.add(f'{key}:lock', 1)
+        with mock.patch.object(analytics, 'build_dashboard') as build, \
+                mock.patch.object(analytics.time, 'sleep', lambda _: analytics.cache.set(key, built)):
+            self.assertEqual(analytics.get_dashboard(self.user, self.start, self.end), built)
+        build.assert_not_called()
+
+
+@jobs.task(name='farm.tests.divide', max_attempts=2, retry_delay=60, timeout=30)
+def divide(a, b):
+    return a / b
+
+
+class JobQueueTests(TestCase):
+
+    def test_claims_in_run_order_with_a_lease(self):
+        later = divide.enqueue((1, 1), run_at=timezone.now() - datetime.timedelta(seconds=1))
+        first = divide.enqueue((2, 1), run_at=timezone.now() - datetime.timedelta(seconds=5))
+        divide.enqueue((3, 1), run_at=timezone.now() + datetime.timedelta(hours=1))
+
+        job = jobs.claim_job('worker-a')
+        self.assertEqual((job.pk, job.status, job.attempts, job.locked_by), (first.pk, 'running', 1, 'worker-a'))
+        self.assertAlmostEqual(
+            (job.lease_expires_at - timezone.now()).total_seconds(), 30, delta=5
+        )
+        self.assertEqual(jobs.claim_job('worker-b').pk, later.pk)
+        self.assertIsNone(jobs.claim_job('worker-c'))
+
+        # A worker that stops renewing its lease loses the job
+        QueuedJob.objects.filter(pk=first.pk).update(lease_expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        job = jobs.claim_job('worker-c')
+        self.assertEqual((job.pk, job.attempts, job.locked_by), (first.pk, 2, 'worker-c'))
+        # and cannot record its outcome over the new owner's
+        self.assertTrue(jobs.run_job(QueuedJob.objects.get(pk=first.pk), 'worker-a'))
+        self.assertEqual(QueuedJob.objects.get(pk=first.pk).status, 'running')
+
+    def test_failed_jobs_retry_with_backoff(self):
+        queued = divide.delay(1, 0)
+        job = jobs.claim_job('worker')
+        with self.assertLogs('farm.jobs', 'ERROR'):
+            self.assertFalse(jobs.run_job(job, 'worker'))
+        job = QueuedJob.objects.get(pk=queued.pk)
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('ZeroDivisionError', job.error)
+        self.assertAlmostEqual((job.run_at - timezone.now()).total_seconds(), 60, delta=5)
+
+        QueuedJob.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        job = jobs.claim_job('worker')
+        with self.assertLogs('farm.jobs', 'ERROR'):
+            self.assertFalse(jobs.run_job(job, 'worker'))
+        self.assertEqual(QueuedJob.objects.get(pk=job.pk).status, 'failed')
+
+        done = divide.delay(6, 3)
+        self.assertTrue(jobs.run_job(jobs.claim_job('worker'), 'worker'))
+        done.refresh_from_db()
+        self.assertEqual((done.status, done.result, done.locked_by), ('done', 2.0, ''))
+
+    def test_worker_survives_database_errors(self):
+        job = divide.delay(4, 2)
+        worker = jobs.Worker(poll_interval=0, burst=True)
+        claim = mock.Mock(side_effect=[OperationalError('database is locked'), job, None])
+        with mock.patch.object(jobs, 'claim_job', claim), mock.patch.object(jobs, 'run_job') as run, \
+                self.assertLogs('farm.jobs', 'ERROR'):
+            worker._loop(1)
+        self.assertEqual(claim.call_count, 3)
+        run.assert_called_once()
+        self.assertEqual(worker.processed, 1)
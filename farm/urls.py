@@ -15,6 +15,7 @@ urlpatterns = [
     # Cattle Management
     path('cattle/', views.cattle_list, name='cattle_list'),
     path('cattle/add/', views.cattle_add, name='cattle_create'),
+    path('cattle/search/', views.cattle_search, name='cattle_search'),
     path('cattle/<int:pk>/', views.cattle_detail, name='cattle_detail'),
     path('cattle/<int:pk>/edit/', views.cattle_edit, name='cattle_edit'),
     path('cattle/<int:pk>/delete/', views.cattle_delete, name='cattle_delete'),
@@ -23,14 +24,18 @@ urlpatterns = [
     # Milk Production
     path('milk/', views.milk_production_list, name='milk_production_list'),
     path('milk/add/', views.milk_production_add, name='milk_production_add'),
+    path('milk/bulk/', views.milk_production_bulk, name='milk_production_bulk'),
     path('milk/export/', views.milk_production_export, name='milk_production_export'),
     path('milk/export/pdf/', views.export_milk_production_pdf, name='milk_production_pdf'),
+    path('reports/<int:job_id>/', views.report_job_status, name='report_job_status'),
+    path('reports/<int:job_id>/download/', views.report_job_download, name='report_job_download'),
     
     # Health Records
     path('health/', views.health_record_list, name='health_record_list'),
     path('health/add/', views.health_record_add, name='health_record_add'),
     path('health/<int:pk>/edit/', views.health_record_edit, name='health_record_edit'),
     path('health/<int:pk>/delete/', views.health_record_delete, name='health_record_delete'),
+    path('health/<int:pk>/attachment/', views.health_record_attachment, name='health_record_attachment'),
     
     # Analytics
     path('analytics/', views.analytics_dashboard, name='analytics'),
@@ -40,6 +45,11 @@ urlpatterns = [
     path('notifications/', views.notifications_list, name='notifications_list'),
     path('notifications/<int:notification_id>/mark-read/', views.mark_notification_read, name='mark_notification_read'),  # Fixed name
     path('notifications/<int:notification_id>/delete/', views.delete_notification, name='delete_notification'),
+    path('notifications/mark-all-read/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
+    path('notifications/mark-read/', views.mark_selected_notifications_read, name='mark_selected_notifications_read'),
+    path('notifications/delete/', views.delete_selected_notifications, name='delete_selected_notifications'),
+    path('notifications/purge/', views.purge_notifications, name='purge_notifications'),
+    path('notifications/events/', views.notification_events, name='notification_events'),
     
     # Activity Logs
    path('logs/', views.activity_log_list, name='activity_log_list'),
@@ -1,93 +1,154 @@
 # farm/utils.py
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle, Paragraph
 from reportlab.lib.styles import getSampleStyleSheet
 from io import BytesIO
-from django.db.models import Sum
+from decimal import Decimal
 
+# Rows read from the database at a time
+PDF_CHUNK_SIZE = 400
 
-def generate_milk_production_pdf(productions, title="Milk Production Report"):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    
-    # Add title
+PDF_COLUMNS = ['Date', 'Cattle', 'Session', 'Quantity (L)', 'Fat (%)']
+# Widest values of each column, to measure a table row
+PDF_SAMPLE_ROW = ['2000-12-31', 'Cattle', 'Afternoon', '9999.99', '99.99']
+
+PDF_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+PDF_TOTALS_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), colors.lightgrey),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+
+def _height(pdf, flowable):
+    return flowable.wrapOn(pdf, letter[0] - 2 * inch, letter[1])[1]
+
+
+def _draw_on_page(pdf, flowable, y):
+    height = _height(pdf, flowable)
+    flowable.drawOn(pdf, inch, y - height)
+    return y - height
+
+
+def _rows_that_fit(pdf, space):
+    # Cells do not wrap, so every row of the table has the same height
+    header = Table([PDF_COLUMNS])
+    header.setStyle(PDF_TABLE_STYLE)
+    sample = Table([PDF_COLUMNS, PDF_SAMPLE_ROW])
+    sample.setStyle(PDF_TABLE_STYLE)
+    header_height = _height(pdf, header)
+    return max(int((space - header_height) // (_height(pdf, sample) - header_height)), 1)
+
+
+def generate_milk_production_pdf(productions, title="Milk Production Report",
+                                 output=None, rows_per_page=None):
+    """
+    Render a milk production report page by page.
+
+    Rows are read from ``productions`` with a chunked iterator and each page
+    is drawn as its own small table, so memory and layout cost stay flat
+    however long the report is. A page holds as many rows as fit between
+    the top margin and the page number (at most ``rows_per_page``). Writes
+    to ``output`` (a path or file-like object) or returns a BytesIO when
+    none is given.
+    """
+    buffer = output if output is not None else BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    pdf.setTitle(title)
     styles = getSampleStyleSheet()
-    elements.append(Paragraph(title, styles['Heading1']))
-    
-    # Create table data
-    data = [['Date', 'Cattle', 'Morning (L)', 'Evening (L)', 'Total (L)']]
-    for prod in productions:
-        data.append([
-            prod.date.strftime('%Y-%m-%d'),
-            prod.cattle.name,
-            f"{prod.morning_amount:.2f}",
-            f"{prod.evening_amount:.2f}",
-            f"{prod.total_amount:.2f}"
+    top = letter[1] - inch
+    heading = Paragraph(title, styles['Heading1'])
+    capacities = [
+        _rows_that_fit(pdf, top - inch - _height(pdf, heading)),
+        _rows_that_fit(pdf, top - inch),
+    ]
+    if rows_per_page:
+        capacities = [min(capacity, rows_per_page) for capacity in capacities]
+
+    rows = productions.order_by('date', 'id').values_list(
+        'date', 'cattle__name', 'milking_session', 'quantity', 'fat_content'
+    ).iterator(chunk_size=PDF_CHUNK_SIZE)
+
+    session_totals = {}
+    page = [PDF_COLUMNS]
+    page_number = 1
+
+    def flush_page(last=False):
+        nonlocal page_number
+        y = top
+        if page_number == 1:
+            y = _draw_on_page(pdf, heading, y)
+        table = Table(page, repeatRows=1)
+        table.setStyle(PDF_TABLE_STYLE)
+        y = _draw_on_page(pdf, table, y)
+        if last:
+            totals = [[f'{session.title()} total', f'{total:.2f}']
+                      for session, total in sorted(session_totals.items())]
+            totals.append(['TOTAL', f'{sum(session_totals.values(), Decimal("0")):.2f}'])
+            totals_table = Table(totals)
+            totals_table.setStyle(PDF_TOTALS_STYLE)
+            if _height(pdf, totals_table) > y - 12 - inch:
+                pdf.drawRightString(letter[0] - inch, inch / 2, f'Page {page_number}')
+                pdf.showPage()
+                page_number += 1
+                y = top + 12
+            _draw_on_page(pdf, totals_table, y - 12)
+        pdf.drawRightString(letter[0] - inch, inch / 2, f'Page {page_number}')
+        pdf.showPage()
+
+    for date, cattle_name, session, quantity, fat_content in rows:
+        page.append([
+            date.strftime('%Y-%m-%d'),
+            cattle_name,
+            session.title(),
+            f"{quantity:.2f}",
+            f"{fat_content:.2f}" if fat_content is not None else '-',
         ])
-    
-    # Calculate totals
-    totals = productions.aggregate(
-        total_morning=Sum('morning_amount'),
-        total_evening=Sum('evening_amount')
-    )
-    data.append([
-        'TOTAL',
-        '',
-        f"{totals['total_morning']:.2f}",
-        f"{totals['total_evening']:.2f}",
-        f"{(totals['total_morning'] + totals['total_evening']):.2f}"
-    ])
-    
-    # Create table
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-        ('TEXTCOLOR', (0, -1), (-1, -1), colors.black),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, -1), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
-    
-    buffer.seek(0)
-    return buffer
+        session_totals[session] = session_totals.get(session, Decimal('0')) + quantity
+        if len(page) > capacities[page_number > 1]:
+            flush_page()
+            page = [PDF_COLUMNS]
+            page_number += 1
 
+    flush_page(last=True)
+    pdf.save()
+
+    if output is None:
+        buffer.seek(0)
+    return buffer
 
-# farm/utils.py
-from django.contrib.contenttypes.models import ContentType
-from .models import ActivityLog
 
 def log_activity(user, action, obj, description='', ip_address=None):
     """
     Log user activities in the system
     
+    The entry is queued and written in the background by
+    farm.activity.writer, so this never touches the database.
+
     Args:
-        user: The user performing the action
-        action: String indicating the type of action ('create', 'update', 'delete', 'view', 'export')
+        user: The user performing the action (None for the current request's user)
+        action: String indicating the type of action ('create', 'update', 'delete')
         obj: The model instance being acted upon
         description: Optional description of the action
         ip_address: IP address of the user (optional)
     """
-    content_type = ContentType.objects.get_for_model(obj)
-    
-    ActivityLog.objects.create(
-        user=user,
-        action=action,
-        content_type=content_type,
-        object_id=obj.id,
-        description=description,
-        ip_address=ip_address
-    )
+    from .activity import record_activity
+
+    return record_activity(user, action, obj, description, ip_address)
 
 def get_client_ip(request):
     """
@@ -155,3 +216,9 @@ def generate_tag_number():
         # Check if it already exists
         if not Cattle.objects.filter(tag_number=tag).exists():
             return tag
+
+def can_view_all_herds(user):
+    """
+    Admins may look at any herd (or all of them) in the analytics views
+    """
+    return bool(user and (user.is_superuser or getattr(user, 'role', None) == 'admin'))
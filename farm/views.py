@@ -8,11 +8,31 @@ from django.db.models import Sum, Avg
 from django.db.models.functions import ExtractMonth, ExtractYear
 from datetime import datetime, timedelta
 import csv
+import io
+import mimetypes
+import os
 from django.contrib.auth import logout
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, quote_etag
 from django.core.paginator import Paginator
-from .models import Cattle, MilkProduction, HealthRecord
-from .forms import CattleForm, MilkProductionForm, HealthRecordForm
+from django.views.decorators.http import require_POST
+from .models import Cattle, MilkProduction, HealthRecord, MilkDailyRollup, ReportJob
+from .forms import (
+    AnalyticsFilterForm, CattleForm, MilkProductionForm, HealthRecordForm,
+    HealthRecordSearchForm, MilkProductionSearchForm, NotificationPurgeForm
+)
+from .ingest import BulkPayloadError, ingest_milk_rows, parse_bulk_payload
+from .analytics import get_dashboard
+from .breeding_calendar import breeding_events
+from .care import due_care_items
+from .fertility import fertility_summary
+from .lactation import current_curve
+from .pagination import CURSOR_PARAM, KeysetPaginator
+from .reports import enqueue_report
+from .search import record_type_facet, search_cattle, typeahead_cattle, year_facet
+from .storage import ATTACHMENT_CHUNK_SIZE
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect
 from django.contrib import messages
@@ -53,27 +73,6 @@ def profile(request):
     })
 
 
-@login_required
-def dashboard(request):
-    total_cattle = Cattle.objects.filter(owner=request.user, status='active').count()
-    today_milk = MilkProduction.objects.filter(
-        recorded_by=request.user,
-        date=datetime.date.today()
-    ).aggregate(
-        total=Sum('morning_amount') + Sum('evening_amount')
-    )['total'] or 0
-    
-    recent_health_records = HealthRecord.objects.filter(
-        recorded_by=request.user
-    ).order_by('-date')[:5]
-    
-    context = {
-        'total_cattle': total_cattle,
-        'today_milk': today_milk,
-        'recent_health_records': recent_health_records,
-    }
-    return render(request, 'farm/dashboard.html', context)
-
 # Cattle Views
 @login_required
 def cattle_list(request):
@@ -85,20 +84,52 @@ def cattle_list(request):
 
 @login_required
 def cattle_detail(request, pk):
-    cattle = get_object_or_404(Cattle, pk=pk, owner=request.user)
-    milk_records = MilkProduction.objects.filter(cattle=cattle).order_by('-date')[:10]
+    cattle = get_object_or_404(
+        Cattle.objects.select_related('milk_stats', 'fertility_stats', 'dam', 'sire'),
+        pk=pk, owner=request.user
+    )
+    milk_records = list(MilkDailyRollup.objects.filter(cattle=cattle).order_by('-date')[:10])
     health_records = HealthRecord.objects.filter(cattle=cattle).order_by('-date')[:10]
+
+    # Expected yields come from the stored lactation curve, no refitting here
+    lactation_curve = current_curve(cattle)
+    for record in milk_records:
+        record.expected_quantity = (
+            lactation_curve.expected_yield(record.date) if lactation_curve else None
+        )
+
     context = {
         'cattle': cattle,
         'milk_records': milk_records,
         'health_records': health_records,
+        'lactation_curve': lactation_curve,
+        'expected_today': lactation_curve.expected_yield() if lactation_curve else None,
+        'fertility_stats': getattr(cattle, 'fertility_stats', None),
     }
     return render(request, 'farm/cattle_detail.html', context)
 
+@login_required
+def cattle_search(request):
+    """
+    Type-ahead suggestions for the cattle search box
+    """
+    matches = typeahead_cattle(Cattle.objects.filter(owner=request.user), request.GET.get('q', ''))
+    return JsonResponse({
+        'results': [
+            {
+                'id': animal['id'],
+                'name': animal['name'],
+                'tag_number': animal['tag_number'],
+                'url': reverse('farm:cattle_detail', args=[animal['id']]),
+            }
+            for animal in matches
+        ]
+    })
+
 @login_required
 def cattle_add(request):
     if request.method == 'POST':
-        form = CattleForm(request.POST)
+        form = CattleForm(request.POST, user=request.user)
         if form.is_valid():
             cattle = form.save(commit=False)
             cattle.owner = request.user
@@ -106,7 +137,7 @@ def cattle_add(request):
             messages.success(request, 'Cattle added successfully!')
             return redirect('cattle_detail', pk=cattle.pk)
     else:
-        form = CattleForm()
+        form = CattleForm(user=request.user)
     return render(request, 'farm/cattle_form.html', {'form': form, 'title': 'Add Cattle'})
 
 # Milk Production Views
@@ -134,11 +165,80 @@ def milk_production_add(request):
         form = MilkProductionForm()
     return render(request, 'farm/milk_production_form.html', {'form': form})
 
+@login_required
+@require_POST
+def milk_production_bulk(request):
+    """
+    Record a whole milking session in one request.
+
+    Accepts a JSON or CSV body (or a CSV file uploaded as ``file``) of
+    tag_number, date, milking_session, quantity and fat_content rows and
+    reports per-row errors alongside the created/updated counts.
+    """
+    upload = request.FILES.get('file')
+    if upload:
+        body, content_type = upload.read(), 'text/csv'
+    else:
+        body, content_type = request.body, request.content_type or ''
+
+    try:
+        rows = parse_bulk_payload(body, content_type)
+    except (BulkPayloadError, UnicodeDecodeError) as exc:
+        return JsonResponse({'status': 'error', 'message': str(exc)}, status=400)
+
+    result = ingest_milk_rows(rows, request.user)
+    status = 400 if result['errors'] and not (result['created'] or result['updated']) else 200
+    return JsonResponse({'status': 'success' if status == 200 else 'error', **result}, status=status)
+
 # Health Record Views
 @login_required
 def health_record_list(request):
-    health_records = HealthRecord.objects.all()
-    return render(request, 'farm/health_record_list.html', {'health_records': health_records})
+    # Health records of the user's herd, newest first
+    form = HealthRecordSearchForm(request.GET or None, user=request.user)
+    herd_records = HealthRecord.objects.filter(cattle__owner=request.user)
+    health_records = form.filter(herd_records).select_related('cattle', 'recorded_by')
+    page = KeysetPaginator(health_records, 25).get_page(request.GET)
+
+    # Searches show how the matches spread over record types and years;
+    # each facet counts with every filter but its own
+    facets = None
+    if form.is_bound and form.is_valid() and form.cleaned_data['q']:
+        labels = dict(HealthRecord.RECORD_TYPES)
+        facets = {
+            'record_type': [
+                {
+                    'label': labels.get(row['record_type'], row['record_type']),
+                    'count': row['count'],
+                    'querystring': _facet_querystring(request.GET, record_type=row['record_type']),
+                }
+                for row in record_type_facet(form.filter(herd_records, exclude=('record_type',)))
+            ],
+            'year': [
+                {
+                    'label': row['year'],
+                    'count': row['count'],
+                    'querystring': _facet_querystring(
+                        request.GET, start_date=f"{row['year']}-01-01", end_date=f"{row['year']}-12-31"
+                    ),
+                }
+                for row in year_facet(form.filter(herd_records, exclude=('date',)))
+            ],
+        }
+
+    return render(request, 'farm/health_record_list.html', {
+        'health_records': page,
+        'page': page,
+        'form': form,
+        'facets': facets,
+    })
+
+
+def _facet_querystring(params, **values):
+    params = params.copy()
+    params.pop(CURSOR_PARAM, None)
+    for key, value in values.items():
+        params[key] = value
+    return params.urlencode()
 
 @login_required
 def health_record_add(request):
@@ -186,6 +286,98 @@ def health_record_delete(request, pk):
     return render(request, 'farm/health_record_confirm_delete.html', {'health_record': health_record})
 
 
+def _byte_range(header, size):
+    """
+    (start, end) of a single "bytes=" range, end inclusive. None when the
+    header is absent or not understood (serve the whole file), False when
+    the range cannot be satisfied.
+    """
+    units, _, ranges = header.partition('=')
+    if units.strip() != 'bytes' or ',' in ranges:
+        return None
+    start, _, end = ranges.strip().partition('-')
+    try:
+        if not start:
+            # Suffix range: the last ``end`` bytes
+            length = int(end)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def _file_chunks(storage, name, start, length):
+    with storage.open(name, 'rb') as attachment:
+        attachment.seek(start)
+        while length > 0:
+            chunk = attachment.read(min(ATTACHMENT_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@login_required
+def health_record_attachment(request, pk):
+    """
+    Stream a health record's attachment. Supports conditional requests
+    (the content hash is the ETag) and single byte ranges, so browsers can
+    resume downloads and seek in PDFs.
+    """
+    health_record = get_object_or_404(HealthRecord, pk=pk, cattle__owner=request.user)
+    attachment = health_record.attachment
+    if not attachment:
+        raise Http404('This record has no attachment.')
+    storage, name = attachment.storage, attachment.name
+    try:
+        size = storage.size(name)
+        last_modified = int(storage.get_modified_time(name).timestamp())
+    except FileNotFoundError:
+        raise Http404('Attachment file is missing.')
+    digest = storage.digest(name) if hasattr(storage, 'digest') else None
+    etag = quote_etag(digest) if digest else None
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if request.headers.get('Range') and (
+        not if_range or if_range in (etag, http_date(last_modified))
+    ):
+        byte_range = _byte_range(request.headers['Range'], size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    response = StreamingHttpResponse(
+        _file_chunks(storage, name, start, end - start + 1),
+        status=206 if byte_range else 200,
+        content_type=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+    )
+    response['Content-Length'] = str(end - start + 1)
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(last_modified)
+    if etag:
+        response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    response['Content-Disposition'] = content_disposition_header(
+        False, f'health-record-{health_record.pk}{os.path.splitext(name)[1]}'
+    )
+    return response
+
+
 # farm/views.py
 from django.db.models import Q
 
@@ -194,18 +386,15 @@ def cattle_list(request):
     search_query = request.GET.get('search', '')
     status_filter = request.GET.get('status', '')
     
-    cattle = Cattle.objects.filter(owner=request.user)
+    cattle = Cattle.objects.filter(owner=request.user).order_by('-created_at')
     
     if search_query:
-        cattle = cattle.filter(
-            Q(tag_number__icontains=search_query) |
-            Q(name__icontains=search_query)
-        )
+        cattle = search_cattle(cattle, search_query)
     
     if status_filter:
         cattle = cattle.filter(status=status_filter)
     
-    cattle = cattle.order_by('-created_at')
+    cattle = cattle.select_related('milk_stats')
     
     paginator = Paginator(cattle, 10)
     page = request.GET.get('page')
@@ -223,20 +412,53 @@ def cattle_list(request):
 
 @login_required
 def milk_production_list(request):
-    # Get all milk production records
-    milk_records = MilkProduction.objects.all().order_by('-date')
+    # Milk production records for the user's herd, newest first
+    milk_records = MilkProduction.objects.filter(
+        cattle__owner=request.user
+    ).select_related('cattle', 'recorded_by')
+    page = KeysetPaginator(milk_records, 25).get_page(request.GET)
 
-    # Calculate daily totals
-    daily_totals = MilkProduction.objects.values('date').annotate(
-        total_quantity=Sum('quantity')
+    # Daily totals for the days shown on this page
+    daily_totals = MilkDailyRollup.objects.filter(
+        cattle__owner=request.user,
+        date__in={record.date for record in page}
+    ).values('date').annotate(
+        total_quantity=Sum('total_quantity')
     ).order_by('-date')
 
     context = {
-        'milk_records': milk_records,
+        'milk_records': page,
+        'page': page,
         'daily_totals': daily_totals,
     }
     return render(request, 'farm/milk_production_list.html', context)
 
+# Rows fetched per database round trip and written per streamed chunk
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_COLUMNS = [
+    'Date', 'Tag Number', 'Cattle', 'Session',
+    'Quantity (L)', 'Fat Content (%)', 'Notes',
+]
+
+
+def _stream_csv(header, rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield CSV text in chunks of ``chunk_size`` rows so the response starts
+    immediately and memory stays flat regardless of the export size.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
 @login_required
 def milk_production_export(request):
     start_date = request.GET.get('start_date')
@@ -247,22 +469,18 @@ def milk_production_export(request):
         productions = productions.filter(date__gte=start_date)
     if end_date:
         productions = productions.filter(date__lte=end_date)
-        
-    response = HttpResponse(content_type='text/csv')
+
+    # Cattle columns are joined in SQL; no model instances are built
+    rows = productions.order_by('date', 'id').values_list(
+        'date', 'cattle__tag_number', 'cattle__name', 'milking_session',
+        'quantity', 'fat_content', 'notes'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    response = StreamingHttpResponse(
+        _stream_csv(EXPORT_COLUMNS, rows),
+        content_type='text/csv'
+    )
     response['Content-Disposition'] = 'attachment; filename="milk_production.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Cattle', 'Morning Amount', 'Evening Amount', 'Total Amount'])
-    
-    for prod in productions:
-        writer.writerow([
-            prod.date,
-            prod.cattle.name,
-            prod.morning_amount,
-            prod.evening_amount,
-            prod.total_amount
-        ])
-    
     return response
 
 # views.py
@@ -271,80 +489,37 @@ from django.db.models import Sum, Case, When, DecimalField
 from django.db.models.functions import TruncDate
 from django.utils import timezone
 
+@login_required
 def analytics_dashboard(request):
-    # Get date range (default to last 30 days if not specified)
-    end_date = timezone.now().date()
-    start_date = end_date - timezone.timedelta(days=30)
-
-    # Get milk production data
-    milk_data = MilkProduction.objects.filter(
-        date__range=[start_date, end_date]
-    ).annotate(
-        morning_amount=Case(
-            When(milking_session='morning', then='quantity'),
-            default=0,
-            output_field=DecimalField(),
-        ),
-        afternoon_amount=Case(
-            When(milking_session='afternoon', then='quantity'),
-            default=0,
-            output_field=DecimalField(),
-        ),
-        evening_amount=Case(
-            When(milking_session='evening', then='quantity'),
-            default=0,
-            output_field=DecimalField(),
-        )
-    ).values('date').annotate(
-        total_morning=Sum('morning_amount'),
-        total_afternoon=Sum('afternoon_amount'),
-        total_evening=Sum('evening_amount'),
-        daily_total=Sum('quantity')
-    ).order_by('date')
-
-    # Calculate total production
-    total_production = MilkProduction.objects.filter(
-        date__range=[start_date, end_date]
-    ).aggregate(
-        total=Sum('quantity')
-    )['total'] or 0
-
-    # Calculate average daily production
-    days_count = (end_date - start_date).days + 1
-    avg_daily_production = total_production / days_count if days_count > 0 else 0
-
-    # Get top producing cattle
-    top_cattle = MilkProduction.objects.filter(
-        date__range=[start_date, end_date]
-    ).values(
-        'cattle__name',
-        'cattle__tag_number'
-    ).annotate(
-        total_production=Sum('quantity')
-    ).order_by('-total_production')[:5]
-
-    # Prepare data for charts
-    dates = [entry['date'].strftime('%Y-%m-%d') for entry in milk_data]
-    morning_data = [float(entry['total_morning'] or 0) for entry in milk_data]
-    afternoon_data = [float(entry['total_afternoon'] or 0) for entry in milk_data]
-    evening_data = [float(entry['total_evening'] or 0) for entry in milk_data]
-    daily_totals = [float(entry['daily_total'] or 0) for entry in milk_data]
+    """
+    Milk analytics for a date range (last 30 days by default).
 
-    context = {
-        'total_production': total_production,
-        'avg_daily_production': avg_daily_production,
-        'top_cattle': top_cattle,
-        'chart_data': {
-            'dates': dates,
-            'morning_data': morning_data,
-            'afternoon_data': afternoon_data,
-            'evening_data': evening_data,
-            'daily_totals': daily_totals,
-        },
+    Farmers see their own herd; admins may pick any herd or all of them.
+    The numbers come from a shared cache that is invalidated by new milk
+    data, so most visits do no computation at all.
+    """
+    owner = request.user
+    form = AnalyticsFilterForm(request.GET, user=request.user)
+    if form.is_valid():
+        start_date = form.cleaned_data['start_date']
+        end_date = form.cleaned_data['end_date']
+        if 'owner' in form.fields:
+            owner = form.cleaned_data['owner']
+    else:
+        end_date = timezone.now().date()
+        start_date = end_date - timedelta(days=30)
+
+    context = get_dashboard(owner, start_date, end_date).copy()
+    # Fertility figures are kept per month; whole months overlapping the range
+    fertility_range = {'owner': owner, 'start_month': start_date.replace(day=1), 'end_month': end_date}
+    context.update({
+        'fertility': fertility_summary(**fertility_range)[0],
+        'fertility_by_sire': fertility_summary(**fertility_range, group_by=('breeding_type', 'sire')),
+        'form': form,
+        'owner': owner,
         'start_date': start_date,
         'end_date': end_date,
-    }
-
+    })
     return render(request, 'farm/analytics_dashboard.html', context)
 
 
@@ -358,19 +533,69 @@ from django.http import HttpResponse
 from farm.utils import log_activity 
 @login_required
 def export_milk_production_pdf(request):
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    cattle_id = request.GET.get('cattle')
-    
-    productions = MilkProduction.objects.filter(recorded_by=request.user)
-    if start_date:
-        productions = productions.filter(date__gte=start_date)
-    if end_date:
-        productions = productions.filter(date__lte=end_date)
-    if cattle_id:
-        productions = productions.filter(cattle_id=cattle_id)
-    
-    # Log the export activity
+    """
+    Queue a PDF report for the requested filters.
+
+    The PDF is rendered by a background worker; the response points at the
+    status endpoint to poll. An identical report whose data has not changed
+    since it was rendered is served straight from disk.
+    """
+    form = MilkProductionSearchForm(request.GET)
+    form.fields['cattle'].queryset = Cattle.objects.filter(owner=request.user)
+    if not form.is_valid():
+        return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
+
+    filters = {
+        'start_date': form.cleaned_data['start_date'],
+        'end_date': form.cleaned_data['end_date'],
+        'cattle': form.cleaned_data['cattle'].pk if form.cleaned_data['cattle'] else None,
+    }
+    filters = {key: str(value) if value else None for key, value in filters.items()}
+    job = enqueue_report(request.user, filters)
+
+    if job.status == 'done':
+        return redirect('farm:report_job_download', job_id=job.pk)
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse(_report_job_payload(job), status=202)
+    return render(request, 'farm/report_job.html', {'job': job})
+
+
+def _report_job_payload(job):
+    payload = {
+        'job_id': job.pk,
+        'status': job.status,
+        'status_url': reverse('farm:report_job_status', args=[job.pk]),
+    }
+    if job.status == 'done':
+        payload['download_url'] = reverse('farm:report_job_download', args=[job.pk])
+    if job.status == 'failed':
+        payload['error'] = job.error
+    return payload
+
+
+@login_required
+def report_job_status(request, job_id):
+    """
+    Poll the state of a queued report
+    """
+    job = get_object_or_404(ReportJob, pk=job_id, owner=request.user)
+    return JsonResponse(_report_job_payload(job))
+
+
+@login_required
+def report_job_download(request, job_id):
+    """
+    Serve a finished report
+    """
+    job = get_object_or_404(ReportJob, pk=job_id, owner=request.user, status='done')
+    if not job.file or not job.file.storage.exists(job.file.name):
+        raise Http404('Report file is no longer available.')
+    return FileResponse(
+        job.file.open('rb'),
+        as_attachment=True,
+        filename='milk_production_report.pdf',
+        content_type='application/pdf'
+    )
 # farm/views.py
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
@@ -378,6 +603,17 @@ from django.utils import timezone
 from django.http import JsonResponse
 from django.core.paginator import Paginator
 from .models import Notification
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from .events import broker
+from .notifications import (
+    delete_notifications, get_notification_summary,
+    mark_notifications_read, notification_marker, purge_read_notifications,
+    refresh_notification_summaries
+)
 from django.contrib import messages
 
 @login_required
@@ -393,23 +629,9 @@ def notifications_list(request):
     page = request.GET.get('page')
     notifications = paginator.get_page(page)
     
-    # Mark all unread notifications as read
-    if request.GET.get('mark_all_read'):
-        unread_notifications = Notification.objects.filter(
-            user=request.user,
-            read_at__isnull=True
-        )
-        for notification in unread_notifications:
-            notification.mark_as_read()
-        messages.success(request, 'All notifications marked as read.')
-        return redirect('notifications_list')
-
     context = {
         'notifications': notifications,
-        'unread_count': Notification.objects.filter(
-            user=request.user,
-            read_at__isnull=True
-        ).count()
+        'unread_count': get_notification_summary(request.user.pk)['unread'],
     }
     return render(request, 'farm/notifications_list.html', context)
 
@@ -423,7 +645,7 @@ def mark_notification_read(request, notification_id):
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'status': 'success'})
-    return redirect('notifications_list')
+    return redirect('farm:notifications_list')
 
 @login_required
 def delete_notification(request, notification_id):
@@ -431,13 +653,149 @@ def delete_notification(request, notification_id):
     Delete a specific notification
     """
     if request.method == 'POST':
-        notification = get_object_or_404(Notification, id=notification_id, user=request.user)
-        notification.delete()
+        if not delete_notifications(request.user, [notification_id]):
+            raise Http404
         messages.success(request, 'Notification deleted successfully.')
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({'status': 'success'})
-    return redirect('notifications_list')
+    return redirect('farm:notifications_list')
+
+
+# Seconds between keep-alives on an idle event stream. Changes made by
+# other processes (workers, other servers) are polled for at the same pace.
+EVENT_STREAM_HEARTBEAT = getattr(settings, 'FARM_EVENTS_HEARTBEAT', 15)
+
+
+def _sse(event, data, event_id=None):
+    message = f'event: {event}\n'
+    if event_id is not None:
+        message += f'id: {event_id}\n'
+    return message + f'data: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+async def _notification_event_stream(user_id, last_id):
+    queue = broker.subscribe(user_id)
+    read_summary = sync_to_async(get_notification_summary)
+    read_marker = sync_to_async(notification_marker)
+    refresh_summary = sync_to_async(refresh_notification_summaries)
+    try:
+        sent_unread = None
+        marker = await read_marker(user_id)
+        while True:
+            summary = await read_summary(user_id)
+            if last_id is None:
+                # The page that opened the stream already shows these
+                last_id = max((header['id'] for header in summary['recent']), default=0)
+            for header in reversed(summary['recent']):
+                if header['id'] > last_id:
+                    last_id = header['id']
+                    yield _sse('notification', header, last_id)
+            if summary['unread'] != sent_unread:
+                sent_unread = summary['unread']
+                yield _sse('unread', {'count': sent_unread})
+            try:
+                await asyncio.wait_for(queue.get(), EVENT_STREAM_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                # Other processes publish to their own broker; their
+                # changes show up in the database
+                latest = await read_marker(user_id)
+                if latest != marker:
+                    await refresh_summary([user_id])
+                marker = latest
+    finally:
+        broker.unsubscribe(user_id, queue)
+
+
+@login_required
+async def notification_events(request):
+    """
+    Server-sent event stream of the user's new notifications and unread
+    count. Streams wait on the in-process broker, so open connections do
+    no work until something changes in this process; changes made by
+    workers or other servers are found by a one-query check of the
+    database every heartbeat. Serve this under ASGI.
+    """
+    user = await request.auser()
+    try:
+        last_id = int(request.headers['Last-Event-ID'])
+    except (KeyError, ValueError):
+        last_id = None
+    response = StreamingHttpResponse(
+        _notification_event_stream(user.pk, last_id),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _selected_notification_ids(request):
+    ids = []
+    for value in request.POST.getlist('ids'):
+        try:
+            ids.append(int(value))
+        except ValueError:
+            continue
+    return ids
+
+
+def _bulk_notification_response(request, count, message):
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({
+            'status': 'success',
+            'count': count,
+            'unread_count': get_notification_summary(request.user.pk)['unread'],
+        })
+    messages.success(request, message)
+    return redirect('farm:notifications_list')
+
+
+@login_required
+@require_POST
+def mark_all_notifications_read(request):
+    """
+    Mark every unread notification of the user as read in one UPDATE
+    """
+    count = mark_notifications_read(request.user)
+    return _bulk_notification_response(request, count, f'{count} notifications marked as read.')
+
+
+@login_required
+@require_POST
+def mark_selected_notifications_read(request):
+    """
+    Mark the notifications posted as ``ids`` as read in one UPDATE
+    """
+    count = mark_notifications_read(request.user, _selected_notification_ids(request))
+    return _bulk_notification_response(request, count, f'{count} notifications marked as read.')
+
+
+@login_required
+@require_POST
+def delete_selected_notifications(request):
+    """
+    Delete the notifications posted as ``ids`` in one DELETE
+    """
+    count = delete_notifications(request.user, _selected_notification_ids(request))
+    return _bulk_notification_response(request, count, f'{count} notifications deleted.')
+
+
+@login_required
+@require_POST
+def purge_notifications(request):
+    """
+    Delete the user's notifications read more than ``days`` days ago
+    """
+    form = NotificationPurgeForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
+    days = form.cleaned_data['days']
+    count = purge_read_notifications(request.user, days)
+    return _bulk_notification_response(
+        request, count, f'{count} read notifications older than {days} days deleted.'
+    )
 
 # farm/views.py
 @login_required
@@ -450,7 +808,7 @@ def mark_notification_read(request, notification_id):  # This is the correct nam
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'status': 'success'})
-    return redirect('notifications_list')
+    return redirect('farm:notifications_list')
 
 # farm/views.py
 from django.shortcuts import render
@@ -468,34 +826,69 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.contenttypes.models import ContentType
 from django.db.models import Q
 from django.contrib.auth import get_user_model
+from django.utils.dateparse import parse_date
+from itertools import islice
+from .archive import iter_archived_logs
+from .models import ActivityLogArchive
+from .signals import AUDITED_MODELS
+
+# Most archived logs one archive search returns
+ARCHIVE_SEARCH_LIMIT = 5000
 
 
 @login_required
 def activity_log_list(request):
-    logs = ActivityLog.objects.all().order_by('-timestamp')
-    
-    # Filter by date range
-    date_from = request.GET.get('date_from')
-    date_to = request.GET.get('date_to')
+    """
+    Recent logs come from the ActivityLog table; with ``source=archive``
+    the monthly archive files of the selected date range are searched.
+    """
+    date_from = parse_date(request.GET.get('date_from') or '')
+    date_to = parse_date(request.GET.get('date_to') or '')
     category = request.GET.get('category')
+    source = request.GET.get('source')
 
+    context = {
+        'categories': [
+            (model._meta.model_name, model._meta.verbose_name.title())
+            for model in AUDITED_MODELS
+        ],
+        'source': source,
+        'archives': ActivityLogArchive.objects.all(),
+    }
+
+    if source == 'archive':
+        matches = list(islice(
+            iter_archived_logs(date_from, date_to, model_name=category),
+            ARCHIVE_SEARCH_LIMIT + 1,
+        ))
+        page = Paginator(matches[:ARCHIVE_SEARCH_LIMIT], 25).get_page(request.GET.get('page'))
+        users = get_user_model().objects.in_bulk({log.user_id for log in page})
+        for log in page:
+            log.user = users.get(log.user_id)
+        context.update({
+            'logs': page,
+            'archive_page': page,
+            'truncated': len(matches) > ARCHIVE_SEARCH_LIMIT,
+            'archive_querystring': request.GET.copy(),
+        })
+        context['archive_querystring'].pop('page', None)
+        return render(request, 'farm/activity_logs.html', context)
+
+    logs = ActivityLog.objects.select_related('user')
     if date_from:
         logs = logs.filter(timestamp__date__gte=date_from)
     if date_to:
         logs = logs.filter(timestamp__date__lte=date_to)
     if category:
-        logs = logs.filter(category=category)
+        logs = logs.filter(model_name=category)
 
-    # Pagination
-    paginator = Paginator(logs, 25)  # Show 25 logs per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination: no COUNT(*) and no OFFSET scans
+    page = KeysetPaginator(logs, 25, ordering=('-timestamp', '-id')).get_page(request.GET)
 
-    context = {
-        'logs': page_obj,
-        'is_paginated': page_obj.has_other_pages(),
-        'page_obj': page_obj,
-    }
+    context.update({
+        'logs': page,
+        'page': page,
+    })
     return render(request, 'farm/activity_logs.html', context)
 
 # farm/views.py
@@ -508,23 +901,37 @@ def cattle_add(request):
 @login_required
 def create_cattle(request):
     if request.method == 'POST':
-        form = CattleForm(request.POST)
+        form = CattleForm(request.POST, user=request.user)
         if form.is_valid():
             cattle = form.save(commit=False)
             cattle.owner = request.user
             cattle.save()
             return redirect('cattle_detail', pk=cattle.pk)
     else:
-        form = CattleForm()
+        form = CattleForm(user=request.user)
     return render(request, 'farm/cattle_form.html', {'form': form})
 
+# Care items due within this many days are listed on the dashboard
+CARE_DUE_DAYS = 7
+
+
 @login_required
 def dashboard(request):
     # Filter cattle by the logged-in user
     cattle = Cattle.objects.filter(owner=request.user)
+    today = timezone.localdate()
     context = {
         'cattle': cattle,
-        # ... other context data ...
+        'total_cattle': cattle.filter(status='active').count(),
+        'today_milk': MilkProduction.objects.filter(
+            cattle__owner=request.user, date=today
+        ).aggregate(total=Sum('quantity'))['total'] or 0,
+        'recent_health_records': HealthRecord.objects.filter(
+            cattle__owner=request.user
+        ).select_related('cattle').order_by('-date')[:5],
+        'care_due': due_care_items(owner=request.user, days=CARE_DUE_DAYS)[:10],
+        'care_due_days': CARE_DUE_DAYS,
+        'watch_tomorrow': breeding_events(owner=request.user),
     }
     return render(request, 'farm/dashboard.html', context)
 
@@ -547,7 +954,7 @@ def cattle_edit(request, pk):
         return HttpResponseForbidden("You don't have permission to edit this cattle.")
     
     if request.method == 'POST':
-        form = CattleForm(request.POST, request.FILES, instance=cattle)
+        form = CattleForm(request.POST, request.FILES, instance=cattle, user=request.user)
         if form.is_valid():
             # Save the form
             cattle = form.save(commit=False)
@@ -560,7 +967,7 @@ def cattle_edit(request, pk):
             # Redirect to cattle detail page
             return redirect('farm:cattle_detail', pk=cattle.pk)
     else:
-        form = CattleForm(instance=cattle)
+        form = CattleForm(instance=cattle, user=request.user)
     
     context = {
         'form': form,
@@ -609,7 +1016,7 @@ from .forms import CattleForm
 @login_required
 def cattle_add(request):
     if request.method == 'POST':
-        form = CattleForm(request.POST, request.FILES)
+        form = CattleForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             cattle = form.save(commit=False)
             cattle.owner = request.user
@@ -617,7 +1024,7 @@ def cattle_add(request):
             messages.success(request, 'New cattle added successfully!')
             return redirect('farm:cattle_detail', pk=cattle.pk)
     else:
-        form = CattleForm()
+        form = CattleForm(user=request.user)
     
     context = {
         'form': form,
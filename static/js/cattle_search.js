@@ -0,0 +1,42 @@
+// static/js/cattle_search.js
+// Suggests matching cattle while typing in the cattle search box.
+document.addEventListener('DOMContentLoaded', function() {
+    const input = document.getElementById('cattleSearch');
+    const suggestions = document.getElementById('cattleSuggestions');
+    if (!input || !suggestions) {
+        return;
+    }
+
+    let timer = null;
+    let controller = null;
+
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(function() {
+            const query = input.value.trim();
+            if (controller) {
+                controller.abort();
+            }
+            suggestions.replaceChildren();
+            if (!query) {
+                return;
+            }
+            controller = new AbortController();
+            const url = input.dataset.searchUrl + '?q=' + encodeURIComponent(query);
+            fetch(url, {
+                headers: {'X-Requested-With': 'XMLHttpRequest'},
+                signal: controller.signal,
+            })
+                .then(function(response) { return response.json(); })
+                .then(function(data) {
+                    data.results.forEach(function(animal) {
+                        const option = document.createElement('option');
+                        option.value = animal.tag_number;
+                        option.label = animal.name;
+                        suggestions.appendChild(option);
+                    });
+                })
+                .catch(function() {});
+        }, 150);
+    });
+});
@@ -0,0 +1,38 @@
+// static/js/notifications.js
+// Keeps the navbar notification badge and dropdown current from the
+// server-sent event stream, instead of reloading the page.
+document.addEventListener('DOMContentLoaded', function() {
+    const bell = document.getElementById('notificationDropdown');
+    const badge = document.getElementById('notificationBadge');
+    const menu = document.getElementById('notificationMenu');
+    if (!bell || !window.EventSource) {
+        return;
+    }
+
+    const source = new EventSource(bell.dataset.eventsUrl);
+
+    source.addEventListener('unread', function(event) {
+        const count = JSON.parse(event.data).count;
+        badge.textContent = count;
+        badge.classList.toggle('d-none', count === 0);
+    });
+
+    source.addEventListener('notification', function(event) {
+        const notification = JSON.parse(event.data);
+        const item = document.createElement('a');
+        item.className = 'dropdown-item font-weight-bold';
+        item.href = menu.dataset.listUrl;
+        const time = document.createElement('small');
+        time.className = 'text-muted';
+        time.textContent = 'just now';
+        item.appendChild(time);
+        item.appendChild(document.createElement('br'));
+        item.appendChild(document.createTextNode(notification.message));
+
+        const empty = menu.querySelector('span.dropdown-item');
+        if (empty) {
+            empty.remove();
+        }
+        menu.insertBefore(item, menu.firstChild);
+    });
+});